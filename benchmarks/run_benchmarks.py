@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Generates a synthetic workload (Git repositories wired into a submodule graph and Jenkins job descriptions), runs
+# the stages of the scan, ingest and materialize pipeline on it and writes the timings as JSON. Results of different
+# runs can be compared with --compare, so run it before and after a change with the same parameters.
+
+import os
+import argparse
+import contextlib
+import hashlib
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from subprocess import PIPE
+
+PATH_TO_REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PATH_TO_REPOSITORY_ROOT)
+
+import create_dependency_database
+import dependency_database
+import dependency_graph
+import materialize_important_queries
+import scan_buildjobs
+import scan_deps_in_git_repos
+from dependency_database_writer import DependencyDatabaseWriter
+
+SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
+
+BENCHMARK_FORMAT_VERSION = 1
+
+NAME_OF_ORIGIN_DIRECTORY = "origin"
+NAME_OF_WORKSPACE_DIRECTORY = "workspace"
+NAME_OF_JOBS_DIRECTORY = "jobs"
+FILE_NAME_OF_DATABASE = "benchmark.db"
+
+GIT_ENVIRONMENT = {"GIT_AUTHOR_NAME": "benchmark", "GIT_AUTHOR_EMAIL": "benchmark@localhost",
+                   "GIT_COMMITTER_NAME": "benchmark", "GIT_COMMITTER_EMAIL": "benchmark@localhost"}
+
+# Shell script embedded in the job descriptions to give them a realistic size
+LINE_OF_BUILD_SCRIPT = "./gradlew --no-daemon --stacktrace -Pversion=${BUILD_NUMBER} clean build publishToMavenLocal\n"
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Measures the scan, ingest and materialize pipeline on a synthetic workload and writes the results as JSON.")
+    parser.add_argument("-n", "--repositories",
+        dest = "numberOfRepositories",
+        action = "store",
+        type = int,
+        default = 100,
+        help = "Number of Git repositories. Default: 100.")
+    parser.add_argument("--fan-out",
+        dest = "fanOut",
+        action = "store",
+        type = int,
+        default = 3,
+        help = "Number of submodules of each repository above the lowest level. Default: 3.")
+    parser.add_argument("--depth",
+        dest = "depth",
+        action = "store",
+        type = int,
+        default = 4,
+        help = "Number of levels of the submodule graph. Submodules are taken from the next lower level. Default: 4.")
+    parser.add_argument("--diamonds",
+        dest = "diamonds",
+        action = "store",
+        type = float,
+        default = 0.3,
+        help = "Fraction of submodules taken from a small set of shared repositories per level, so that many repositories depend on the same ones. Default: 0.3.")
+    parser.add_argument("--cycles",
+        dest = "cycles",
+        action = "store",
+        type = int,
+        default = 2,
+        help = "Number of repositories on the lowest level which get a repository of the highest level as submodule. Default: 2.")
+    parser.add_argument("-m", "--build-jobs",
+        dest = "numberOfBuildJobs",
+        action = "store",
+        type = int,
+        default = None,
+        help = "Number of Jenkins job descriptions. Default: one per repository.")
+    parser.add_argument("--job-size",
+        dest = "jobSizeInKilobytes",
+        action = "store",
+        type = int,
+        default = 32,
+        help = "Approximate size of each job description in KiB. Default: 32.")
+    parser.add_argument("--checkouts",
+        dest = "numberOfCheckouts",
+        action = "store",
+        type = int,
+        default = None,
+        help = "Number of repositories of the highest level checked out with all submodules in the workspace. Default: all of them.")
+    parser.add_argument("-r", "--repetitions",
+        dest = "repetitions",
+        action = "store",
+        type = int,
+        default = 3,
+        help = "Number of times each stage is run. Default: 3.")
+    parser.add_argument("-j", "--jobs",
+        dest = "jobs",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Value of --jobs for the scanners. Default: 1.")
+    parser.add_argument("--seed",
+        dest = "seed",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Seed for generating the workload. Default: 1.")
+    parser.add_argument("--work-dir",
+        dest = "workDirectory",
+        action = "store",
+        help = "Directory for the workload. It must not exist and is kept after the run. Default: a temporary directory, which is deleted afterwards.")
+    parser.add_argument("-o", "--output",
+        dest = "output",
+        action = "store",
+        help = "Write the results to this file instead of standard output.")
+    parser.add_argument("--compare",
+        dest = "compare",
+        action = "store",
+        help = "Results of an earlier run to compare with. Prints the change per stage to standard error.")
+    return parser
+
+# A repository of the synthetic workload. Level 0 is the highest one, i.e. repositories nobody depends on.
+class SyntheticRepository:
+    name = ""
+    level = 0
+    submodules = None
+    gitModulesContent = None
+    absolutePathToOrigin = ""
+    initialCommit = None
+    headCommit = None
+
+    def __init__(self, name, level, absolutePathToOrigin):
+        self.name = name
+        self.level = level
+        self.absolutePathToOrigin = absolutePathToOrigin
+        self.submodules = []
+
+    def getUrl(self):
+        return "file://" + self.absolutePathToOrigin
+
+    # Commit recorded for this repository in the given superproject
+    def getCommitPinnedBy(self, superproject):
+        if superproject.level >= self.level:
+            # Edge closing a cycle. It refers to the commit before the submodules were added, as anything else would
+            # require the commit to contain itself.
+            return self.initialCommit
+        return self.headCommit
+
+def runGit(arguments, workingDirectory, inputText = None):
+    environment = dict(os.environ)
+    environment.update(GIT_ENVIRONMENT)
+    process = subprocess.run(["git"] + arguments, cwd = workingDirectory, input = inputText, stdout = PIPE,
+                             stderr = PIPE, env = environment)
+    if process.returncode != 0:
+        raise RuntimeError("git " + " ".join(arguments) + " failed: " + process.stderr.decode(SUBPROCESS_OUTPUT_ENCODING, "replace"))
+    return process.stdout.decode(SUBPROCESS_OUTPUT_ENCODING).strip()
+
+# Distributes the repositories over the levels and chooses the submodules of each one from the next lower level. A
+# small set of repositories per level is shared by many superprojects, which creates diamonds.
+def generateSubmoduleGraph(absolutePathToOriginDirectory, numberOfRepositories, fanOut, depth, diamonds, cycles, randomGenerator):
+    depth = max(1, min(depth, numberOfRepositories))
+    repositoriesByLevel = [[] for level in range(depth)]
+    for index in range(numberOfRepositories):
+        level = index * depth // numberOfRepositories
+        name = "project-" + str(level) + "-" + str(index)
+        repository = SyntheticRepository(name, level, os.path.join(absolutePathToOriginDirectory, name + ".git"))
+        repositoriesByLevel[level].append(repository)
+    for level in range(depth - 1):
+        candidates = repositoriesByLevel[level + 1]
+        sharedCandidates = candidates[:max(1, len(candidates) // 10)]
+        for repository in repositoriesByLevel[level]:
+            while len(repository.submodules) < min(fanOut, len(candidates)):
+                if randomGenerator.random() < diamonds:
+                    submodule = randomGenerator.choice(sharedCandidates)
+                else:
+                    submodule = randomGenerator.choice(candidates)
+                if submodule not in repository.submodules:
+                    repository.submodules.append(submodule)
+    if depth > 1:
+        for repository in randomGenerator.sample(repositoriesByLevel[-1], min(cycles, len(repositoriesByLevel[-1]))):
+            repository.submodules.append(randomGenerator.choice(repositoriesByLevel[0]))
+    return repositoriesByLevel
+
+def createGitModulesContent(repository):
+    content = ""
+    for submodule in repository.submodules:
+        content += "[submodule \"" + submodule.name + "\"]\n"
+        content += "\tpath = libs/" + submodule.name + "\n"
+        content += "\turl = " + submodule.getUrl() + "\n"
+    return content
+
+# Writes a commit to the branch main with "git fast-import", which needs a single process per commit
+def importCommit(repository, message, files, gitlinks):
+    stream = "commit refs/heads/main\n"
+    stream += "committer benchmark <benchmark@localhost> 1600000000 +0000\n"
+    stream += "data " + str(len(message)) + "\n" + message + "\n"
+    if repository.initialCommit != None:
+        stream += "from " + repository.initialCommit + "\n"
+    for path, content in files:
+        data = content.encode(SUBPROCESS_OUTPUT_ENCODING)
+        stream += "M 100644 inline " + path + "\ndata " + str(len(data)) + "\n" + content + "\n"
+    for path, commit in gitlinks:
+        stream += "M 160000 " + commit + " " + path + "\n"
+    runGit(["fast-import", "--quiet"], repository.absolutePathToOrigin, stream.encode(SUBPROCESS_OUTPUT_ENCODING))
+    return runGit(["rev-parse", "refs/heads/main"], repository.absolutePathToOrigin)
+
+# Creates the repositories as bare repositories, the lowest level first, so that the commits of all submodules are
+# known when a superproject is committed
+def createOriginRepositories(repositoriesByLevel):
+    for repositories in repositoriesByLevel:
+        for repository in repositories:
+            runGit(["init", "-q", "--bare", repository.absolutePathToOrigin], os.path.dirname(repository.absolutePathToOrigin))
+            runGit(["symbolic-ref", "HEAD", "refs/heads/main"], repository.absolutePathToOrigin)
+            repository.initialCommit = importCommit(repository, "Initial commit", [("README", repository.name + "\n")], [])
+            repository.headCommit = repository.initialCommit
+            # Like a mirror, the repository knows its own URL
+            with open(os.path.join(repository.absolutePathToOrigin, "config"), 'a') as configFile:
+                configFile.write("[remote \"origin\"]\n\turl = " + repository.getUrl() + "\n")
+    for repositories in reversed(repositoriesByLevel):
+        for repository in repositories:
+            if len(repository.submodules) == 0:
+                continue
+            repository.gitModulesContent = createGitModulesContent(repository)
+            gitlinks = [("libs/" + submodule.name, submodule.getCommitPinnedBy(repository)) for submodule in repository.submodules]
+            repository.headCommit = importCommit(repository, "Add submodules", [(".gitmodules", repository.gitModulesContent)], gitlinks)
+
+def computeBlobId(content):
+    data = content.encode(SUBPROCESS_OUTPUT_ENCODING)
+    return hashlib.sha1(b"blob " + str(len(data)).encode() + b"\0" + data).hexdigest()
+
+# Writes an index (version 2) with the given (mode, object id, path) entries. The file system data of the entries is
+# left empty, so git considers the files modified, which does not matter for the scanner.
+def writeIndex(absolutePathToGitDirectory, entries):
+    content = b"DIRC" + struct.pack(">II", 2, len(entries))
+    for mode, objectId, path in sorted(entries, key = lambda entry: entry[2].encode(SUBPROCESS_OUTPUT_ENCODING)):
+        name = path.encode(SUBPROCESS_OUTPUT_ENCODING)
+        entry = struct.pack(">10I20sH", 0, 0, 0, 0, 0, 0, mode, 0, 0, 0, bytes.fromhex(objectId), len(name)) + name
+        content += entry + b"\0" * (8 - len(entry) % 8)
+    content += hashlib.sha1(content).digest()
+    with open(os.path.join(absolutePathToGitDirectory, "index"), 'wb') as indexFile:
+        indexFile.write(content)
+
+# Creates a checkout of the repository at the given commit with all submodules, recursively. Instead of cloning, the
+# working tree and a minimal Git directory are written directly. The Git directory borrows the objects of the bare
+# repository through objects/info/alternates and has a detached HEAD, like a submodule after "git submodule update".
+# git can read it, and it is a lot faster to create for large graphs.
+def createCheckout(repository, commit, absolutePathToCheckout):
+    absolutePathToGitDirectory = os.path.join(absolutePathToCheckout, ".git")
+    os.makedirs(os.path.join(absolutePathToGitDirectory, "objects", "info"))
+    os.makedirs(os.path.join(absolutePathToGitDirectory, "refs", "heads"))
+    os.makedirs(os.path.join(absolutePathToGitDirectory, "refs", "tags"))
+    with open(os.path.join(absolutePathToGitDirectory, "objects", "info", "alternates"), 'w') as alternatesFile:
+        alternatesFile.write(os.path.join(repository.absolutePathToOrigin, "objects") + "\n")
+    with open(os.path.join(absolutePathToGitDirectory, "HEAD"), 'w') as headFile:
+        headFile.write(commit + "\n")
+    with open(os.path.join(absolutePathToGitDirectory, "config"), 'w') as configFile:
+        configFile.write("[core]\n\trepositoryformatversion = 0\n\tbare = false\n")
+        configFile.write("[remote \"origin\"]\n\turl = " + repository.getUrl() + "\n")
+    with open(os.path.join(absolutePathToCheckout, "README"), 'w') as readmeFile:
+        readmeFile.write(repository.name + "\n")
+    indexEntries = [(0o100644, computeBlobId(repository.name + "\n"), "README")]
+    if commit != repository.headCommit or repository.gitModulesContent == None:
+        # Only the last commit has submodules
+        writeIndex(absolutePathToGitDirectory, indexEntries)
+        return 1
+    with open(os.path.join(absolutePathToCheckout, ".gitmodules"), 'w') as gitModulesFile:
+        gitModulesFile.write(repository.gitModulesContent)
+    indexEntries.append((0o100644, computeBlobId(repository.gitModulesContent), ".gitmodules"))
+    for submodule in repository.submodules:
+        indexEntries.append((0o160000, submodule.getCommitPinnedBy(repository), "libs/" + submodule.name))
+    writeIndex(absolutePathToGitDirectory, indexEntries)
+    numberOfCheckouts = 1
+    for submodule in repository.submodules:
+        numberOfCheckouts += createCheckout(submodule, submodule.getCommitPinnedBy(repository), os.path.join(absolutePathToCheckout, "libs", submodule.name))
+    return numberOfCheckouts
+
+def createJobDescription(buildJobName, remoteUrls, sizeInBytes):
+    content = "<?xml version='1.1' encoding='UTF-8'?>\n"
+    content += "<org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject plugin=\"workflow-multibranch@2.21\">\n"
+    content += "  <actions/>\n  <description>Synthetic job for benchmarks</description>\n"
+    content += "  <displayName>" + buildJobName + "</displayName>\n"
+    content += "  <sources class=\"jenkins.branch.MultiBranchProject$BranchSourceList\" plugin=\"branch-api@2.5.5\">\n    <data>\n"
+    for index in range(len(remoteUrls)):
+        content += "      <jenkins.branch.BranchSource>\n"
+        content += "        <source class=\"jenkins.plugins.git.GitSCMSource\" plugin=\"git@4.2.2\">\n"
+        content += "          <id>" + str(index + 1) + "</id>\n          <remote>" + remoteUrls[index] + "</remote>\n"
+        content += "        </source>\n      </jenkins.branch.BranchSource>\n"
+    content += "    </data>\n  </sources>\n"
+    # Real job descriptions have most of their content (build steps, publishers) after the sources
+    content += "  <builders>\n    <hudson.tasks.Shell>\n      <command>"
+    content += LINE_OF_BUILD_SCRIPT * max(0, (sizeInBytes - len(content)) // len(LINE_OF_BUILD_SCRIPT))
+    content += "</command>\n    </hudson.tasks.Shell>\n  </builders>\n"
+    content += "</org.jenkinsci.plugins.workflow.multibranch.WorkflowMultiBranchProject>\n"
+    return content
+
+# Refers to the repositories with differently spelled URLs, which must all be matched to the same project
+def createJobDescriptions(absolutePathToJobsDirectory, repositories, numberOfBuildJobs, sizeInBytes, randomGenerator):
+    urlSpellings = [lambda repository: repository.getUrl(),
+                    lambda repository: repository.absolutePathToOrigin[:-len(".git")],
+                    lambda repository: "file://" + repository.absolutePathToOrigin.upper() + "/"]
+    os.makedirs(absolutePathToJobsDirectory)
+    for index in range(numberOfBuildJobs):
+        buildJobName = "build-" + str(index)
+        remoteRepositories = [repositories[index % len(repositories)]]
+        # Some jobs build more than one repository
+        if randomGenerator.random() < 0.1:
+            remoteRepositories.append(randomGenerator.choice(repositories))
+        remoteUrls = [urlSpellings[(index + position) % len(urlSpellings)](remoteRepositories[position]) for position in range(len(remoteRepositories))]
+        with open(os.path.join(absolutePathToJobsDirectory, buildJobName + ".xml"), 'w') as jobFile:
+            jobFile.write(createJobDescription(buildJobName, remoteUrls, sizeInBytes))
+
+# Creates the workload in the given directory and returns a description of it
+def generateWorkload(absolutePathToWorkDirectory, args):
+    randomGenerator = random.Random(args.seed)
+    absolutePathToOriginDirectory = os.path.join(absolutePathToWorkDirectory, NAME_OF_ORIGIN_DIRECTORY)
+    absolutePathToWorkspace = os.path.join(absolutePathToWorkDirectory, NAME_OF_WORKSPACE_DIRECTORY)
+    os.makedirs(absolutePathToOriginDirectory)
+    os.makedirs(absolutePathToWorkspace)
+    repositoriesByLevel = generateSubmoduleGraph(absolutePathToOriginDirectory, args.numberOfRepositories, args.fanOut,
+                                                 args.depth, args.diamonds, args.cycles, randomGenerator)
+    createOriginRepositories(repositoriesByLevel)
+    topLevelRepositories = repositoriesByLevel[0]
+    if args.numberOfCheckouts != None:
+        topLevelRepositories = topLevelRepositories[:args.numberOfCheckouts]
+    numberOfCheckouts = 0
+    for repository in topLevelRepositories:
+        numberOfCheckouts += createCheckout(repository, repository.headCommit, os.path.join(absolutePathToWorkspace, repository.name))
+    repositories = [repository for repositories in repositoriesByLevel for repository in repositories]
+    numberOfBuildJobs = args.numberOfBuildJobs if args.numberOfBuildJobs != None else len(repositories)
+    createJobDescriptions(os.path.join(absolutePathToWorkDirectory, NAME_OF_JOBS_DIRECTORY), repositories,
+                          numberOfBuildJobs, args.jobSizeInKilobytes * 1024, randomGenerator)
+    return {"repositories": len(repositories),
+            "submoduleRelations": sum(len(repository.submodules) for repository in repositories),
+            "checkouts": numberOfCheckouts,
+            "buildJobs": numberOfBuildJobs}
+
+# Returns the absolute paths of all checkouts in the workspace, i.e. the directories the scanner examines
+def findCheckouts(absolutePathToWorkspace):
+    checkouts = []
+    for directoryPath, directoryNames, fileNames in os.walk(absolutePathToWorkspace):
+        if ".git" in directoryNames:
+            checkouts.append(directoryPath)
+    return checkouts
+
+# Runs the stage the given number of times and returns the durations in seconds. prepare is called before each run
+# and is not measured. The output of the scripts is discarded, but producing it is part of the measurement.
+def measureStage(repetitions, run, prepare = None):
+    durations = []
+    for repetition in range(repetitions):
+        with open(os.devnull, 'w') as devNull, contextlib.redirect_stdout(devNull), contextlib.redirect_stderr(devNull):
+            if prepare != None:
+                prepare()
+            startTime = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - startTime)
+    return durations
+
+def createEmptyDatabase(absolutePathToDatabase):
+    dependency_database.removeDatabase(absolutePathToDatabase)
+    create_dependency_database.createDatabase(absolutePathToDatabase)
+
+def ingestRepositories(absolutePathToDatabase, absolutePathToFolder, numberOfJobs, incremental, bare):
+    dbConnection = dependency_database.openDatabase(absolutePathToDatabase)
+    dbWriter = DependencyDatabaseWriter(dbConnection)
+    try:
+        scan_deps_in_git_repos.analyzeRepositoryRootDir(absolutePathToFolder, dbWriter, numberOfJobs,
+                                                        incremental = incremental, bare = bare)
+    finally:
+        dbWriter.close()
+        dbConnection.close()
+
+def ingestBuildJobs(absolutePathToDatabase, absolutePathToJobsDirectory, numberOfJobs):
+    dbConnection = dependency_database.openDatabase(absolutePathToDatabase)
+    dbWriter = DependencyDatabaseWriter(dbConnection)
+    try:
+        xmlFiles = scan_buildjobs.scanDirectoryForXmlFiles(absolutePathToJobsDirectory)
+        if numberOfJobs > 1:
+            scan_buildjobs.processXmlJobDescriptionsInParallel(dbWriter, xmlFiles, numberOfJobs)
+        else:
+            for xmlFile in xmlFiles:
+                scan_buildjobs.processXmlJobDescription(dbWriter, xmlFile)
+    finally:
+        dbWriter.close()
+        dbConnection.close()
+
+def runOnDatabase(absolutePathToDatabase, function):
+    dbConnection = dependency_database.openDatabase(absolutePathToDatabase)
+    try:
+        function(dbConnection)
+    finally:
+        dbConnection.close()
+
+def computeWavesOfAllProjects(dbConnection):
+    graph = dependency_graph.loadDependencyGraph(dbConnection)
+    dependency_graph.computeBuildWaves(graph, sorted(graph.projectIdsByName.values()))
+
+def countRows(absolutePathToDatabase):
+    dbConnection = dependency_database.openDatabase(absolutePathToDatabase)
+    counts = {}
+    for tableName in ["SourceCodeProject", "DependsOn", "DependsOnClosure", "JenkinsBuildJob", "Builds"]:
+        counts[tableName] = dbConnection.execute("SELECT COUNT(*) FROM " + tableName).fetchone()[0]
+    dbConnection.close()
+    return counts
+
+def describeEnvironment():
+    return {"python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "git": runGit(["--version"], PATH_TO_REPOSITORY_ROOT),
+            "platform": platform.platform(),
+            "processors": os.cpu_count()}
+
+# Runs all stages. Stages which need a database of their own get a new one before each run.
+def runBenchmarks(absolutePathToWorkDirectory, args):
+    absolutePathToWorkspace = os.path.join(absolutePathToWorkDirectory, NAME_OF_WORKSPACE_DIRECTORY)
+    absolutePathToOriginDirectory = os.path.join(absolutePathToWorkDirectory, NAME_OF_ORIGIN_DIRECTORY)
+    absolutePathToJobsDirectory = os.path.join(absolutePathToWorkDirectory, NAME_OF_JOBS_DIRECTORY)
+    absolutePathToDatabase = os.path.join(absolutePathToWorkDirectory, FILE_NAME_OF_DATABASE)
+    checkouts = findCheckouts(absolutePathToWorkspace)
+    gitModulesFiles = [os.path.join(checkout, ".gitmodules") for checkout in checkouts if os.path.exists(os.path.join(checkout, ".gitmodules"))]
+    repetitions = max(1, args.repetitions)
+    prepareDatabase = lambda: createEmptyDatabase(absolutePathToDatabase)
+    stages = {}
+    # Finding the repositories in the workspace, as the scanner does for each directory it visits
+    stages["discovery"] = measureStage(repetitions, lambda: [scan_deps_in_git_repos.isGitRepository(checkout) for checkout in findCheckouts(absolutePathToWorkspace)])
+    stages["gitMetadata"] = measureStage(repetitions, lambda: [(scan_deps_in_git_repos.determineProjectName(checkout),
+                                                                  scan_deps_in_git_repos.determineRepositoryUrl(checkout),
+                                                                  scan_deps_in_git_repos.determineHeadCommit(checkout)) for checkout in checkouts])
+    stages["gitModulesParsing"] = measureStage(repetitions, lambda: [(scan_deps_in_git_repos.computeGitBlobId(gitModulesFile),
+                                                                        scan_deps_in_git_repos.parseGitModulesFile(gitModulesFile)) for gitModulesFile in gitModulesFiles])
+    stages["ingestCheckouts"] = measureStage(repetitions, lambda: ingestRepositories(absolutePathToDatabase, absolutePathToWorkspace, args.jobs, False, False), prepareDatabase)
+    stages["ingestCheckoutsIncrementally"] = measureStage(repetitions, lambda: ingestRepositories(absolutePathToDatabase, absolutePathToWorkspace, args.jobs, True, False))
+    stages["ingestBareRepositories"] = measureStage(repetitions, lambda: ingestRepositories(absolutePathToDatabase, absolutePathToOriginDirectory, args.jobs, False, True), prepareDatabase)
+    stages["ingestBuildJobs"] = measureStage(repetitions, lambda: ingestBuildJobs(absolutePathToDatabase, absolutePathToJobsDirectory, args.jobs), prepareDatabase)
+    # The remaining stages work on a database filled by all scanners
+    with open(os.devnull, 'w') as devNull, contextlib.redirect_stdout(devNull), contextlib.redirect_stderr(devNull):
+        createEmptyDatabase(absolutePathToDatabase)
+        ingestRepositories(absolutePathToDatabase, absolutePathToOriginDirectory, args.jobs, False, True)
+        ingestBuildJobs(absolutePathToDatabase, absolutePathToJobsDirectory, args.jobs)
+    stages["materializeBuilds"] = measureStage(repetitions, lambda: runOnDatabase(absolutePathToDatabase, materialize_important_queries.materializeBuildsRelation))
+    stages["rebuildClosure"] = measureStage(repetitions, lambda: runOnDatabase(absolutePathToDatabase, materialize_important_queries.materializeClosure))
+    stages["computeBuildWaves"] = measureStage(repetitions, lambda: runOnDatabase(absolutePathToDatabase, computeWavesOfAllProjects))
+    results = {}
+    for stageName, durations in stages.items():
+        results[stageName] = {"seconds": durations, "best": min(durations), "median": statistics.median(durations)}
+    return results, countRows(absolutePathToDatabase)
+
+# Prints the change of the best time of each stage compared to an earlier run
+def compareResults(currentResults, pathToBaseline):
+    with open(pathToBaseline, 'r') as baselineFile:
+        baselineResults = json.load(baselineFile)
+    if baselineResults["parameters"] != currentResults["parameters"]:
+        print("Warning: the baseline was measured with different parameters", file = sys.stderr)
+    for stageName, stageResult in currentResults["stages"].items():
+        baselineStageResult = baselineResults["stages"].get(stageName)
+        if baselineStageResult == None:
+            print(stageName.ljust(32), "%10.4fs" % stageResult["best"], "(not in baseline)", file = sys.stderr)
+            continue
+        ratio = stageResult["best"] / baselineStageResult["best"] if baselineStageResult["best"] > 0 else float("inf")
+        print(stageName.ljust(32), "%10.4fs" % baselineStageResult["best"], "->", "%10.4fs" % stageResult["best"],
+              "%+7.1f%%" % ((ratio - 1) * 100), file = sys.stderr)
+
+def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    if args.numberOfRepositories < 1:
+        argumentParser.error("--repositories must be at least 1")
+    if args.workDirectory != None:
+        absolutePathToWorkDirectory = os.path.abspath(args.workDirectory)
+        os.makedirs(absolutePathToWorkDirectory)
+    else:
+        absolutePathToWorkDirectory = tempfile.mkdtemp(prefix = "gitmodule_dependency_benchmark_")
+    try:
+        startTime = time.perf_counter()
+        workload = generateWorkload(absolutePathToWorkDirectory, args)
+        workload["generationSeconds"] = time.perf_counter() - startTime
+        stages, rowCounts = runBenchmarks(absolutePathToWorkDirectory, args)
+    finally:
+        if args.workDirectory == None:
+            shutil.rmtree(absolutePathToWorkDirectory, ignore_errors = True)
+    parameters = dict(vars(args))
+    for argumentName in ["workDirectory", "output", "compare"]:
+        del parameters[argumentName]
+    results = {"formatVersion": BENCHMARK_FORMAT_VERSION,
+               "parameters": parameters,
+               "environment": describeEnvironment(),
+               "workload": workload,
+               "rowCounts": rowCounts,
+               "stages": stages}
+    if args.output != None:
+        with open(args.output, 'w') as outputFile:
+            json.dump(results, outputFile, indent = 2)
+    else:
+        print(json.dumps(results, indent = 2))
+    if args.compare != None:
+        compareResults(results, args.compare)
+
+## Main ##
+if __name__ == "__main__":
+    main()
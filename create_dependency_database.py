@@ -15,41 +15,162 @@
 #limitations under the License.
 
 import os
+import argparse
 import sqlite3
 import sys
 
-DATABASE_FILE_NAME = "gitproject_dependency_database.db"
+from dependency_database import openDatabase, removeDatabase, resolvePathToSqlFile, DATABASE_FILE_NAME
+from dependency_closure import rebuildClosure
+from repository_url import canonicalizeRepositoryUrl
 
 # Paths to Data Definition Language (DDL) files. These are required for creating tables.
 PATH_TO_DDL_FOR_TABLE_SOURCE_CODE_PROJECT = "ddl/tableSourceCodeProject.sql"
 PATH_TO_DDL_FOR_TABLE_DEPENDS_ON = "ddl/tableDependsOn.sql"
 PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOBS = "ddl/tableJenkinsBuildJob.sql"
 PATH_TO_DDL_FOR_TABLE_BUILDS = "ddl/tableBuilds.sql"
+PATH_TO_DDL_FOR_TABLE_REPOSITORY_FINGERPRINT = "ddl/tableRepositoryFingerprint.sql"
+PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOB_REMOTE = "ddl/tableJenkinsBuildJobRemote.sql"
+PATH_TO_DDL_FOR_TABLE_DEPENDS_ON_CLOSURE = "ddl/tableDependsOnClosure.sql"
+PATH_TO_DDL_FOR_TABLE_DEPENDS_ON_HISTORY = "ddl/tableDependsOnHistory.sql"
 
-def createTableFromDdlFile(pathToDdlFile, dbCursor):
+# Paths to DDL files for changes to the schema which are applied on top of the baseline tables above
+PATH_TO_DDL_FOR_MIGRATION_UNIQUE_NAMES_AND_INDEXES = "ddl/migrations/uniqueNamesAndIndexes.sql"
+PATH_TO_DDL_FOR_MIGRATION_FILL_JENKINS_BUILD_JOB_REMOTE = "ddl/migrations/fillJenkinsBuildJobRemote.sql"
+PATH_TO_DDL_FOR_MIGRATION_DEPENDS_ON_CLOSURE_INDEXES = "ddl/migrations/dependsOnClosureIndexes.sql"
+PATH_TO_DDL_FOR_MIGRATION_COVERING_INDEX_FOR_DEPENDENTS = "ddl/migrations/coveringIndexForDependents.sql"
+PATH_TO_DDL_FOR_MIGRATION_CANONICAL_REPOSITORY_URLS = "ddl/migrations/canonicalRepositoryUrls.sql"
+PATH_TO_DDL_FOR_MIGRATION_BUILDS_CHANGE_LOG = "ddl/migrations/buildsChangeLog.sql"
+PATH_TO_DDL_FOR_MIGRATION_PINNED_COMMITS = "ddl/migrations/pinnedCommits.sql"
+PATH_TO_DDL_FOR_MIGRATION_DEPENDS_ON_HISTORY_INDEXES = "ddl/migrations/dependsOnHistoryIndexes.sql"
+
+# Schema version of a database containing only the baseline tables, i.e. SourceCodeProject, JenkinsBuildJob, DependsOn
+# and Builds. Databases created before schema versions were
+# introduced report version 0 and have the same schema.
+BASELINE_SCHEMA_VERSION = 1
+
+# Changes to the schema in the order in which they have to be applied. Each entry consists of the schema version
+# reached by the change and the DDL files to execute for it. New databases are created by applying all of them to the
+# baseline, so a change must never be modified once released; add a new entry instead.
+SCHEMA_MIGRATIONS = [
+    (2, [PATH_TO_DDL_FOR_MIGRATION_UNIQUE_NAMES_AND_INDEXES]),
+    (3, [PATH_TO_DDL_FOR_TABLE_REPOSITORY_FINGERPRINT]),
+    (4, [PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOB_REMOTE, PATH_TO_DDL_FOR_MIGRATION_FILL_JENKINS_BUILD_JOB_REMOTE]),
+    (5, [PATH_TO_DDL_FOR_TABLE_DEPENDS_ON_CLOSURE, PATH_TO_DDL_FOR_MIGRATION_DEPENDS_ON_CLOSURE_INDEXES]),
+    (6, [PATH_TO_DDL_FOR_MIGRATION_COVERING_INDEX_FOR_DEPENDENTS]),
+    (7, [PATH_TO_DDL_FOR_MIGRATION_CANONICAL_REPOSITORY_URLS]),
+    (8, [PATH_TO_DDL_FOR_MIGRATION_BUILDS_CHANGE_LOG]),
+    (9, [PATH_TO_DDL_FOR_MIGRATION_PINNED_COMMITS]),
+    (10, [PATH_TO_DDL_FOR_TABLE_DEPENDS_ON_HISTORY, PATH_TO_DDL_FOR_MIGRATION_DEPENDS_ON_HISTORY_INDEXES]),
+]
+
+LATEST_SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+# Changes to the contents which cannot be expressed in SQL efficiently, keyed by the schema version whose DDL files they
+# follow. Each is called with the connection in the transaction of its change and must not commit. The closure is
+# filled by a breadth-first search per project, as a recursive query would enumerate every chain of relations and
+# take cubic time on cycles.
+SCHEMA_MIGRATION_STEPS_IN_PYTHON = {
+    5: rebuildClosure,
+}
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Creates the database for storing the dependencies between projects and build jobs.")
+    parser.add_argument("-m", "--migrate",
+        dest = "migrate",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Upgrade an existing database to the latest schema in place, keeping its contents. Without this parameter, an existing database is deleted and created anew.")
+    parser.add_argument("--database",
+        dest = "database",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to create or upgrade, e.g. the partial database of a shard. Default: " + DATABASE_FILE_NAME + ".")
+    return parser
+
+def readDdlFile(pathToDdlFile):
     sqlCommand = ""
-    ddlFile = open(pathToDdlFile)
+    ddlFile = open(resolvePathToSqlFile(pathToDdlFile))
     for line in ddlFile:
         sqlCommand += line
     ddlFile.close()
-    dbCursor.execute(sqlCommand)
+    return sqlCommand
 
-def createDatabase():
-    connection = sqlite3.connect(DATABASE_FILE_NAME)
+def createTableFromDdlFile(pathToDdlFile, dbCursor):
+    dbCursor.execute(readDdlFile(pathToDdlFile))
+
+def getSchemaVersion(connection):
+    schemaVersion = connection.execute("PRAGMA user_version").fetchone()[0]
+    return max(schemaVersion, BASELINE_SCHEMA_VERSION)
+
+# Raises a ValueError if the database has not been migrated to the schema the scripts expect
+def assertSchemaIsUpToDate(connection):
+    schemaVersion = getSchemaVersion(connection)
+    if schemaVersion < LATEST_SCHEMA_VERSION:
+        raise ValueError("Database schema version " + str(schemaVersion) + " is outdated, version " + str(LATEST_SCHEMA_VERSION)
+                         + " is required. Run create_dependency_database.py --migrate to upgrade it.")
+
+# Applies all changes to the schema the database does not have yet. Each change is applied in a transaction of its
+# own, together with the update of the schema version. Each change is reported unless the database is being created.
+def migrateDatabase(connection, reportChanges = True):
+    schemaVersion = getSchemaVersion(connection)
+    # Functions the DDL files may use to fill new columns
+    connection.create_function("canonicalizeRepositoryUrl", 1, canonicalizeRepositoryUrl, deterministic = True)
+    for targetSchemaVersion, pathsToDdlFiles in SCHEMA_MIGRATIONS:
+        if targetSchemaVersion <= schemaVersion:
+            continue
+        if reportChanges:
+            print("Migrating database to schema version", targetSchemaVersion)
+        script = "BEGIN;\n"
+        for pathToDdlFile in pathsToDdlFiles:
+            script += readDdlFile(pathToDdlFile) + ";\n"
+        try:
+            # The transaction stays open after the script, so that the steps in Python are part of it
+            connection.executescript(script)
+            if targetSchemaVersion in SCHEMA_MIGRATION_STEPS_IN_PYTHON:
+                SCHEMA_MIGRATION_STEPS_IN_PYTHON[targetSchemaVersion](connection)
+            connection.execute("PRAGMA user_version = " + str(targetSchemaVersion))
+            connection.commit()
+        except:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+        schemaVersion = targetSchemaVersion
+
+def createDatabase(pathToDatabase = DATABASE_FILE_NAME):
+    connection = openDatabase(pathToDatabase)
     cursor = connection.cursor()
     createTableFromDdlFile(PATH_TO_DDL_FOR_TABLE_SOURCE_CODE_PROJECT, cursor)
     createTableFromDdlFile(PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOBS, cursor)
     createTableFromDdlFile(PATH_TO_DDL_FOR_TABLE_DEPENDS_ON, cursor)
     createTableFromDdlFile(PATH_TO_DDL_FOR_TABLE_BUILDS, cursor)
+    cursor.execute("PRAGMA user_version = " + str(BASELINE_SCHEMA_VERSION))
     connection.commit()
+    # A new database is not upgraded from anything, so building its schema is not reported as migrations
+    migrateDatabase(connection, reportChanges = False)
+    connection.close()
+
+def upgradeDatabase(pathToDatabase = DATABASE_FILE_NAME):
+    connection = openDatabase(pathToDatabase)
+    migrateDatabase(connection)
     connection.close()
 
 def main():
-    if os.path.exists(DATABASE_FILE_NAME):
-        os.remove(DATABASE_FILE_NAME)
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    if args.migrate and os.path.exists(args.database):
+        try:
+            upgradeDatabase(args.database)
+        except sqlite3.Error as e:
+            print("Error: migrating the database failed:", e, file = sys.stderr)
+            sys.exit(1)
+        return
+    if os.path.exists(args.database):
+        removeDatabase(args.database)
         #print("Error: database file already exists. Will not touch it", file = sys.stderr)
         #sys.exit(1)
-    createDatabase()
+    createDatabase(args.database)
 
 ## Main ##
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+-- Projects and build jobs whose repository URLs changed since Builds was last materialized. Filled by the triggers
+-- below and emptied by materialize_important_queries.py.
+CREATE TABLE BuildsChangeLog (
+    sourceProjectId INTEGER,
+    buildJobId INTEGER
+);
+
+CREATE TRIGGER LogInsertedSourceCodeProject AFTER INSERT ON SourceCodeProject
+BEGIN
+    INSERT INTO BuildsChangeLog (sourceProjectId) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER LogUpdatedSourceCodeProject AFTER UPDATE OF id, canonicalRepositoryUrl ON SourceCodeProject
+BEGIN
+    INSERT INTO BuildsChangeLog (sourceProjectId) VALUES (OLD.id);
+    INSERT INTO BuildsChangeLog (sourceProjectId) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER LogDeletedSourceCodeProject AFTER DELETE ON SourceCodeProject
+BEGIN
+    INSERT INTO BuildsChangeLog (sourceProjectId) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER LogInsertedJenkinsBuildJobRemote AFTER INSERT ON JenkinsBuildJobRemote
+BEGIN
+    INSERT INTO BuildsChangeLog (buildJobId) VALUES (NEW.buildJobId);
+END;
+
+CREATE TRIGGER LogUpdatedJenkinsBuildJobRemote AFTER UPDATE OF buildJobId, canonicalRepositoryUrl ON JenkinsBuildJobRemote
+BEGIN
+    INSERT INTO BuildsChangeLog (buildJobId) VALUES (OLD.buildJobId);
+    INSERT INTO BuildsChangeLog (buildJobId) VALUES (NEW.buildJobId);
+END;
+
+CREATE TRIGGER LogDeletedJenkinsBuildJobRemote AFTER DELETE ON JenkinsBuildJobRemote
+BEGIN
+    INSERT INTO BuildsChangeLog (buildJobId) VALUES (OLD.buildJobId);
+END;
+
+CREATE TRIGGER LogDeletedJenkinsBuildJob AFTER DELETE ON JenkinsBuildJob
+BEGIN
+    INSERT INTO BuildsChangeLog (buildJobId) VALUES (OLD.id);
+END;
+
+CREATE INDEX BuildsBySourceProject ON Builds (sourceProjectId);
@@ -0,0 +1,8 @@
+-- Key for matching projects and build jobs by repository, see repository_url.py. canonicalizeRepositoryUrl is
+-- registered by create_dependency_database.py.
+ALTER TABLE SourceCodeProject ADD COLUMN canonicalRepositoryUrl TEXT;
+ALTER TABLE JenkinsBuildJobRemote ADD COLUMN canonicalRepositoryUrl TEXT;
+UPDATE SourceCodeProject SET canonicalRepositoryUrl = canonicalizeRepositoryUrl(SourceCodeRepositoryName);
+UPDATE JenkinsBuildJobRemote SET canonicalRepositoryUrl = canonicalizeRepositoryUrl(sourceCodeRepositoryUrl);
+CREATE INDEX SourceCodeProjectByCanonicalRepositoryUrl ON SourceCodeProject (canonicalRepositoryUrl);
+CREATE INDEX JenkinsBuildJobRemoteByCanonicalRepositoryUrl ON JenkinsBuildJobRemote (canonicalRepositoryUrl, buildJobId);
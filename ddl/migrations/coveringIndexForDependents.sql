@@ -0,0 +1,3 @@
+-- Covers firstProject as well, so that the dependents of all projects can be read from the index alone
+DROP INDEX DependsOnBySecondProject;
+CREATE INDEX DependsOnBySecondProject ON DependsOn (secondProject, firstProject);
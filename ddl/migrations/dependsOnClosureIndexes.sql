@@ -0,0 +1,3 @@
+-- The impact of a change to a project is read for the project as descendant, nearest ancestors first. The rows of the
+-- table are computed by dependency_closure.rebuildClosure, see create_dependency_database.py.
+CREATE INDEX DependsOnClosureByDescendant ON DependsOnClosure (descendantProject, distance);
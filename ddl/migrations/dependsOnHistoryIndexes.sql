@@ -0,0 +1,3 @@
+-- The history of a project is replaced as a whole, and is read for a project as consumer or as dependency
+CREATE INDEX DependsOnHistoryByFirstProject ON DependsOnHistory (firstProject, validFromDate);
+CREATE INDEX DependsOnHistoryBySecondProject ON DependsOnHistory (secondProject, validFromDate);
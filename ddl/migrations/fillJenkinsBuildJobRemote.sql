@@ -0,0 +1,5 @@
+-- Build jobs may have more than one remote now. The remote stored with the job itself becomes its first remote.
+INSERT OR IGNORE INTO JenkinsBuildJobRemote (buildJobId, sourceCodeRepositoryUrl)
+SELECT id, sourceCodeRepositoryUrl FROM JenkinsBuildJob WHERE sourceCodeRepositoryUrl IS NOT NULL;
+
+CREATE INDEX JenkinsBuildJobRemoteByRepositoryUrl ON JenkinsBuildJobRemote (sourceCodeRepositoryUrl);
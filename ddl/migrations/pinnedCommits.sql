@@ -0,0 +1,10 @@
+-- Commit of the second project which the first one records for its submodule, NULL if it is not known
+ALTER TABLE DependsOn ADD COLUMN pinnedCommit TEXT;
+-- HEAD commit of the repository of the project when it was last scanned as a top-level repository, i.e. the commit
+-- pinned commits are compared with
+ALTER TABLE SourceCodeProject ADD COLUMN headCommit TEXT;
+
+-- Replaces the index of migration 6. The consumers of a project are grouped by the commit they pin, and firstProject
+-- is still covered for reading the dependents of all projects.
+DROP INDEX DependsOnBySecondProject;
+CREATE INDEX DependsOnBySecondProject ON DependsOn (secondProject, pinnedCommit, firstProject);
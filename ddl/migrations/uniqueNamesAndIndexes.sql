@@ -0,0 +1,23 @@
+-- Names of projects and build jobs become unique. Duplicates created by older versions are dropped, keeping the oldest entry.
+DELETE FROM SourceCodeProject
+WHERE id NOT IN (SELECT MIN(id) FROM SourceCodeProject GROUP BY sourceCodeProjectName);
+DELETE FROM JenkinsBuildJob
+WHERE id NOT IN (SELECT MIN(id) FROM JenkinsBuildJob GROUP BY buildJobName);
+
+-- Older versions stored project names instead of project ids in DependsOn
+UPDATE OR IGNORE DependsOn
+SET firstProject = (SELECT id FROM SourceCodeProject WHERE sourceCodeProjectName = DependsOn.firstProject)
+WHERE typeof(firstProject) = 'text';
+UPDATE OR IGNORE DependsOn
+SET secondProject = (SELECT id FROM SourceCodeProject WHERE sourceCodeProjectName = DependsOn.secondProject)
+WHERE typeof(secondProject) = 'text';
+DELETE FROM DependsOn
+WHERE typeof(firstProject) <> 'integer' OR typeof(secondProject) <> 'integer';
+DELETE FROM Builds
+WHERE buildJobId NOT IN (SELECT id FROM JenkinsBuildJob) OR sourceProjectId NOT IN (SELECT id FROM SourceCodeProject);
+
+CREATE UNIQUE INDEX SourceCodeProjectByName ON SourceCodeProject (sourceCodeProjectName);
+CREATE INDEX SourceCodeProjectByRepositoryName ON SourceCodeProject (SourceCodeRepositoryName);
+CREATE UNIQUE INDEX JenkinsBuildJobByName ON JenkinsBuildJob (buildJobName);
+CREATE INDEX JenkinsBuildJobByRepositoryUrl ON JenkinsBuildJob (sourceCodeRepositoryUrl);
+CREATE INDEX DependsOnBySecondProject ON DependsOn (secondProject);
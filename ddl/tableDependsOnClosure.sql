@@ -0,0 +1,8 @@
+CREATE TABLE DependsOnClosure (
+    ancestorProject INTEGER,
+    descendantProject INTEGER,
+    distance INTEGER,
+    PRIMARY KEY (ancestorProject, descendantProject),
+    FOREIGN KEY(ancestorProject) REFERENCES SourceCodeProject(id),
+    FOREIGN KEY(descendantProject) REFERENCES SourceCodeProject(id)
+)
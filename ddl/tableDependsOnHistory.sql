@@ -0,0 +1,10 @@
+CREATE TABLE DependsOnHistory (
+    firstProject INTEGER,
+    secondProject INTEGER,
+    validFromCommit TEXT,
+    validFromDate INTEGER,
+    validToCommit TEXT,
+    validToDate INTEGER,
+    FOREIGN KEY(firstProject) REFERENCES SourceCodeProject(id),
+    FOREIGN KEY(secondProject) REFERENCES SourceCodeProject(id)
+)
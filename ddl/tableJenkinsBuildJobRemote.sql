@@ -0,0 +1,6 @@
+CREATE TABLE JenkinsBuildJobRemote (
+    buildJobId INTEGER,
+    sourceCodeRepositoryUrl TEXT,
+    PRIMARY KEY (buildJobId, sourceCodeRepositoryUrl),
+    FOREIGN KEY(buildJobId) REFERENCES JenkinsBuildJob(id)
+)
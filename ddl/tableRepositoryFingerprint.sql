@@ -0,0 +1,7 @@
+CREATE TABLE RepositoryFingerprint (
+    repositoryPath TEXT PRIMARY KEY,
+    projectId INTEGER,
+    headCommit TEXT,
+    gitModulesBlobId TEXT,
+    FOREIGN KEY(projectId) REFERENCES SourceCodeProject(id)
+)
@@ -0,0 +1,108 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Maintenance of DependsOnClosure, the transitive closure of DependsOn. A row (ancestorProject, descendantProject,
+# distance) means that ancestorProject depends on descendantProject via a chain of distance DependsOn relations, the
+# shortest one there is. The functions below keep the closure up to date when relations are added to or removed from
+# DependsOn, without rebuilding it.
+
+# For a new relation first -> second, every project depending on first (and first itself) now depends on second and
+# everything second depends on (and second itself)
+sqlCmdForAddingRelationToClosure = """INSERT INTO DependsOnClosure (ancestorProject, descendantProject, distance)
+SELECT up.ancestorProject, down.descendantProject, MIN(up.distance + 1 + down.distance)
+FROM (SELECT ancestorProject, distance FROM DependsOnClosure WHERE descendantProject = :firstProject
+      UNION ALL SELECT :firstProject, 0) up,
+     (SELECT descendantProject, distance FROM DependsOnClosure WHERE ancestorProject = :secondProject
+      UNION ALL SELECT :secondProject, 0) down
+WHERE up.ancestorProject <> down.descendantProject
+GROUP BY up.ancestorProject, down.descendantProject
+ON CONFLICT (ancestorProject, descendantProject) DO UPDATE SET distance = MIN(distance, excluded.distance)"""
+sqlQueryForAncestors = "SELECT ancestorProject FROM DependsOnClosure WHERE descendantProject = ?"
+sqlQueryForDescendants = "SELECT descendantProject, distance FROM DependsOnClosure WHERE ancestorProject = ?"
+sqlQueryForDirectDependencies = "SELECT secondProject FROM DependsOn WHERE firstProject = ?"
+sqlQueryForAllRelations = "SELECT firstProject, secondProject FROM DependsOn"
+sqlCmdForDeletingClosureOfProject = "DELETE FROM DependsOnClosure WHERE ancestorProject = ?"
+sqlCmdForCleaningClosure = "DELETE FROM DependsOnClosure"
+sqlCmdForInsertingIntoClosure = "INSERT INTO DependsOnClosure (ancestorProject, descendantProject, distance) VALUES (?, ?, ?)"
+
+# Must be called after the relations have been inserted into DependsOn. Relations which already existed are fine.
+def addRelationsToClosure(dbCursor, relations):
+    parameters = []
+    for firstProject, secondProject in relations:
+        parameters.append({"firstProject": firstProject, "secondProject": secondProject})
+    dbCursor.executemany(sqlCmdForAddingRelationToClosure, parameters)
+
+# Must be called after the relations have been deleted from DependsOn (and after addRelationsToClosure for relations
+# inserted at the same time). Only the projects depending on the first project of a removed relation can lose
+# descendants, so only their part of the closure is computed again.
+def removeRelationsFromClosure(dbCursor, relations):
+    affectedProjects = set()
+    for firstProject, secondProject in relations:
+        affectedProjects.add(firstProject)
+        for dataRow in dbCursor.execute(sqlQueryForAncestors, [firstProject]).fetchall():
+            affectedProjects.add(dataRow[0])
+    for projectId in affectedProjects:
+        recomputeClosureOfProject(dbCursor, projectId, affectedProjects)
+
+# Computes the descendants of the project by a breadth-first search over DependsOn. The search does not need to expand
+# projects outside of affectedProjects, since their part of the closure is still correct and can be used instead.
+def recomputeClosureOfProject(dbCursor, projectId, affectedProjects):
+    distances = {}
+    visitedProjects = set([projectId])
+    projectsToExpand = [projectId]
+    distance = 0
+    while len(projectsToExpand) > 0:
+        distance += 1
+        nextProjectsToExpand = []
+        for currentProject in projectsToExpand:
+            for dataRow in dbCursor.execute(sqlQueryForDirectDependencies, [currentProject]).fetchall():
+                descendant = dataRow[0]
+                if descendant in visitedProjects:
+                    continue
+                visitedProjects.add(descendant)
+                updateDistance(distances, descendant, distance)
+                if descendant in affectedProjects:
+                    nextProjectsToExpand.append(descendant)
+                    continue
+                for closureRow in dbCursor.execute(sqlQueryForDescendants, [descendant]).fetchall():
+                    updateDistance(distances, closureRow[0], distance + closureRow[1])
+        projectsToExpand = nextProjectsToExpand
+    distances.pop(projectId, None)
+    dbCursor.execute(sqlCmdForDeletingClosureOfProject, [projectId])
+    dbCursor.executemany(sqlCmdForInsertingIntoClosure, [(projectId, descendant, distances[descendant]) for descendant in distances])
+
+def updateDistance(distances, projectId, distance):
+    if projectId not in distances or distances[projectId] > distance:
+        distances[projectId] = distance
+
+# Computes the whole closure from scratch, e.g. to repair it. Does not commit.
+def rebuildClosure(dbConnection):
+    dependenciesByProject = {}
+    cursor = dbConnection.cursor()
+    for firstProject, secondProject in cursor.execute(sqlQueryForAllRelations):
+        dependenciesByProject.setdefault(firstProject, []).append(secondProject)
+    cursor.execute(sqlCmdForCleaningClosure)
+    for projectId in dependenciesByProject:
+        distances = {projectId: 0}
+        projectsToExpand = [projectId]
+        while len(projectsToExpand) > 0:
+            nextProjectsToExpand = []
+            for currentProject in projectsToExpand:
+                for descendant in dependenciesByProject.get(currentProject, []):
+                    if descendant not in distances:
+                        distances[descendant] = distances[currentProject] + 1
+                        nextProjectsToExpand.append(descendant)
+            projectsToExpand = nextProjectsToExpand
+        del distances[projectId]
+        cursor.executemany(sqlCmdForInsertingIntoClosure, [(projectId, descendant, distances[descendant]) for descendant in distances])
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Keeps the database up to date while running: the directory with the Git repositories and the directory with the
+# Jenkins job descriptions are polled, and only the repositories and files which changed since the last poll are scanned
+# again, by the same functions the scanners use. The database connection, the writer with its ids of all projects and
+# build jobs, and a copy of the dependency graph stay in memory between the polls. Queries are answered from the
+# copy of the graph over a Unix socket, without touching the database.
+#
+# Protocol: the client sends one JSON object per line, e.g. {"query": "impact", "project": "logging"}, and receives one
+# JSON object per line, {"result": ...} or {"error": "message"}. A connection can be used for several queries.
+
+import os
+import argparse
+import json
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from dependency_database import connectToDatabase, runWithRetry, DATABASE_FILE_NAME
+from dependency_database_writer import DependencyDatabaseWriter, DEFAULT_BATCH_SIZE
+from dependency_graph import loadDependencyGraph, findAffectedProjects, describeBuildWaves
+import directory_walker
+import git_metadata
+from git_metadata import UnsupportedRepositoryLayoutError
+from git_object_store import isBareRepository
+from materialize_important_queries import updateBuildsRelation
+from scan_buildjobs import scanDirectoryForXmlFiles, processXmlJobDescription
+from scan_deps_in_git_repos import analyzeGitRepositories, indexBareRepositoriesByProjectName, DEFAULT_MAX_SUBMODULE_DEPTH
+import scan_metrics
+from scan_metrics import measurePhase
+
+DEFAULT_SOCKET_PATH = "gitproject_dependency_database.sock"
+DEFAULT_POLL_INTERVAL_IN_SECONDS = 10
+# Everything is scanned again this often without the fingerprints of the repositories, to catch changes the polling
+# cannot see (e.g. inside submodules)
+DEFAULT_FULL_SCAN_INTERVAL_IN_SECONDS = 3600
+
+SOCKET_ENCODING = 'utf-8'
+
+QUERY_IMPACT = "impact"
+QUERY_WAVES = "waves"
+QUERY_STATUS = "status"
+
+# Files of a repository which change when a commit is checked out, created or fetched, or when .gitmodules is edited.
+# The refs directories change when a loose ref is written, since refs are replaced by renaming a lock file.
+NAMES_OF_WATCHED_FILES_IN_GIT_DIRECTORY = ["HEAD", "index", git_metadata.FILE_NAME_OF_PACKED_REFS, "refs/heads", "refs/tags"]
+NAMES_OF_WATCHED_FILES_IN_WORKING_TREE = [".gitmodules"]
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Keeps the database up to date by scanning changed repositories and Jenkins job descriptions, and answers queries about the dependencies over a Unix socket.")
+    parser.add_argument("-d", "--directory",
+        dest = "directory",
+        action = "store",
+        help = "Directory containing the Git repositories, as for scan_deps_in_git_repos.py -a -d.")
+    parser.add_argument("--jenkins-jobs",
+        dest = "jenkinsJobs",
+        action = "store",
+        help = "Directory containing the Jenkins job descriptions, as for scan_buildjobs.py -d.")
+    parser.add_argument("-b", "--bare",
+        dest = "bare",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "The directory contains bare repositories (e.g. mirrors), see scan_deps_in_git_repos.py --bare.")
+    parser.add_argument("-s", "--socket",
+        dest = "socket",
+        action = "store",
+        default = DEFAULT_SOCKET_PATH,
+        help = "Path of the Unix socket to listen on. Default: " + DEFAULT_SOCKET_PATH + ".")
+    parser.add_argument("--interval",
+        dest = "interval",
+        action = "store",
+        type = float,
+        default = DEFAULT_POLL_INTERVAL_IN_SECONDS,
+        help = "Seconds between two polls for changes. Default: " + str(DEFAULT_POLL_INTERVAL_IN_SECONDS) + ".")
+    parser.add_argument("--full-scan-interval",
+        dest = "fullScanInterval",
+        action = "store",
+        type = float,
+        default = DEFAULT_FULL_SCAN_INTERVAL_IN_SECONDS,
+        help = "Seconds after which all repositories and job descriptions are scanned again, changed or not. Repositories are not skipped by their fingerprints in this scan. Default: " + str(DEFAULT_FULL_SCAN_INTERVAL_IN_SECONDS) + ".")
+    parser.add_argument("-j", "--jobs",
+        dest = "jobs",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Number of threads scanning the changed repositories in parallel. Default: 1.")
+    parser.add_argument("--max-depth",
+        dest = "maxDepth",
+        action = "store",
+        type = int,
+        default = DEFAULT_MAX_SUBMODULE_DEPTH,
+        help = "Maximum nesting depth of submodules which are followed. Default: " + str(DEFAULT_MAX_SUBMODULE_DEPTH) + ".")
+    parser.add_argument("--batch-size",
+        dest = "batchSize",
+        action = "store",
+        type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = "Number of rows written to the database per transaction. Default: " + str(DEFAULT_BATCH_SIZE) + ".")
+    parser.add_argument("--database",
+        dest = "database",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to keep up to date and to answer the queries from, e.g. the partial database of a shard. Default: " + DATABASE_FILE_NAME + ".")
+    directory_walker.addArguments(parser)
+    scan_metrics.addArguments(parser)
+    return parser
+
+# Returns the modification times and sizes of the given files, None for those which do not exist
+def statFiles(absolutePathToDirectory, fileNames):
+    fileStates = []
+    for fileName in fileNames:
+        try:
+            fileStatus = os.stat(os.path.join(absolutePathToDirectory, fileName))
+            fileStates.append((fileStatus.st_mtime_ns, fileStatus.st_size))
+        except OSError:
+            fileStates.append(None)
+    return tuple(fileStates)
+
+# Returns a value which changes whenever the repository in the given directory changes in a way relevant to the
+# scanners, or None if that cannot be determined, in which case the repository is scanned at every poll
+def computeChangeSignature(absolutePathToObject):
+    if isBareRepository(absolutePathToObject):
+        return statFiles(absolutePathToObject, NAMES_OF_WATCHED_FILES_IN_GIT_DIRECTORY)
+    try:
+        repositoryLocation = git_metadata.findRepository(absolutePathToObject)
+    except UnsupportedRepositoryLayoutError:
+        return None
+    if repositoryLocation == None:
+        # Not a repository (yet), only a new entry would make it one
+        return statFiles(absolutePathToObject, ["."])
+    return (statFiles(repositoryLocation.gitDirectory, NAMES_OF_WATCHED_FILES_IN_GIT_DIRECTORY)
+            + statFiles(repositoryLocation.topLevelDirectory, NAMES_OF_WATCHED_FILES_IN_WORKING_TREE))
+
+# Remembers what was seen at the last poll. Paths which disappeared are forgotten; like the scanners, the daemon does
+# not delete their projects or build jobs from the database.
+class ChangeWatcher:
+    absolutePathToRepositories = None
+    absolutePathToJobDescriptions = None
+    ignorePatterns = None
+    signaturesByRepositoryPath = None
+    signaturesByJobDescriptionPath = None
+
+    def __init__(self, absolutePathToRepositories, absolutePathToJobDescriptions, ignorePatterns = ()):
+        self.absolutePathToRepositories = absolutePathToRepositories
+        self.absolutePathToJobDescriptions = absolutePathToJobDescriptions
+        self.ignorePatterns = ignorePatterns
+        self.forget()
+
+    # The next poll reports everything as changed
+    def forget(self):
+        self.signaturesByRepositoryPath = {}
+        self.signaturesByJobDescriptionPath = {}
+
+    def findChangedRepositories(self):
+        if self.absolutePathToRepositories == None:
+            return []
+        signaturesByRepositoryPath = {}
+        changedRepositoryPaths = []
+        for absPathToDir in directory_walker.walkRepositories(self.absolutePathToRepositories, self.ignorePatterns):
+            with measurePhase("discovery"):
+                signature = computeChangeSignature(absPathToDir)
+            signaturesByRepositoryPath[absPathToDir] = signature
+            if signature == None or self.signaturesByRepositoryPath.get(absPathToDir) != signature:
+                changedRepositoryPaths.append(absPathToDir)
+        self.signaturesByRepositoryPath = signaturesByRepositoryPath
+        return changedRepositoryPaths
+
+    def findChangedJobDescriptions(self):
+        if self.absolutePathToJobDescriptions == None:
+            return []
+        signaturesByJobDescriptionPath = {}
+        changedJobDescriptionPaths = []
+        for xmlFile in scanDirectoryForXmlFiles(self.absolutePathToJobDescriptions, self.ignorePatterns):
+            signature = statFiles(os.path.dirname(xmlFile), [os.path.basename(xmlFile)])
+            signaturesByJobDescriptionPath[xmlFile] = signature
+            if self.signaturesByJobDescriptionPath.get(xmlFile) != signature:
+                changedJobDescriptionPaths.append(xmlFile)
+        self.signaturesByJobDescriptionPath = signaturesByJobDescriptionPath
+        return changedJobDescriptionPaths
+
+# The graph is replaced as a whole after each scan which changed the database, so the threads answering queries see
+# either the old or the new one, never a mix
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    graph = None
+    timeOfLastScan = None
+
+    def answerQuery(self, request):
+        graph = self.graph
+        queryName = request.get("query")
+        if queryName == QUERY_IMPACT:
+            return answerImpactQuery(graph, request.get("project"))
+        if queryName == QUERY_WAVES:
+            return describeBuildWaves(graph, getProjectNamesOfWavesQuery(request))
+        if queryName == QUERY_STATUS:
+            return {"projects": len(graph.projectIdsByName),
+                    "dependencies": len(graph.dependents),
+                    "lastScan": self.timeOfLastScan}
+        raise ValueError("Unknown query: " + str(queryName))
+
+# Returns the changed projects of a waves query, None for all projects
+def getProjectNamesOfWavesQuery(request):
+    projectNames = request.get("projects")
+    if projectNames == None:
+        return None
+    if not isinstance(projectNames, list) or not all(isinstance(projectName, str) for projectName in projectNames):
+        raise ValueError("The projects of a waves query must be a list of project names")
+    return projectNames
+
+class QueryRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"result": self.server.answerQuery(json.loads(line.decode(SOCKET_ENCODING)))}
+            except (ValueError, TypeError, AttributeError) as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode(SOCKET_ENCODING) + b"\n")
+            self.wfile.flush()
+
+# Same result as the impact query of query_dependency_database.py: the affected projects as (name, distance) and the
+# build jobs building the project or one of them as (build job name, project name, distance)
+def answerImpactQuery(graph, projectName):
+    if projectName not in graph.projectIdsByName:
+        raise ValueError("Unknown project: " + str(projectName))
+    projectId = graph.projectIdsByName[projectName]
+    affectedProjects = [(projectId, 0)] + findAffectedProjects(graph, projectId)
+    affectedBuildJobs = []
+    for affectedProjectId, distance in affectedProjects:
+        for buildJobName in graph.buildJobNamesByProjectId.get(affectedProjectId, []):
+            affectedBuildJobs.append((buildJobName, graph.projectNames[affectedProjectId], distance))
+    affectedBuildJobs.sort(key = lambda affectedBuildJob: (affectedBuildJob[2], affectedBuildJob[0]))
+    projects = sorted(((graph.projectNames[affectedProjectId], distance) for affectedProjectId, distance in affectedProjects[1:]),
+                      key = lambda affectedProject: (affectedProject[1], affectedProject[0]))
+    return {"projects": projects, "buildJobs": affectedBuildJobs}
+
+# Sends a single query to the daemon listening on the given socket and returns its result
+def queryDaemon(pathToSocket, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as clientSocket:
+        clientSocket.connect(pathToSocket)
+        clientSocket.sendall(json.dumps(request).encode(SOCKET_ENCODING) + b"\n")
+        with clientSocket.makefile('rb') as responseFile:
+            responseLine = responseFile.readline()
+    if len(responseLine) == 0:
+        raise ConnectionError("The daemon closed the connection without answering")
+    response = json.loads(responseLine.decode(SOCKET_ENCODING))
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response["result"]
+
+# A socket file left behind by a daemon which did not shut down cleanly is removed, one in use is not
+def createQueryServer(pathToSocket):
+    if os.path.exists(pathToSocket):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as clientSocket:
+            try:
+                clientSocket.connect(pathToSocket)
+            except ConnectionRefusedError:
+                os.remove(pathToSocket)
+            else:
+                raise ValueError("Another daemon is listening on " + pathToSocket)
+    return QueryServer(pathToSocket, QueryRequestHandler)
+
+# Scans what changed since the last poll. Builds is updated incrementally and the graph reloaded only if the scans
+# wrote anything.
+# In a full scan, the repositories are scanned even if their fingerprints did not change
+def scanChanges(dbConnection, dbWriter, watcher, queryServer, args, isFullScan = False):
+    changedRepositoryPaths = watcher.findChangedRepositories()
+    changedJobDescriptionPaths = watcher.findChangedJobDescriptions()
+    if len(changedRepositoryPaths) == 0 and len(changedJobDescriptionPaths) == 0:
+        return
+    startTime = time.perf_counter()
+    numberOfChangesBefore = dbConnection.total_changes
+    dbWriter.startScan()
+    if len(changedRepositoryPaths) > 0:
+        # Submodules of bare repositories are looked up among all repositories found, changed or not
+        bareRepositoriesByProjectName = indexBareRepositoriesByProjectName(watcher.signaturesByRepositoryPath.keys()) if args.bare else None
+        analyzeGitRepositories(changedRepositoryPaths, dbWriter, args.jobs, args.maxDepth, not isFullScan, args.bare, bareRepositoriesByProjectName)
+    for xmlFile in changedJobDescriptionPaths:
+        processXmlJobDescription(dbWriter, xmlFile)
+    dbWriter.flush()
+    if dbConnection.total_changes != numberOfChangesBefore:
+        with measurePhase("materialize builds"):
+            runWithRetry(dbConnection, lambda: updateBuildsRelation(dbConnection))
+        with measurePhase("load graph"):
+            queryServer.graph = loadDependencyGraph(dbConnection)
+    queryServer.timeOfLastScan = time.time()
+    print("Scanned", len(changedRepositoryPaths), "repositories and", len(changedJobDescriptionPaths), "job descriptions in",
+          round(time.perf_counter() - startTime, 2), "s")
+
+def runDaemon(args):
+    assertArgumentConsistency(args)
+    absolutePathToRepositories = os.path.abspath(args.directory) if args.directory != None else None
+    absolutePathToJobDescriptions = os.path.abspath(args.jenkinsJobs) if args.jenkinsJobs != None else None
+    for absolutePathToObject in (absolutePathToRepositories, absolutePathToJobDescriptions):
+        if absolutePathToObject != None and not os.path.isdir(absolutePathToObject):
+            raise NotADirectoryError("Not a directory: " + absolutePathToObject)
+    dbConnection = connectToDatabase(args.database)
+    dbWriter = DependencyDatabaseWriter(dbConnection, args.batchSize)
+    watcher = ChangeWatcher(absolutePathToRepositories, absolutePathToJobDescriptions, args.ignorePatterns)
+    queryServer = createQueryServer(args.socket)
+    queryServer.graph = loadDependencyGraph(dbConnection)
+    serverThread = threading.Thread(target = queryServer.serve_forever, daemon = True)
+    serverThread.start()
+    # SystemExit runs the cleanup below, like an interrupt does
+    signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0))
+    print("Listening on", args.socket)
+    try:
+        timeOfLastFullScan = time.monotonic()
+        while True:
+            isFullScan = time.monotonic() - timeOfLastFullScan >= args.fullScanInterval
+            if isFullScan:
+                watcher.forget()
+                timeOfLastFullScan = time.monotonic()
+            scanChanges(dbConnection, dbWriter, watcher, queryServer, args, isFullScan)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queryServer.shutdown()
+        queryServer.server_close()
+        os.remove(args.socket)
+        dbWriter.close()
+        dbConnection.close()
+
+def assertArgumentConsistency(args):
+    if args.directory == None and args.jenkinsJobs == None:
+        raise ValueError("Incorrect arguments. At least one of --directory and --jenkins-jobs must be set.")
+
+def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    try:
+        scan_metrics.runWithMetrics(args, lambda: runDaemon(args))
+    except (NotADirectoryError, FileNotFoundError, ValueError) as e:
+        print("Error:", e, file = sys.stderr)
+        sys.exit(1)
+
+
+## Main ##
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Opens the database the same way for all scripts, so that they can run at the same time: in WAL mode, readers do not
+# block the writer and the writer does not block readers. Writers wait for each other (busy timeout) and take the
+# write lock at the start of each transaction, so that a transaction never fails halfway because another writer
+# committed in between. A transaction which still fails because the database is locked is retried as a whole by
+# runWithRetry.
+
+import os
+import sqlite3
+import time
+
+DATABASE_FILE_NAME = "gitproject_dependency_database.db"
+
+# The ddl/ and dml/ directories are next to the modules, so that the scripts and the modules used as a library work
+# from any working directory
+PATH_TO_SQL_FILES_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Files SQLite keeps next to the database in WAL mode
+SUFFIXES_OF_AUXILIARY_FILES = ["-wal", "-shm", "-journal"]
+
+BUSY_TIMEOUT_IN_SECONDS = 30.0
+# In KiB, i.e. 64 MiB instead of the default 2 MiB. Negative values of cache_size are sizes rather than pages.
+CACHE_SIZE_IN_KIB = 64 * 1024
+# Statements prepared once per connection and reused, keyed by their text. The default is 128, which the scanners and
+# the daemon together come close to.
+NUMBER_OF_CACHED_STATEMENTS = 256
+
+MAX_NUMBER_OF_ATTEMPTS = 5
+FIRST_RETRY_DELAY_IN_SECONDS = 0.1
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+# Returns the path of a DDL or DML file given relative to the repository, e.g. "dml/queryForAllBuilds.sql"
+def resolvePathToSqlFile(pathToSqlFile):
+    return os.path.join(PATH_TO_SQL_FILES_ROOT, pathToSqlFile)
+
+# Opens (or creates) the database at the given path. synchronous = NORMAL is durable in WAL mode except for the last
+# transactions before a power loss, which the next scan writes again anyway.
+def openDatabase(pathToDatabase = DATABASE_FILE_NAME):
+    dbConnection = sqlite3.connect(pathToDatabase, timeout = BUSY_TIMEOUT_IN_SECONDS, isolation_level = "IMMEDIATE",
+                                   cached_statements = NUMBER_OF_CACHED_STATEMENTS)
+    dbConnection.execute("PRAGMA journal_mode = WAL")
+    dbConnection.execute("PRAGMA synchronous = NORMAL")
+    dbConnection.execute("PRAGMA cache_size = " + str(-CACHE_SIZE_IN_KIB))
+    dbConnection.execute("PRAGMA temp_store = MEMORY")
+    return dbConnection
+
+def connectToDatabase(pathToDatabase = DATABASE_FILE_NAME):
+    if not os.path.exists(pathToDatabase):
+        raise FileNotFoundError("Database file not found: " + pathToDatabase)
+    return openDatabase(pathToDatabase)
+
+# Deletes the database together with its write-ahead log, which would otherwise be applied to a new database
+def removeDatabase(pathToDatabase = DATABASE_FILE_NAME):
+    for suffix in [""] + SUFFIXES_OF_AUXILIARY_FILES:
+        if os.path.exists(pathToDatabase + suffix):
+            os.remove(pathToDatabase + suffix)
+
+def isBusyError(e):
+    errorCode = getattr(e, "sqlite_errorcode", None)
+    if errorCode != None:
+        return errorCode & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    return "locked" in str(e) or "busy" in str(e)
+
+# Runs the given function, which writes one transaction and commits it, again if the database was locked by another
+# writer for longer than the busy timeout. The function must leave nothing behind when its transaction is rolled back.
+def runWithRetry(dbConnection, writeTransaction):
+    retryDelay = FIRST_RETRY_DELAY_IN_SECONDS
+    for attempt in range(1, MAX_NUMBER_OF_ATTEMPTS + 1):
+        try:
+            return writeTransaction()
+        except sqlite3.OperationalError as e:
+            if dbConnection.in_transaction:
+                dbConnection.rollback()
+            if not isBusyError(e) or attempt == MAX_NUMBER_OF_ATTEMPTS:
+                raise
+        time.sleep(retryDelay)
+        retryDelay *= 2
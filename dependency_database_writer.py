@@ -0,0 +1,351 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import collections
+import functools
+
+from create_dependency_database import assertSchemaIsUpToDate
+from dependency_database import runWithRetry, resolvePathToSqlFile
+from dependency_closure import addRelationsToClosure, removeRelationsFromClosure
+from repository_url import canonicalizeRepositoryUrl
+import scan_metrics
+from scan_metrics import measurePhase
+
+PATH_TO_DML_QUERY_FOR_ALL_SOURCE_PROJECTS = "dml/queryForAllSourceCodeProjects.sql"
+PATH_TO_DML_QUERY_FOR_ALL_BUILD_JOBS = "dml/queryForAllBuildJobs.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_SOURCE_PROJECT = "dml/cmdForInsertingNewProject.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION = "dml/cmdForInsertingDependsOnRelation.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_BUILD_JOB = "dml/cmdForInsertingNewBuildJob.sql"
+PATH_TO_DML_QUERY_FOR_ALL_BUILD_JOB_REMOTES = "dml/queryForAllBuildJobRemotes.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_REMOTE = "dml/cmdForInsertingBuildJobRemote.sql"
+PATH_TO_DML_COMMAND_FOR_DELETING_BUILD_JOB_REMOTES = "dml/cmdForDeletingBuildJobRemotes.sql"
+PATH_TO_DML_COMMAND_FOR_DELETING_DEPENDS_ON_RELATION = "dml/cmdForDeletingDependsOnRelation.sql"
+PATH_TO_DML_COMMAND_FOR_UPDATING_PINNED_COMMIT = "dml/cmdForUpdatingPinnedCommit.sql"
+PATH_TO_DML_COMMAND_FOR_UPDATING_HEAD_COMMIT = "dml/cmdForUpdatingHeadCommit.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_HISTORY = "dml/cmdForInsertingDependsOnHistory.sql"
+PATH_TO_DML_COMMAND_FOR_DELETING_DEPENDS_ON_HISTORY = "dml/cmdForDeletingDependsOnHistory.sql"
+PATH_TO_DML_QUERY_FOR_ALL_REPOSITORY_FINGERPRINTS = "dml/queryForAllRepositoryFingerprints.sql"
+PATH_TO_DML_COMMAND_FOR_STORING_REPOSITORY_FINGERPRINT = "dml/cmdForStoringRepositoryFingerprint.sql"
+
+# Number of buffered rows after which they are written to the database in one transaction
+DEFAULT_BATCH_SIZE = 1000
+
+# The stored dependencies of the projects in a batch and the ids of its new projects and build jobs are read with one
+# query per this many parameters, which stays below the limit of SQLite on the number of parameters of a statement
+MAX_NUMBER_OF_PARAMETERS_PER_QUERY = 500
+sqlQueryForDependenciesOfProjects = "SELECT firstProject, secondProject, pinnedCommit FROM DependsOn WHERE firstProject IN ({})"
+sqlQueryForIdsOfProjects = "SELECT sourceCodeProjectName, id FROM SourceCodeProject WHERE sourceCodeProjectName IN ({})"
+sqlQueryForIdsOfBuildJobs = "SELECT buildJobName, id FROM JenkinsBuildJob WHERE buildJobName IN ({})"
+
+# The files are read once per process, as long-running processes like the daemon prepare the same statements repeatedly
+@functools.lru_cache(maxsize = None)
+def prepareSqlStatementFromFile(pathToFile):
+    statementFromFile = ""
+    with open(resolvePathToSqlFile(pathToFile), 'r') as inputFile:
+        statementFromFile = inputFile.read()
+    statementFromFile = statementFromFile.replace("\n", " ")
+    return statementFromFile
+
+# Returns the rows of the query, whose list of parameters is given as "{}", for all of the given parameters
+def queryForAllParameters(cursor, sqlQuery, parameters):
+    parameters = list(parameters)
+    dataRows = []
+    for start in range(0, len(parameters), MAX_NUMBER_OF_PARAMETERS_PER_QUERY):
+        parametersOfQuery = parameters[start:start + MAX_NUMBER_OF_PARAMETERS_PER_QUERY]
+        dataRows.extend(cursor.execute(sqlQuery.format(", ".join("?" * len(parametersOfQuery))), parametersOfQuery).fetchall())
+    return dataRows
+
+# Collects the results of the scanners and writes them to the database in batches. The ids of all projects and build
+# jobs are kept in memory, so that no query is needed to find out whether a row already exists. The pending rows refer
+# to projects and build jobs by name: new ones get their ids from the database when the batch is written, so several
+# writers can add projects and build jobs to the same database at the same time.
+class DependencyDatabaseWriter:
+    dbConnection = None
+    batchSize = DEFAULT_BATCH_SIZE
+    # Ids of the projects and build jobs stored in the database
+    projectIdsByName = None
+    buildJobIdsByName = None
+    # URLs and remotes of the build jobs as stored or pending
+    buildJobUrlsByName = None
+    buildJobRemotesByName = None
+    # Project name -> (remote URL, canonical remote URL) of the projects not stored yet
+    pendingProjects = None
+    pendingBuildJobs = None
+    pendingBuildJobRemotes = None
+    pendingBuildJobRemoteRemovals = None
+    # Project name -> {project name of dependency -> pinned commit}. The rows to insert, delete and update are
+    # determined against the stored dependencies when the batch is written.
+    pendingDependenciesByProjectName = None
+    # Projects of pendingDependenciesByProjectName whose stored dependencies are replaced rather than added to
+    projectNamesWithPendingReplacement = None
+    numberOfPendingDependencies = 0
+    pendingHeadCommits = None
+    pendingDependencyHistory = None
+    pendingDependencyHistoryRemovals = None
+    pendingRepositoryFingerprints = None
+    projectNamesWithReplacedDependencies = None
+    # (project name, project name of dependency) of the dependencies given since the start of the scan
+    replacedDependencies = None
+    projectNamesWithReplacedDependencyHistory = None
+
+    def __init__(self, dbConnection, batchSize = DEFAULT_BATCH_SIZE):
+        assertSchemaIsUpToDate(dbConnection)
+        self.dbConnection = dbConnection
+        self.batchSize = max(1, batchSize)
+        self.sqlCmdForInsertingNewProject = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_SOURCE_PROJECT)
+        self.sqlCmdForInsertingDependsOnRelation = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION)
+        self.sqlCmdForInsertingNewBuildJob = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_BUILD_JOB)
+        self.sqlCmdForInsertingBuildJobRemote = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_REMOTE)
+        self.sqlCmdForDeletingBuildJobRemotes = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_DELETING_BUILD_JOB_REMOTES)
+        self.sqlCmdForDeletingDependsOnRelation = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_DELETING_DEPENDS_ON_RELATION)
+        self.sqlCmdForUpdatingPinnedCommit = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_UPDATING_PINNED_COMMIT)
+        self.sqlCmdForUpdatingHeadCommit = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_UPDATING_HEAD_COMMIT)
+        self.sqlCmdForInsertingDependsOnHistory = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_HISTORY)
+        self.sqlCmdForDeletingDependsOnHistory = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_DELETING_DEPENDS_ON_HISTORY)
+        self.sqlCmdForStoringRepositoryFingerprint = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_STORING_REPOSITORY_FINGERPRINT)
+        self.pendingProjects = {}
+        self.pendingBuildJobs = []
+        self.pendingBuildJobRemotes = []
+        self.pendingBuildJobRemoteRemovals = []
+        self.pendingDependenciesByProjectName = {}
+        self.projectNamesWithPendingReplacement = set()
+        self.pendingHeadCommits = []
+        self.pendingDependencyHistory = []
+        self.pendingDependencyHistoryRemovals = []
+        self.pendingRepositoryFingerprints = []
+        self.projectNamesWithReplacedDependencies = set()
+        self.replacedDependencies = set()
+        self.projectNamesWithReplacedDependencyHistory = set()
+        self.projectIdsByName = {}
+        self.buildJobIdsByName = {}
+        self.buildJobUrlsByName = {}
+        self.loadIds(PATH_TO_DML_QUERY_FOR_ALL_SOURCE_PROJECTS, self.projectIdsByName, {})
+        self.loadIds(PATH_TO_DML_QUERY_FOR_ALL_BUILD_JOBS, self.buildJobIdsByName, self.buildJobUrlsByName)
+        buildJobNamesById = {buildJobId: buildJobName for buildJobName, buildJobId in self.buildJobIdsByName.items()}
+        self.buildJobRemotesByName = {}
+        cursor = self.dbConnection.cursor()
+        for dataRow in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_ALL_BUILD_JOB_REMOTES)):
+            self.buildJobRemotesByName.setdefault(buildJobNamesById[dataRow[0]], []).append(dataRow[1])
+
+    # Fills the given dictionaries with name -> id and name -> URL from the query in the given file
+    def loadIds(self, pathToQuery, idsByName, urlsByName):
+        cursor = self.dbConnection.cursor()
+        for dataRow in cursor.execute(prepareSqlStatementFromFile(pathToQuery)):
+            idsByName[dataRow[1]] = dataRow[0]
+            urlsByName[dataRow[1]] = dataRow[2]
+
+    # Adds the project if it is not yet known
+    def addProject(self, projectName, remoteUrl):
+        isKnown = projectName in self.projectIdsByName or projectName in self.pendingProjects
+        scan_metrics.metrics.addCacheLookup("project ids", isKnown)
+        if not isKnown:
+            self.pendingProjects[projectName] = (remoteUrl, canonicalizeRepositoryUrl(remoteUrl))
+            self.flushIfBatchIsFull()
+
+    # All projects must have been added before. Sets the dependencies of the project to the given ones, removing the
+    # dependencies stored by earlier scans which no longer exist. Within the lifetime of the writer, only the first call
+    # for a project replaces the dependencies; later calls (e.g. for another checkout of the project at a different
+    # commit) add to them.
+    # pinnedCommits are the commits of the dependencies recorded by the project, in the same order (None if unknown).
+    # The pinned commit of a dependency is set by the first call giving the dependency.
+    # Nothing is read here: the stored dependencies of all projects of a batch are compared when it is written.
+    def replaceDependencies(self, projectName, projectNamesOfDependencies, pinnedCommits = None):
+        if pinnedCommits == None:
+            pinnedCommits = [None] * len(projectNamesOfDependencies)
+        isFirstCall = projectName not in self.projectNamesWithReplacedDependencies
+        if isFirstCall:
+            self.projectNamesWithReplacedDependencies.add(projectName)
+            self.projectNamesWithPendingReplacement.add(projectName)
+        pendingDependencies = self.pendingDependenciesByProjectName.setdefault(projectName, {})
+        if isFirstCall and len(projectNamesOfDependencies) == 0:
+            # Removing all dependencies counts as a row to write as well
+            self.numberOfPendingDependencies += 1
+        for projectNameOfDependency, pinnedCommit in zip(projectNamesOfDependencies, pinnedCommits):
+            if (projectName, projectNameOfDependency) not in self.replacedDependencies:
+                self.replacedDependencies.add((projectName, projectNameOfDependency))
+                pendingDependencies[projectNameOfDependency] = pinnedCommit
+                self.numberOfPendingDependencies += 1
+        self.flushIfBatchIsFull()
+
+    # Returns dependency id -> pinned commit as stored for each of the given projects
+    def loadStoredDependencies(self, cursor, projectIds):
+        storedDependenciesByProjectId = {}
+        for firstProject, secondProject, pinnedCommit in queryForAllParameters(cursor, sqlQueryForDependenciesOfProjects, projectIds):
+            storedDependenciesByProjectId.setdefault(firstProject, {})[secondProject] = pinnedCommit
+        return storedDependenciesByProjectId
+
+    # Returns the relations to insert (with their pinned commits), the relations to delete and the pinned commits to
+    # update for the pending dependencies, given the ids of all projects. Relations which are stored already are not
+    # written again, so that the closure only has to be extended for new ones.
+    def determineDependencyChanges(self, cursor, projectIdsByName):
+        storedDependenciesByProjectId = self.loadStoredDependencies(cursor, [projectIdsByName[projectName] for projectName in self.pendingDependenciesByProjectName])
+        insertions = []
+        removals = []
+        pinnedCommitUpdates = []
+        for projectName, pendingDependencies in self.pendingDependenciesByProjectName.items():
+            projectId = projectIdsByName[projectName]
+            pendingDependencies = {projectIdsByName[projectNameOfDependency]: pinnedCommit for projectNameOfDependency, pinnedCommit in pendingDependencies.items()}
+            storedDependencies = storedDependenciesByProjectId.get(projectId, {})
+            if projectName in self.projectNamesWithPendingReplacement:
+                for storedDependencyId in storedDependencies:
+                    if storedDependencyId not in pendingDependencies:
+                        removals.append((projectId, storedDependencyId))
+            for dependencyId, pinnedCommit in pendingDependencies.items():
+                if dependencyId not in storedDependencies:
+                    insertions.append((projectId, dependencyId, pinnedCommit))
+                elif storedDependencies[dependencyId] != pinnedCommit:
+                    pinnedCommitUpdates.append((pinnedCommit, projectId, dependencyId))
+        return insertions, removals, pinnedCommitUpdates
+
+    # All projects must have been added before. Replaces the stored history of the dependencies of the project by the
+    # given intervals, each (project name of the dependency, first commit, its date, commit removing the dependency,
+    # its date). The commit and date removing the dependency are None if it still exists. Only the first call for a
+    # project within the lifetime of the writer has an effect.
+    def replaceDependencyHistory(self, projectName, intervals):
+        if projectName in self.projectNamesWithReplacedDependencyHistory:
+            return
+        self.projectNamesWithReplacedDependencyHistory.add(projectName)
+        self.pendingDependencyHistoryRemovals.append(projectName)
+        for interval in intervals:
+            self.pendingDependencyHistory.append((projectName,) + tuple(interval))
+        self.flushIfBatchIsFull()
+
+    # Writes what is pending and starts a new scan of the same repositories, e.g. by the daemon: the next call of
+    # replaceDependencies or replaceDependencyHistory for a project replaces what the previous scan stored again
+    def startScan(self):
+        self.flush()
+        self.projectNamesWithReplacedDependencies = set()
+        self.replacedDependencies = set()
+        self.projectNamesWithReplacedDependencyHistory = set()
+
+    # The project must have been added before
+    def setHeadCommit(self, projectName, headCommit):
+        self.pendingHeadCommits.append((headCommit, projectName))
+        self.flushIfBatchIsFull()
+
+    # Returns repository path -> (HEAD commit, blob id of .gitmodules) as stored by previous scans
+    def loadRepositoryFingerprints(self):
+        repositoryFingerprints = {}
+        cursor = self.dbConnection.cursor()
+        for dataRow in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_ALL_REPOSITORY_FINGERPRINTS)):
+            repositoryFingerprints[dataRow[0]] = (dataRow[1], dataRow[2])
+        return repositoryFingerprints
+
+    # The project must have been added before
+    def storeRepositoryFingerprint(self, repositoryPath, projectName, headCommit, gitModulesBlobId):
+        self.pendingRepositoryFingerprints.append((repositoryPath, projectName, headCommit, gitModulesBlobId))
+        self.flushIfBatchIsFull()
+
+    # Adds the build job with the given remotes, or updates them if the job is already known with other ones. The first
+    # remote is the one stored with the job itself. Returns False if the job is already known with the same remotes,
+    # i.e. nothing had to be written. The stored remotes are removed even for a job new to the writer, as another
+    # writer may have stored the job since.
+    def addBuildJob(self, buildJobName, remoteUrls):
+        remoteUrls = list(dict.fromkeys(remoteUrls))
+        if buildJobName in self.buildJobUrlsByName:
+            if self.buildJobUrlsByName[buildJobName] == remoteUrls[0] and sorted(self.buildJobRemotesByName.get(buildJobName, [])) == sorted(remoteUrls):
+                return False
+            self.pendingBuildJobRemotes = [pendingRemote for pendingRemote in self.pendingBuildJobRemotes if pendingRemote[0] != buildJobName]
+        self.pendingBuildJobRemoteRemovals.append(buildJobName)
+        self.buildJobUrlsByName[buildJobName] = remoteUrls[0]
+        self.buildJobRemotesByName[buildJobName] = remoteUrls
+        self.pendingBuildJobs.append((buildJobName, remoteUrls[0]))
+        for remoteUrl in remoteUrls:
+            self.pendingBuildJobRemotes.append((buildJobName, remoteUrl, canonicalizeRepositoryUrl(remoteUrl)))
+        self.flushIfBatchIsFull()
+        return True
+
+    def getNumberOfPendingRows(self):
+        return (len(self.pendingProjects) + len(self.pendingBuildJobs) + len(self.pendingBuildJobRemotes)
+                + len(self.pendingBuildJobRemoteRemovals) + self.numberOfPendingDependencies + len(self.pendingHeadCommits)
+                + len(self.pendingDependencyHistory) + len(self.pendingDependencyHistoryRemovals)
+                + len(self.pendingRepositoryFingerprints))
+
+    def flushIfBatchIsFull(self):
+        if self.getNumberOfPendingRows() >= self.batchSize:
+            self.flush()
+
+    # Writes all buffered rows in a single transaction. DependsOnClosure is updated in the same transaction.
+    def flush(self):
+        if self.getNumberOfPendingRows() == 0:
+            return
+        with measurePhase("database writes"):
+            numberOfDependencyRowsWritten, newProjectIdsByName, newBuildJobIdsByName = runWithRetry(self.dbConnection, self.writePendingRows)
+        self.projectIdsByName.update(newProjectIdsByName)
+        self.buildJobIdsByName.update(newBuildJobIdsByName)
+        metrics = scan_metrics.metrics
+        metrics.addRowsWritten("SourceCodeProject", len(self.pendingProjects) + len(self.pendingHeadCommits))
+        metrics.addRowsWritten("JenkinsBuildJob", len(self.pendingBuildJobs))
+        metrics.addRowsWritten("JenkinsBuildJobRemote", len(self.pendingBuildJobRemotes))
+        metrics.addRowsWritten("DependsOn", numberOfDependencyRowsWritten)
+        metrics.addRowsWritten("DependsOnHistory", len(self.pendingDependencyHistory))
+        metrics.addRowsWritten("RepositoryFingerprint", len(self.pendingRepositoryFingerprints))
+        metrics.addCommit()
+        self.pendingProjects = {}
+        self.pendingBuildJobs = []
+        self.pendingBuildJobRemotes = []
+        self.pendingBuildJobRemoteRemovals = []
+        self.pendingDependenciesByProjectName = {}
+        self.projectNamesWithPendingReplacement = set()
+        self.numberOfPendingDependencies = 0
+        self.pendingHeadCommits = []
+        self.pendingDependencyHistory = []
+        self.pendingDependencyHistoryRemovals = []
+        self.pendingRepositoryFingerprints = []
+
+    # Inserts the new projects and build jobs, whose names may have been inserted by another writer in the meantime,
+    # and returns the ids the database has for them
+    def insertNewProjectsAndBuildJobs(self, cursor):
+        cursor.executemany(self.sqlCmdForInsertingNewProject, [(projectName,) + remoteUrls for projectName, remoteUrls in self.pendingProjects.items()])
+        newProjectIdsByName = dict(queryForAllParameters(cursor, sqlQueryForIdsOfProjects, self.pendingProjects))
+        cursor.executemany(self.sqlCmdForInsertingNewBuildJob, self.pendingBuildJobs)
+        namesOfNewBuildJobs = set(buildJobName for buildJobName, remoteUrl in self.pendingBuildJobs if buildJobName not in self.buildJobIdsByName)
+        newBuildJobIdsByName = dict(queryForAllParameters(cursor, sqlQueryForIdsOfBuildJobs, namesOfNewBuildJobs))
+        return newProjectIdsByName, newBuildJobIdsByName
+
+    # Returns the number of rows of DependsOn written and the ids of the new projects and build jobs. Leaves the pending
+    # rows unchanged, so that it can be retried.
+    def writePendingRows(self):
+        cursor = self.dbConnection.cursor()
+        try:
+            newProjectIdsByName, newBuildJobIdsByName = self.insertNewProjectsAndBuildJobs(cursor)
+            projectIdsByName = collections.ChainMap(newProjectIdsByName, self.projectIdsByName)
+            buildJobIdsByName = collections.ChainMap(newBuildJobIdsByName, self.buildJobIdsByName)
+            cursor.executemany(self.sqlCmdForUpdatingHeadCommit,
+                               [(headCommit, projectIdsByName[projectName]) for headCommit, projectName in self.pendingHeadCommits])
+            cursor.executemany(self.sqlCmdForDeletingBuildJobRemotes,
+                               [(buildJobIdsByName[buildJobName],) for buildJobName in self.pendingBuildJobRemoteRemovals])
+            cursor.executemany(self.sqlCmdForInsertingBuildJobRemote,
+                               [(buildJobIdsByName[buildJobName], remoteUrl, canonicalRemoteUrl) for buildJobName, remoteUrl, canonicalRemoteUrl in self.pendingBuildJobRemotes])
+            insertions, removals, pinnedCommitUpdates = self.determineDependencyChanges(cursor, projectIdsByName)
+            cursor.executemany(self.sqlCmdForDeletingDependsOnRelation, removals)
+            cursor.executemany(self.sqlCmdForInsertingDependsOnRelation, insertions)
+            cursor.executemany(self.sqlCmdForUpdatingPinnedCommit, pinnedCommitUpdates)
+            addRelationsToClosure(cursor, [(firstProject, secondProject) for firstProject, secondProject, pinnedCommit in insertions])
+            removeRelationsFromClosure(cursor, removals)
+            cursor.executemany(self.sqlCmdForDeletingDependsOnHistory,
+                               [(projectIdsByName[projectName],) for projectName in self.pendingDependencyHistoryRemovals])
+            cursor.executemany(self.sqlCmdForInsertingDependsOnHistory,
+                               [(projectIdsByName[dataRow[0]], projectIdsByName[dataRow[1]]) + dataRow[2:] for dataRow in self.pendingDependencyHistory])
+            cursor.executemany(self.sqlCmdForStoringRepositoryFingerprint,
+                               [(repositoryPath, projectIdsByName[projectName], headCommit, gitModulesBlobId)
+                                for repositoryPath, projectName, headCommit, gitModulesBlobId in self.pendingRepositoryFingerprints])
+            self.dbConnection.commit()
+        except:
+            self.dbConnection.rollback()
+            raise
+        return len(insertions) + len(removals) + len(pinnedCommitUpdates), newProjectIdsByName, newBuildJobIdsByName
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,207 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# In-memory copy of DependsOn and Builds for computations which visit large parts of the graph, where one query per
+# project would be too slow. Projects are identified by their id, which is used as index into the arrays directly.
+# The dependents of all projects are kept in compressed sparse row form: the dependents of project i are
+# dependents[dependentOffsets[i]:dependentOffsets[i + 1]].
+
+import itertools
+from array import array
+
+from dependency_database_writer import prepareSqlStatementFromFile
+
+PATH_TO_DML_QUERY_FOR_ALL_SOURCE_PROJECTS = "dml/queryForAllSourceCodeProjects.sql"
+PATH_TO_DML_QUERY_FOR_DEPENDENTS_OF_ALL_PROJECTS = "dml/queryForDependentsOfAllProjects.sql"
+PATH_TO_DML_QUERY_FOR_ALL_BUILDS = "dml/queryForAllBuilds.sql"
+
+class DependencyGraph:
+    projectNames = None
+    projectIdsByName = None
+    dependentOffsets = None
+    dependents = None
+    buildJobNamesByProjectId = None
+
+    def __init__(self, projectNames, projectIdsByName, dependentOffsets, dependents, buildJobNamesByProjectId):
+        self.projectNames = projectNames
+        self.projectIdsByName = projectIdsByName
+        self.dependentOffsets = dependentOffsets
+        self.dependents = dependents
+        self.buildJobNamesByProjectId = buildJobNamesByProjectId
+
+    def getNumberOfSlots(self):
+        return len(self.projectNames)
+
+    def getDependents(self, projectId):
+        return self.dependents[self.dependentOffsets[projectId]:self.dependentOffsets[projectId + 1]]
+
+# The dependents of each project are read as one string per project, which is a lot faster than one row per relation
+def loadDependencyGraph(dbConnection):
+    cursor = dbConnection.cursor()
+    projectRows = cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_ALL_SOURCE_PROJECTS)).fetchall()
+    numberOfSlots = 1
+    for dataRow in projectRows:
+        numberOfSlots = max(numberOfSlots, dataRow[0] + 1)
+    projectNames = [None] * numberOfSlots
+    projectIdsByName = {}
+    for dataRow in projectRows:
+        projectNames[dataRow[0]] = dataRow[1]
+        projectIdsByName[dataRow[1]] = dataRow[0]
+    # The rows are ordered by project id, so the dependents of each project are appended after those of the projects
+    # before it. Offsets of projects without dependents are left at 0 and fixed below.
+    dependentOffsets = array('i', bytes(4 * (numberOfSlots + 1)))
+    dependents = array('i')
+    for projectId, concatenatedDependents in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_DEPENDENTS_OF_ALL_PROJECTS)):
+        if projectId >= numberOfSlots:
+            raise ValueError("DependsOn refers to unknown project " + str(projectId))
+        dependents.extend(map(int, concatenatedDependents.split()))
+        dependentOffsets[projectId + 1] = len(dependents)
+    dependentOffsets = array('i', itertools.accumulate(dependentOffsets, max))
+    buildJobNamesByProjectId = {}
+    for dataRow in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_ALL_BUILDS)):
+        buildJobNamesByProjectId.setdefault(dataRow[0], []).append(dataRow[1])
+    return DependencyGraph(projectNames, projectIdsByName, dependentOffsets, dependents, buildJobNamesByProjectId)
+
+# Returns the strongly connected components reachable from the given projects via their dependents, each as a list of
+# project ids. The components are returned in reverse topological order, i.e. the dependents of a component come
+# before it. This is Tarjan's algorithm with an explicit stack, since the recursion depth would be unbounded.
+def findStronglyConnectedComponents(graph, startProjectIds):
+    dependentOffsets = graph.dependentOffsets
+    dependents = graph.dependents
+    numberOfSlots = graph.getNumberOfSlots()
+    # 0 means not visited yet, indices start at 1
+    indices = array('i', bytes(4 * numberOfSlots))
+    lowLinks = array('i', bytes(4 * numberOfSlots))
+    isOnStack = bytearray(numberOfSlots)
+    componentStack = []
+    components = []
+    nextIndex = 1
+    for startProjectId in startProjectIds:
+        if indices[startProjectId] != 0:
+            continue
+        indices[startProjectId] = lowLinks[startProjectId] = nextIndex
+        nextIndex += 1
+        componentStack.append(startProjectId)
+        isOnStack[startProjectId] = 1
+        # Each entry is (project, position of the next dependent to visit)
+        callStack = [(startProjectId, dependentOffsets[startProjectId])]
+        while len(callStack) > 0:
+            projectId, position = callStack[-1]
+            endPosition = dependentOffsets[projectId + 1]
+            while position < endPosition:
+                dependentId = dependents[position]
+                position += 1
+                if indices[dependentId] == 0:
+                    break
+                if isOnStack[dependentId] and indices[dependentId] < lowLinks[projectId]:
+                    lowLinks[projectId] = indices[dependentId]
+            else:
+                # All dependents are done
+                callStack.pop()
+                if len(callStack) > 0:
+                    parentId = callStack[-1][0]
+                    if lowLinks[projectId] < lowLinks[parentId]:
+                        lowLinks[parentId] = lowLinks[projectId]
+                if lowLinks[projectId] == indices[projectId]:
+                    component = []
+                    while True:
+                        memberId = componentStack.pop()
+                        isOnStack[memberId] = 0
+                        component.append(memberId)
+                        if memberId == projectId:
+                            break
+                    components.append(component)
+                continue
+            callStack[-1] = (projectId, position)
+            indices[dependentId] = lowLinks[dependentId] = nextIndex
+            nextIndex += 1
+            componentStack.append(dependentId)
+            isOnStack[dependentId] = 1
+            callStack.append((dependentId, dependentOffsets[dependentId]))
+    return components
+
+# Returns the projects affected by a change to the given projects in waves: a project is in a later wave than all
+# projects it depends on, unless they depend on each other, so all projects of a wave can be built in parallel once
+# the previous waves are done. Projects depending on each other (i.e. in the same strongly connected component) are
+# in the same wave. Returns (waves, components), where waves is a list of lists of project ids and components are the
+# strongly connected components with more than one project.
+def computeBuildWaves(graph, startProjectIds):
+    components = findStronglyConnectedComponents(graph, startProjectIds)
+    dependentOffsets = graph.dependentOffsets
+    dependents = graph.dependents
+    componentIndices = array('i', bytes(4 * graph.getNumberOfSlots()))
+    for componentIndex in range(len(components)):
+        for projectId in components[componentIndex]:
+            componentIndices[projectId] = componentIndex
+    # Components depending on nothing else come last, so going backwards visits each component after its dependencies
+    waveIndices = array('i', bytes(4 * len(components)))
+    waves = []
+    for componentIndex in range(len(components) - 1, -1, -1):
+        waveIndex = waveIndices[componentIndex]
+        if waveIndex == len(waves):
+            waves.append([])
+        waves[waveIndex].extend(components[componentIndex])
+        for projectId in components[componentIndex]:
+            for position in range(dependentOffsets[projectId], dependentOffsets[projectId + 1]):
+                dependentComponentIndex = componentIndices[dependents[position]]
+                if dependentComponentIndex != componentIndex and waveIndices[dependentComponentIndex] <= waveIndex:
+                    waveIndices[dependentComponentIndex] = waveIndex + 1
+    cyclicComponents = [component for component in components if len(component) > 1]
+    return waves, cyclicComponents
+
+# Returns (project id, distance) of the projects depending directly or transitively on the given project, i.e. the
+# projects affected by a change to it, ordered by the length of the shortest chain of dependencies to it. The project
+# itself is not included.
+def findAffectedProjects(graph, projectId):
+    distances = {projectId: 0}
+    affectedProjects = []
+    currentProjectIds = [projectId]
+    while len(currentProjectIds) > 0:
+        nextProjectIds = []
+        for currentProjectId in currentProjectIds:
+            for dependentId in graph.getDependents(currentProjectId):
+                if dependentId not in distances:
+                    distances[dependentId] = distances[currentProjectId] + 1
+                    affectedProjects.append((dependentId, distances[dependentId]))
+                    nextProjectIds.append(dependentId)
+        currentProjectIds = nextProjectIds
+    return affectedProjects
+
+# Returns the build waves of the projects affected by a change to the given projects (all projects if None) by name,
+# in the form printed by query_dependency_database.py waves. A build job building several affected projects is
+# triggered once, in the wave of the last of them.
+def describeBuildWaves(graph, projectNames):
+    if projectNames == None:
+        projectNames = sorted(graph.projectIdsByName)
+    projectIds = []
+    for projectName in projectNames:
+        if projectName not in graph.projectIdsByName:
+            raise ValueError("Unknown project: " + projectName)
+        projectIds.append(graph.projectIdsByName[projectName])
+    waves, cyclicComponents = computeBuildWaves(graph, projectIds)
+    waveIndicesByBuildJobName = {}
+    for waveIndex in range(len(waves)):
+        for projectId in waves[waveIndex]:
+            for buildJobName in graph.buildJobNamesByProjectId.get(projectId, []):
+                waveIndicesByBuildJobName[buildJobName] = waveIndex
+    buildJobNamesByWave = [[] for wave in waves]
+    for buildJobName, waveIndex in waveIndicesByBuildJobName.items():
+        buildJobNamesByWave[waveIndex].append(buildJobName)
+    result = {"changedProjects": projectNames,
+              "stronglyConnectedComponents": [sorted(graph.projectNames[projectId] for projectId in component) for component in cyclicComponents],
+              "waves": []}
+    for waveIndex in range(len(waves)):
+        result["waves"].append({"projects": sorted(graph.projectNames[projectId] for projectId in waves[waveIndex]),
+                                "buildJobs": sorted(buildJobNamesByWave[waveIndex])})
+    return result
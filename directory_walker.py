@@ -0,0 +1,120 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Finds the repositories and the Jenkins job descriptions below a directory, at any depth, e.g. grouped mirrors like
+# org/team/repo.git or nested Jenkins folders like jobs/<folder>/jobs/<name>/config.xml.
+# Directories are read with os.scandir, whose entries already know their file type, so a directory is recognized as
+# a repository from its own listing, without a stat call per entry and without running git: a checkout by its ".git"
+# entry (a directory, or a file for submodules and worktrees), a bare repository by its HEAD file next to the objects
+# and refs directories. Repositories are not descended into; their submodules are found by the scanners.
+# The walks are generators, so the scanners can start on the first entries while the walk goes on. Symbolic links to
+# directories are not followed, so link cycles cannot make a walk endless.
+
+import fnmatch
+import os
+import sys
+from scan_metrics import measurePhase
+
+NAME_OF_GIT_ENTRY = ".git"
+NAME_OF_HEAD_FILE = "HEAD"
+NAMES_OF_DIRECTORIES_IN_GIT_DIRECTORY = ["objects", "refs"]
+SUFFIX_OF_JOB_DESCRIPTION = ".xml"
+FILE_NAME_OF_JOB_DESCRIPTION = "config.xml"
+# The build history Jenkins keeps next to the config.xml of each job, which contains XML files of its own
+# (builds/<number>/build.xml)
+NAME_OF_BUILD_HISTORY_DIRECTORY = "builds"
+
+def addArguments(parser):
+    parser.add_argument("--ignore",
+        dest = "ignorePatterns",
+        action = "append",
+        default = [],
+        metavar = "PATTERN",
+        help = "Skip the files and directories below the scanned directory whose name or path relative to it matches the given glob pattern, e.g. \"*.tmp\" or \"archive/*\". Can be given several times.")
+
+def isIgnored(relativePath, name, ignorePatterns):
+    for ignorePattern in ignorePatterns:
+        if fnmatch.fnmatchcase(name, ignorePattern) or fnmatch.fnmatchcase(relativePath, ignorePattern):
+            return True
+    return False
+
+# Returns the entries of the directory sorted by name, so that the walks visit them in the same order on every host.
+# A directory which cannot be read is reported and treated as empty.
+def listDirectory(absolutePathToDirectory):
+    with measurePhase("discovery"):
+        try:
+            with os.scandir(absolutePathToDirectory) as directoryEntries:
+                return sorted(directoryEntries, key = lambda directoryEntry: directoryEntry.name)
+        except OSError as e:
+            print("Warning: cannot read directory", absolutePathToDirectory, ":", e, file = sys.stderr)
+            return []
+
+def isRepository(directoryEntries):
+    directoryEntriesByName = {directoryEntry.name: directoryEntry for directoryEntry in directoryEntries}
+    if NAME_OF_GIT_ENTRY in directoryEntriesByName:
+        return True
+    headFile = directoryEntriesByName.get(NAME_OF_HEAD_FILE)
+    if headFile == None or not headFile.is_file():
+        return False
+    for name in NAMES_OF_DIRECTORIES_IN_GIT_DIRECTORY:
+        if name not in directoryEntriesByName or not directoryEntriesByName[name].is_dir():
+            return False
+    return True
+
+def getRelativePath(absolutePathToObject, absolutePathToScannedDirectory):
+    return os.path.relpath(absolutePathToObject, absolutePathToScannedDirectory).replace(os.sep, "/")
+
+# Returns the paths of the subdirectories to descend into, i.e. neither .git nor one of the given names nor ignored
+def findSubdirectories(directoryEntries, absolutePathToScannedDirectory, ignorePatterns, namesOfPrunedDirectories = ()):
+    absolutePathsToSubdirectories = []
+    for directoryEntry in directoryEntries:
+        if not directoryEntry.is_dir(follow_symlinks = False) or directoryEntry.name == NAME_OF_GIT_ENTRY:
+            continue
+        if directoryEntry.name in namesOfPrunedDirectories:
+            continue
+        if isIgnored(getRelativePath(directoryEntry.path, absolutePathToScannedDirectory), directoryEntry.name, ignorePatterns):
+            continue
+        absolutePathsToSubdirectories.append(directoryEntry.path)
+    return absolutePathsToSubdirectories
+
+# Yields the absolute paths of the checkouts and bare repositories below the given directory, depth-first. The given
+# directory itself is not yielded even if it is a repository.
+def walkRepositories(absolutePathToScannedDirectory, ignorePatterns = ()):
+    # Used as a stack, with the entries of each directory pushed in reverse, so that they are visited in order
+    pendingDirectories = list(reversed(findSubdirectories(listDirectory(absolutePathToScannedDirectory), absolutePathToScannedDirectory, ignorePatterns)))
+    while len(pendingDirectories) > 0:
+        absolutePathToDirectory = pendingDirectories.pop()
+        directoryEntries = listDirectory(absolutePathToDirectory)
+        if isRepository(directoryEntries):
+            yield absolutePathToDirectory
+            continue
+        pendingDirectories.extend(reversed(findSubdirectories(directoryEntries, absolutePathToScannedDirectory, ignorePatterns)))
+
+# Yields the absolute paths of the XML files in and below the given directory, depth-first. The builds directory is
+# only skipped in the directory of a job, i.e. next to a config.xml.
+def walkJobDescriptions(absolutePathToScannedDirectory, ignorePatterns = ()):
+    pendingDirectories = [absolutePathToScannedDirectory]
+    while len(pendingDirectories) > 0:
+        absolutePathToDirectory = pendingDirectories.pop()
+        directoryEntries = listDirectory(absolutePathToDirectory)
+        isDirectoryOfJob = False
+        for directoryEntry in directoryEntries:
+            if not directoryEntry.name.lower().endswith(SUFFIX_OF_JOB_DESCRIPTION) or not directoryEntry.is_file():
+                continue
+            if directoryEntry.name == FILE_NAME_OF_JOB_DESCRIPTION:
+                isDirectoryOfJob = True
+            if not isIgnored(getRelativePath(directoryEntry.path, absolutePathToScannedDirectory), directoryEntry.name, ignorePatterns):
+                yield directoryEntry.path
+        namesOfPrunedDirectories = (NAME_OF_BUILD_HISTORY_DIRECTORY,) if isDirectoryOfJob else ()
+        pendingDirectories.extend(reversed(findSubdirectories(directoryEntries, absolutePathToScannedDirectory, ignorePatterns, namesOfPrunedDirectories)))
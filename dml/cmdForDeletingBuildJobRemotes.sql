@@ -0,0 +1,2 @@
+DELETE FROM JenkinsBuildJobRemote
+WHERE buildJobId = ?
@@ -0,0 +1,2 @@
+DELETE FROM DependsOnHistory
+WHERE firstProject = ?
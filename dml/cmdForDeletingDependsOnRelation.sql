@@ -0,0 +1,2 @@
+DELETE FROM DependsOn
+WHERE firstProject = ? AND secondProject = ?
@@ -0,0 +1,2 @@
+INSERT OR IGNORE INTO JenkinsBuildJobRemote (buildJobId, sourceCodeRepositoryUrl, canonicalRepositoryUrl)
+VALUES (?, ?, ?)
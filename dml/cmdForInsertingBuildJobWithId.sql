@@ -0,0 +1,2 @@
+INSERT INTO JenkinsBuildJob (id, buildJobName, sourceCodeRepositoryUrl)
+VALUES (?, ?, ?)
@@ -0,0 +1,2 @@
+INSERT INTO DependsOnHistory (firstProject, secondProject, validFromCommit, validFromDate, validToCommit, validToDate)
+VALUES (?, ?, ?, ?, ?, ?)
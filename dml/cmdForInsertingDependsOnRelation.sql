@@ -1,2 +1,2 @@
-INSERT OR REPLACE INTO DependsOn (firstProject, secondProject)
-VALUES ({}, {})
+INSERT OR IGNORE INTO DependsOn (firstProject, secondProject, pinnedCommit)
+VALUES (?, ?, ?)
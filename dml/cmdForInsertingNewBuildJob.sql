@@ -1,2 +1,3 @@
 INSERT INTO JenkinsBuildJob (buildJobName, sourceCodeRepositoryUrl)
-VALUES ({}, {})
+VALUES (?, ?)
+ON CONFLICT (buildJobName) DO UPDATE SET sourceCodeRepositoryUrl = excluded.sourceCodeRepositoryUrl
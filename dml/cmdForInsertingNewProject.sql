@@ -1,2 +1,3 @@
-INSERT INTO SourceCodeProject (sourceCodeProjectName,SourceCodeRepositoryName)
-VALUES ({}, {})
+INSERT INTO SourceCodeProject (sourceCodeProjectName, SourceCodeRepositoryName, canonicalRepositoryUrl)
+VALUES (?, ?, ?)
+ON CONFLICT (sourceCodeProjectName) DO NOTHING
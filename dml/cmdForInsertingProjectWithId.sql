@@ -0,0 +1,2 @@
+INSERT INTO SourceCodeProject (id, sourceCodeProjectName, SourceCodeRepositoryName, canonicalRepositoryUrl)
+VALUES (?, ?, ?, ?)
@@ -0,0 +1,3 @@
+INSERT INTO RepositoryFingerprint (repositoryPath, projectId, headCommit, gitModulesBlobId)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (repositoryPath) DO UPDATE SET projectId = excluded.projectId, headCommit = excluded.headCommit, gitModulesBlobId = excluded.gitModulesBlobId
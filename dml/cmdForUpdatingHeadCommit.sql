@@ -0,0 +1,3 @@
+UPDATE SourceCodeProject
+SET headCommit = ?
+WHERE id = ?
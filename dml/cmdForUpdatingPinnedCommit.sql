@@ -0,0 +1,3 @@
+UPDATE DependsOn
+SET pinnedCommit = ?
+WHERE firstProject = ? AND secondProject = ?
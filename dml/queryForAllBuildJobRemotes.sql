@@ -0,0 +1,2 @@
+SELECT buildJobId, sourceCodeRepositoryUrl
+FROM JenkinsBuildJobRemote
@@ -1,3 +1,2 @@
 SELECT id, buildJobName, sourceCodeRepositoryUrl
 FROM JenkinsBuildJob
-WHERE buildJobName = ?
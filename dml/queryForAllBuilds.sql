@@ -0,0 +1,3 @@
+SELECT b.sourceProjectId, j.buildJobName
+FROM Builds b JOIN JenkinsBuildJob j ON j.id = b.buildJobId
+ORDER BY j.buildJobName
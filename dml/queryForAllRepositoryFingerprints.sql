@@ -0,0 +1,2 @@
+SELECT repositoryPath, headCommit, gitModulesBlobId
+FROM RepositoryFingerprint
@@ -0,0 +1,2 @@
+SELECT id, sourceCodeProjectName, SourceCodeRepositoryName
+FROM SourceCodeProject
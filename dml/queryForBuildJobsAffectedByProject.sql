@@ -0,0 +1,9 @@
+SELECT j.buildJobName, p.sourceCodeProjectName, a.distance
+FROM (SELECT c.ancestorProject AS projectId, c.distance FROM DependsOnClosure c
+      WHERE c.descendantProject = (SELECT id FROM SourceCodeProject WHERE sourceCodeProjectName = ?)
+      UNION ALL
+      SELECT id, 0 FROM SourceCodeProject WHERE sourceCodeProjectName = ?) a
+JOIN Builds b ON b.sourceProjectId = a.projectId
+JOIN JenkinsBuildJob j ON j.id = b.buildJobId
+JOIN SourceCodeProject p ON p.id = a.projectId
+ORDER BY a.distance, j.buildJobName
@@ -0,0 +1,4 @@
+SELECT s.sourceCodeProjectName, h.validFromCommit, datetime(h.validFromDate, 'unixepoch'), h.validToCommit, datetime(h.validToDate, 'unixepoch')
+FROM DependsOnHistory h JOIN SourceCodeProject s ON s.id = h.firstProject
+WHERE h.secondProject = (SELECT id FROM SourceCodeProject WHERE sourceCodeProjectName = ?)
+ORDER BY h.validFromDate, s.sourceCodeProjectName
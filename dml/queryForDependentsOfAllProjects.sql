@@ -0,0 +1,4 @@
+SELECT secondProject, group_concat(firstProject, ' ')
+FROM DependsOn
+GROUP BY secondProject
+ORDER BY secondProject
@@ -0,0 +1,3 @@
+SELECT headCommit
+FROM SourceCodeProject
+WHERE sourceCodeProjectName = ?
@@ -0,0 +1,6 @@
+SELECT c.sourceCodeProjectName, d.pinnedCommit
+FROM SourceCodeProject s
+JOIN DependsOn d ON d.secondProject = s.id
+JOIN SourceCodeProject c ON c.id = d.firstProject
+WHERE s.sourceCodeProjectName = ? AND d.pinnedCommit IS NOT NULL AND d.pinnedCommit != ?
+ORDER BY c.sourceCodeProjectName
@@ -0,0 +1,7 @@
+SELECT s.sourceCodeProjectName, s.headCommit, count(DISTINCT d.pinnedCommit), count(*), total(d.pinnedCommit != s.headCommit)
+FROM DependsOn d
+JOIN SourceCodeProject s ON s.id = d.secondProject
+WHERE d.pinnedCommit IS NOT NULL
+GROUP BY d.secondProject
+HAVING count(DISTINCT d.pinnedCommit) > 1 OR total(d.pinnedCommit != s.headCommit) > 0
+ORDER BY s.sourceCodeProjectName
@@ -0,0 +1,4 @@
+SELECT p.sourceCodeProjectName, c.distance
+FROM DependsOnClosure c JOIN SourceCodeProject p ON p.id = c.ancestorProject
+WHERE c.descendantProject = (SELECT id FROM SourceCodeProject WHERE sourceCodeProjectName = ?)
+ORDER BY c.distance, p.sourceCodeProjectName
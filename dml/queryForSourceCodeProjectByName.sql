@@ -1,3 +0,0 @@
-SELECT id, sourceCodeProjectName,SourceCodeRepositoryName
-FROM SourceCodeProject
-WHERE sourceCodeProjectName = ?
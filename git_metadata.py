@@ -0,0 +1,257 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Reads the metadata of Git repositories (location, remote URL, HEAD commit, submodule commits) directly from the file system, without
+# starting git processes. Only the common repository layouts are supported. For everything else, e.g. worktrees,
+# configuration includes or environment variables changing the repository discovery, the functions raise an
+# UnsupportedRepositoryLayoutError and the caller has to ask git itself.
+
+import os
+import re
+import struct
+
+FILE_NAME_OF_GIT_DIRECTORY = ".git"
+PREFIX_OF_GITFILE = "gitdir:"
+PREFIX_OF_SYMBOLIC_REF = "ref:"
+FILE_NAME_OF_PACKED_REFS = "packed-refs"
+
+# Environment variables which change how git finds the repository
+ENVIRONMENT_VARIABLES_AFFECTING_DISCOVERY = ["GIT_DIR", "GIT_WORK_TREE", "GIT_COMMON_DIR", "GIT_CEILING_DIRECTORIES",
+                                             "GIT_DISCOVERY_ACROSS_FILESYSTEM", "GIT_CONFIG", "GIT_CONFIG_PARAMETERS"]
+
+MAX_NUMBER_OF_SYMBOLIC_REFS_TO_FOLLOW = 5
+
+FILE_NAME_OF_INDEX = "index"
+SIGNATURE_OF_INDEX = b"DIRC"
+SUPPORTED_INDEX_VERSIONS = (2, 3)
+# Fixed part of an index entry up to the flags: ctime, mtime, dev, ino, mode, uid, gid, size, object id (SHA-1), flags
+INDEX_ENTRY_HEADER = struct.Struct(">10I20sH")
+INDEX_ENTRY_FLAG_EXTENDED = 0x4000
+INDEX_ENTRY_MASK_STAGE = 0x3000
+INDEX_ENTRY_MASK_NAME_LENGTH = 0x0fff
+FILE_MODE_GITLINK = 0o160000
+FILE_MODE_DIRECTORY = 0o040000
+PREFIX_OF_SHARED_INDEX = "sharedindex."
+# Parsing larger indexes (about 10000 files) takes longer than reading the trees with git
+MAX_SIZE_OF_INDEX_TO_PARSE = 1024 * 1024
+
+OBJECT_ID_PATTERN = re.compile("^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+class UnsupportedRepositoryLayoutError(Exception):
+    pass
+
+class GitRepositoryLocation:
+    gitDirectory = ""
+    topLevelDirectory = ""
+
+    def __init__(self, gitDirectory, topLevelDirectory):
+        self.gitDirectory = gitDirectory
+        self.topLevelDirectory = topLevelDirectory
+
+def isGitDirectory(absolutePathToObject):
+    return (os.path.isfile(os.path.join(absolutePathToObject, "HEAD"))
+            and os.path.isdir(os.path.join(absolutePathToObject, "objects"))
+            and os.path.isdir(os.path.join(absolutePathToObject, "refs")))
+
+# Returns the location of the non-bare repository containing the given directory, like "git rev-parse --show-toplevel"
+# would, or None if the directory is not inside the working tree of a repository.
+def findRepository(absolutePathToObject):
+    for environmentVariable in ENVIRONMENT_VARIABLES_AFFECTING_DISCOVERY:
+        if environmentVariable in os.environ:
+            raise UnsupportedRepositoryLayoutError(environmentVariable + " is set")
+    currentDirectory = os.path.realpath(absolutePathToObject)
+    while True:
+        pathToDotGit = os.path.join(currentDirectory, FILE_NAME_OF_GIT_DIRECTORY)
+        if os.path.isdir(pathToDotGit) and isGitDirectory(pathToDotGit):
+            return GitRepositoryLocation(pathToDotGit, currentDirectory)
+        if os.path.isfile(pathToDotGit):
+            gitDirectory = readGitfile(pathToDotGit)
+            if os.path.exists(os.path.join(gitDirectory, "commondir")):
+                raise UnsupportedRepositoryLayoutError("worktree: " + currentDirectory)
+            return GitRepositoryLocation(gitDirectory, currentDirectory)
+        if isGitDirectory(currentDirectory):
+            # Inside a bare repository or a Git directory, there is no working tree
+            return None
+        parentDirectory = os.path.dirname(currentDirectory)
+        if parentDirectory == currentDirectory:
+            return None
+        currentDirectory = parentDirectory
+
+# A gitfile is a ".git" file pointing to the actual Git directory, e.g. for submodules
+def readGitfile(pathToGitfile):
+    with open(pathToGitfile, 'r') as gitfile:
+        content = gitfile.read().strip()
+    if not content.startswith(PREFIX_OF_GITFILE):
+        raise UnsupportedRepositoryLayoutError("invalid gitfile: " + pathToGitfile)
+    gitDirectory = content[len(PREFIX_OF_GITFILE):].strip()
+    return os.path.normpath(os.path.join(os.path.dirname(pathToGitfile), gitDirectory))
+
+# Returns the value of remote.origin.url from the configuration of the repository, or None if it is not set
+def readRemoteOriginUrl(gitDirectory):
+    return readConfigValue(gitDirectory, "remote", "origin", "url")
+
+# Returns the last value of the given key in the configuration file of the repository (like "git config --get"), or
+# None if it is not set. Only the repository configuration is read, not the global or system one.
+def readConfigValue(gitDirectory, section, subsection, key):
+    pathToConfig = os.path.join(gitDirectory, "config")
+    if not os.path.isfile(pathToConfig):
+        return None
+    value = None
+    isInRequestedSection = False
+    with open(pathToConfig, 'r', encoding = 'utf-8', errors = 'replace') as configFile:
+        lines = iter(configFile.read().splitlines())
+    for line in lines:
+        line = line.strip()
+        if line == "" or line[0] in "#;":
+            continue
+        if line.startswith("["):
+            currentSection, currentSubsection, line = parseConfigSectionHeader(line)
+            if currentSection in ("include", "includeif"):
+                raise UnsupportedRepositoryLayoutError("configuration includes other files: " + pathToConfig)
+            isInRequestedSection = currentSection == section and currentSubsection == subsection
+            if line == "":
+                continue
+        if not isInRequestedSection:
+            continue
+        # Values may be continued on the next line with a trailing backslash. Like git, the whitespace at the start of
+        # the next line is kept.
+        while line.endswith("\\") and not line.endswith("\\\\"):
+            line = line[:-1] + next(lines, "").rstrip()
+        currentKey, _, rawValue = line.partition("=")
+        if currentKey.strip().lower() == key:
+            value = parseConfigValue(rawValue)
+    return value
+
+# Returns (section, subsection, rest of the line) for a line like '[remote "origin"] url = ...'. Sections are
+# case-insensitive, subsections are not.
+def parseConfigSectionHeader(line):
+    endOfHeader = line.find("]")
+    if endOfHeader == -1:
+        raise UnsupportedRepositoryLayoutError("cannot parse configuration line: " + line)
+    header = line[1:endOfHeader].strip()
+    rest = line[endOfHeader + 1:].strip()
+    if "\"" in header:
+        section, _, subsection = header.partition(" ")
+        subsection = subsection.strip()
+        subsection = subsection[1:-1].replace("\\\"", "\"").replace("\\\\", "\\")
+        return section.lower(), subsection, rest
+    # Deprecated syntax [section.subsection], where the subsection is case-insensitive as well
+    section, _, subsection = header.partition(".")
+    if subsection == "":
+        subsection = None
+    else:
+        subsection = subsection.lower()
+    return section.lower(), subsection, rest
+
+# Removes quotes, escape sequences and comments from a configuration value
+def parseConfigValue(rawValue):
+    value = ""
+    isQuoted = False
+    position = 0
+    rawValue = rawValue.strip()
+    while position < len(rawValue):
+        character = rawValue[position]
+        if character == "\\" and position + 1 < len(rawValue):
+            escapedCharacter = rawValue[position + 1]
+            value += {"n": "\n", "t": "\t", "b": "\b"}.get(escapedCharacter, escapedCharacter)
+            position += 2
+            continue
+        if character == "\"":
+            isQuoted = not isQuoted
+        elif character in "#;" and not isQuoted:
+            break
+        else:
+            value += character
+        position += 1
+    return value.strip()
+
+# Returns the commit HEAD points to, or None if HEAD does not point to a commit yet (e.g. in an empty repository)
+def readHeadCommit(gitDirectory):
+    if os.path.isdir(os.path.join(gitDirectory, "reftable")):
+        raise UnsupportedRepositoryLayoutError("reftable: " + gitDirectory)
+    refName = "HEAD"
+    for _ in range(MAX_NUMBER_OF_SYMBOLIC_REFS_TO_FOLLOW):
+        refValue = readLooseRef(gitDirectory, refName)
+        if refValue == None:
+            if refName == "HEAD":
+                return None
+            return readPackedRef(gitDirectory, refName)
+        if refValue.startswith(PREFIX_OF_SYMBOLIC_REF):
+            refName = refValue[len(PREFIX_OF_SYMBOLIC_REF):].strip()
+            continue
+        if OBJECT_ID_PATTERN.match(refValue):
+            return refValue
+        raise UnsupportedRepositoryLayoutError("cannot parse ref " + refName + " in " + gitDirectory)
+    raise UnsupportedRepositoryLayoutError("too many symbolic refs in " + gitDirectory)
+
+def readLooseRef(gitDirectory, refName):
+    pathToRef = os.path.join(gitDirectory, refName)
+    if not os.path.isfile(pathToRef):
+        return None
+    with open(pathToRef, 'r') as refFile:
+        return refFile.read().strip()
+
+def readPackedRef(gitDirectory, refName):
+    pathToPackedRefs = os.path.join(gitDirectory, FILE_NAME_OF_PACKED_REFS)
+    if not os.path.isfile(pathToPackedRefs):
+        return None
+    with open(pathToPackedRefs, 'r') as packedRefsFile:
+        for line in packedRefsFile:
+            if line.startswith("#") or line.startswith("^"):
+                continue
+            objectId, _, currentRefName = line.strip().partition(" ")
+            if currentRefName == refName:
+                return objectId
+    return None
+
+# Returns path -> commit for those of the given paths which are gitlinks (i.e. submodules) in the index of the
+# repository. These are the commits recorded in HEAD, unless other ones have been staged.
+def readGitlinksFromIndex(gitDirectory, pathsInRepository):
+    pathToIndex = os.path.join(gitDirectory, FILE_NAME_OF_INDEX)
+    if not os.path.isfile(pathToIndex):
+        raise UnsupportedRepositoryLayoutError("no index: " + gitDirectory)
+    if os.path.getsize(pathToIndex) > MAX_SIZE_OF_INDEX_TO_PARSE:
+        raise UnsupportedRepositoryLayoutError("index too large: " + pathToIndex)
+    if readConfigValue(gitDirectory, "extensions", None, "objectformat") not in (None, "sha1"):
+        raise UnsupportedRepositoryLayoutError("object format other than SHA-1: " + gitDirectory)
+    if any(fileName.startswith(PREFIX_OF_SHARED_INDEX) for fileName in os.listdir(gitDirectory)):
+        raise UnsupportedRepositoryLayoutError("split index: " + gitDirectory)
+    with open(pathToIndex, 'rb') as indexFile:
+        content = indexFile.read()
+    signature, version, numberOfEntries = struct.unpack_from(">4sII", content)
+    if signature != SIGNATURE_OF_INDEX or version not in SUPPORTED_INDEX_VERSIONS:
+        raise UnsupportedRepositoryLayoutError("unsupported index version: " + pathToIndex)
+    requestedPaths = set(pathInRepository.strip("/").encode('utf-8') for pathInRepository in pathsInRepository)
+    gitlinks = {}
+    position = 12
+    for _ in range(numberOfEntries):
+        entryHeader = INDEX_ENTRY_HEADER.unpack_from(content, position)
+        mode = entryHeader[6]
+        objectId = entryHeader[10]
+        flags = entryHeader[11]
+        startOfName = position + INDEX_ENTRY_HEADER.size
+        if flags & INDEX_ENTRY_FLAG_EXTENDED:
+            startOfName += 2
+        nameLength = flags & INDEX_ENTRY_MASK_NAME_LENGTH
+        if nameLength == INDEX_ENTRY_MASK_NAME_LENGTH:
+            nameLength = content.index(b"\0", startOfName) - startOfName
+        if mode == FILE_MODE_DIRECTORY:
+            raise UnsupportedRepositoryLayoutError("sparse index: " + pathToIndex)
+        if mode == FILE_MODE_GITLINK and flags & INDEX_ENTRY_MASK_STAGE == 0:
+            name = content[startOfName:startOfName + nameLength]
+            if name in requestedPaths:
+                gitlinks[name.decode('utf-8')] = objectId.hex()
+        # Entries are padded with 1 to 8 NUL bytes to a multiple of 8 bytes
+        position += (startOfName - position + nameLength + 8) & ~7
+    return gitlinks
@@ -0,0 +1,135 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+import subprocess
+import time
+import scan_metrics
+from subprocess import PIPE, DEVNULL
+
+SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
+
+OBJECT_TYPE_COMMIT = "commit"
+OBJECT_TYPE_TREE = "tree"
+OBJECT_TYPE_BLOB = "blob"
+
+# Mode of a tree entry which refers to a commit of another repository, i.e. a submodule
+TREE_ENTRY_MODE_GITLINK = b"160000"
+
+# Length of a binary object id in a tree object (SHA-1)
+BINARY_OBJECT_ID_LENGTH = 20
+
+# Replies of "git cat-file --batch" instead of "<object id> <type> <size>", preceded by the requested name
+SUFFIX_OF_MISSING_OBJECT = " missing"
+SUFFIX_OF_AMBIGUOUS_OBJECT = " ambiguous"
+
+# A bare repository (e.g. a mirror) has no working tree, its Git directory is the repository directory itself
+def isBareRepository(absolutePathToObject):
+    return (os.path.isfile(os.path.join(absolutePathToObject, "HEAD"))
+            and os.path.isdir(os.path.join(absolutePathToObject, "objects"))
+            and os.path.isdir(os.path.join(absolutePathToObject, "refs")))
+
+# Reads objects from the object database of a repository through a single "git cat-file --batch" process, which is
+# started once and then serves any number of requests. Works for bare and non-bare repositories.
+class GitObjectStoreReader:
+    absolutePathToRepository = ""
+    process = None
+    startTime = 0.0
+
+    def __init__(self, absolutePathToRepository):
+        self.absolutePathToRepository = absolutePathToRepository
+        self.startTime = time.perf_counter()
+        self.process = subprocess.Popen(["git", "cat-file", "--batch"], cwd=absolutePathToRepository,
+                                        stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        if self.process != None:
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process.wait()
+            self.process = None
+            # The latency of the process is its lifetime, as it serves all requests for the repository
+            scan_metrics.metrics.addSubprocess("git cat-file", time.perf_counter() - self.startTime)
+
+    # Returns (object id, object type, content) for the given object name (anything "git rev-parse" understands,
+    # e.g. "HEAD" or "HEAD:.gitmodules"). Returns (None, None, None) if there is no such object.
+    def readObject(self, objectName):
+        # A name is terminated by a newline, so a name containing one cannot be asked for
+        if "\n" in objectName:
+            return None, None, None
+        self.process.stdin.write(objectName.encode(SUBPROCESS_OUTPUT_ENCODING) + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode(SUBPROCESS_OUTPUT_ENCODING).rstrip("\n")
+        # The name may contain spaces (e.g. "HEAD:path with space/.gitmodules"), so the header is parsed from the end
+        if header.endswith(SUFFIX_OF_MISSING_OBJECT) or header.endswith(SUFFIX_OF_AMBIGUOUS_OBJECT):
+            return None, None, None
+        objectId, objectType, objectSize = header.rsplit(" ", 2)
+        content = self.process.stdout.read(int(objectSize))
+        # Each object is terminated by a newline which is not part of its content
+        self.process.stdout.read(1)
+        return objectId, objectType, content
+
+    # Returns the id of the commit the given revision refers to, or None
+    def resolveCommit(self, revision):
+        objectId, objectType, content = self.readObject(revision + "^{commit}")
+        if objectType != OBJECT_TYPE_COMMIT:
+            return None
+        return objectId
+
+    # Returns (blob id, content) of the file at the given path in the given commit, or (None, None)
+    def readFile(self, commit, pathInRepository):
+        objectId, objectType, content = self.readObject(commit + ":" + pathInRepository)
+        if objectType != OBJECT_TYPE_BLOB:
+            return None, None
+        return objectId, content
+
+    # Returns the entries of the directory at the given path in the given commit as a list of (mode, name, object id)
+    def readTree(self, commit, pathInRepository):
+        objectId, objectType, content = self.readObject(commit + ":" + pathInRepository)
+        if objectType != OBJECT_TYPE_TREE:
+            return []
+        entries = []
+        position = 0
+        while position < len(content):
+            endOfMode = content.index(b" ", position)
+            endOfName = content.index(b"\0", endOfMode)
+            mode = content[position:endOfMode]
+            name = content[endOfMode + 1:endOfName].decode(SUBPROCESS_OUTPUT_ENCODING, "replace")
+            entryObjectId = content[endOfName + 1:endOfName + 1 + BINARY_OBJECT_ID_LENGTH].hex()
+            entries.append((mode, name, entryObjectId))
+            position = endOfName + 1 + BINARY_OBJECT_ID_LENGTH
+        return entries
+
+    # Returns path -> commit for those of the given paths which are gitlinks (i.e. submodules) in the given commit.
+    # Each directory containing one of the paths is read only once.
+    def readGitlinks(self, commit, pathsInRepository):
+        namesByDirectory = {}
+        for pathInRepository in pathsInRepository:
+            directory, _, name = pathInRepository.strip("/").rpartition("/")
+            namesByDirectory.setdefault(directory, set()).add(name)
+        gitlinks = {}
+        for directory, names in namesByDirectory.items():
+            for mode, name, entryObjectId in self.readTree(commit, directory):
+                if mode == TREE_ENTRY_MODE_GITLINK and name in names:
+                    if directory == "":
+                        gitlinks[name] = entryObjectId
+                    else:
+                        gitlinks[directory + "/" + name] = entryObjectId
+        return gitlinks
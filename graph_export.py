@@ -0,0 +1,278 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Exports the graph of a DependencyGraph (see dependency_graph.py) for other tools, either as a binary snapshot which
+# can be memory-mapped and queried without parsing, or streamed as JSON or DOT.
+#
+# Layout of a snapshot (all numbers are little-endian 32-bit integers):
+#   header: SNAPSHOT_MAGIC, format version, number of slots (largest project id + 1), number of projects,
+#           number of relations, number of build jobs, number of builds, size of the string table in bytes
+#   projectNameOffsets       slots + 1     names of project i: strings[projectNameOffsets[i]:projectNameOffsets[i + 1]]
+#   projectIdsByName         projects      ids of all projects, sorted by the UTF-8 bytes of their names
+#   dependencyOffsets        slots + 1     the projects project i depends on:
+#   dependencies             relations         dependencies[dependencyOffsets[i]:dependencyOffsets[i + 1]]
+#   dependentOffsets         slots + 1     the projects depending on project i, in the same form
+#   dependents               relations
+#   buildJobOffsets          slots + 1     indices of the build jobs building project i, in the same form
+#   buildJobs                builds
+#   buildJobNameOffsets      build jobs + 1
+#   strings                  the UTF-8 names of all projects, then of all build jobs. Each name is stored once.
+# Ids of deleted projects are slots with an empty name and no relations.
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+SNAPSHOT_MAGIC = b"GMDGRAPH"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8s7I")
+# Snapshots are meant to be read by other tools, but mkstemp creates files only their owner can read
+SNAPSHOT_FILE_MODE = 0o644
+
+JSON_EXPORT_FORMAT_VERSION = 1
+
+# Prefixes of the node ids in DOT exports
+PREFIX_OF_PROJECT_NODE = "project:"
+PREFIX_OF_BUILD_JOB_NODE = "job:"
+
+# Concatenates the encoded names and returns (offsets, bytes). The offsets start at firstOffset.
+def internNames(names, firstOffset = 0):
+    offsets = array('i', [firstOffset])
+    encodedNames = []
+    for name in names:
+        encodedName = name.encode('utf-8') if name != None else b""
+        encodedNames.append(encodedName)
+        offsets.append(offsets[-1] + len(encodedName))
+    return offsets, b"".join(encodedNames)
+
+# Returns the dependencies of all projects in compressed sparse row form, computed from the dependents
+def invertAdjacency(numberOfSlots, dependentOffsets, dependents):
+    dependencyOffsets = array('i', bytes(4 * (numberOfSlots + 1)))
+    for dependentId in dependents:
+        dependencyOffsets[dependentId + 1] += 1
+    for projectId in range(numberOfSlots):
+        dependencyOffsets[projectId + 1] += dependencyOffsets[projectId]
+    dependencies = array('i', bytes(4 * len(dependents)))
+    nextPositions = array('i', dependencyOffsets)
+    for projectId in range(numberOfSlots):
+        for position in range(dependentOffsets[projectId], dependentOffsets[projectId + 1]):
+            dependentId = dependents[position]
+            dependencies[nextPositions[dependentId]] = projectId
+            nextPositions[dependentId] += 1
+    return dependencyOffsets, dependencies
+
+# The snapshot is written to a temporary file which then replaces the given one, so that readers which have mapped the
+# old snapshot keep seeing it unchanged
+def writeGraphSnapshot(graph, pathToFile):
+    numberOfSlots = graph.getNumberOfSlots()
+    projectNameOffsets, encodedProjectNames = internNames(graph.projectNames)
+    projectIdsByName = array('i', sorted((projectId for projectId in range(numberOfSlots) if graph.projectNames[projectId] != None),
+                                         key = lambda projectId: graph.projectNames[projectId].encode('utf-8')))
+    dependencyOffsets, dependencies = invertAdjacency(numberOfSlots, graph.dependentOffsets, graph.dependents)
+    buildJobNames = sorted(set(buildJobName for buildJobNamesOfProject in graph.buildJobNamesByProjectId.values() for buildJobName in buildJobNamesOfProject))
+    buildJobIndicesByName = {buildJobNames[buildJobIndex]: buildJobIndex for buildJobIndex in range(len(buildJobNames))}
+    buildJobOffsets = array('i', [0])
+    buildJobs = array('i')
+    for projectId in range(numberOfSlots):
+        buildJobs.extend(buildJobIndicesByName[buildJobName] for buildJobName in graph.buildJobNamesByProjectId.get(projectId, []))
+        buildJobOffsets.append(len(buildJobs))
+    buildJobNameOffsets, encodedBuildJobNames = internNames(buildJobNames, len(encodedProjectNames))
+    sections = [projectNameOffsets, projectIdsByName, dependencyOffsets, dependencies, array('i', graph.dependentOffsets),
+                array('i', graph.dependents), buildJobOffsets, buildJobs, buildJobNameOffsets]
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, numberOfSlots, len(projectIdsByName), len(dependencies),
+                                  len(buildJobNames), len(buildJobs), len(encodedProjectNames) + len(encodedBuildJobNames))
+    absolutePathToFile = os.path.abspath(pathToFile)
+    fileDescriptor, pathToTemporaryFile = tempfile.mkstemp(dir = os.path.dirname(absolutePathToFile), prefix = ".snapshot_")
+    try:
+        with os.fdopen(fileDescriptor, 'wb') as snapshotFile:
+            snapshotFile.write(header)
+            for section in sections:
+                if sys.byteorder != "little":
+                    section.byteswap()
+                section.tofile(snapshotFile)
+            snapshotFile.write(encodedProjectNames)
+            snapshotFile.write(encodedBuildJobNames)
+        os.chmod(pathToTemporaryFile, SNAPSHOT_FILE_MODE)
+        os.replace(pathToTemporaryFile, absolutePathToFile)
+    except:
+        os.remove(pathToTemporaryFile)
+        raise
+
+# Read access to a snapshot written by writeGraphSnapshot. The file is memory-mapped, and the relations are returned
+# as views of the mapping without copying. The attributes dependentOffsets and dependents have the same meaning as in
+# DependencyGraph, so the algorithms of dependency_graph.py which only follow the dependents (e.g. computeBuildWaves)
+# work on a snapshot as well. Views obtained from a snapshot must be released before the snapshot is closed.
+class GraphSnapshot:
+    snapshotFile = None
+    mapping = None
+    numberOfSlots = 0
+    numberOfProjects = 0
+    numberOfRelations = 0
+    numberOfBuildJobs = 0
+    numberOfBuilds = 0
+    projectNameOffsets = None
+    projectIdsByName = None
+    dependencyOffsets = None
+    dependencies = None
+    dependentOffsets = None
+    dependents = None
+    buildJobOffsets = None
+    buildJobs = None
+    buildJobNameOffsets = None
+    strings = None
+
+    def __init__(self, pathToFile):
+        if sys.byteorder != "little":
+            raise ValueError("Snapshots can only be mapped on little-endian machines")
+        self.snapshotFile = open(pathToFile, 'rb')
+        try:
+            self.mapping = mmap.mmap(self.snapshotFile.fileno(), 0, access = mmap.ACCESS_READ)
+            self.readSections()
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def readSections(self):
+        if len(self.mapping) < SNAPSHOT_HEADER.size:
+            raise ValueError("Not a dependency graph snapshot: " + self.snapshotFile.name)
+        (magic, formatVersion, self.numberOfSlots, self.numberOfProjects, self.numberOfRelations, self.numberOfBuildJobs,
+         self.numberOfBuilds, sizeOfStrings) = SNAPSHOT_HEADER.unpack_from(self.mapping)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a dependency graph snapshot: " + self.snapshotFile.name)
+        if formatVersion != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError("Unsupported snapshot format version " + str(formatVersion) + ", expected " + str(SNAPSHOT_FORMAT_VERSION))
+        sectionLengths = [self.numberOfSlots + 1, self.numberOfProjects, self.numberOfSlots + 1, self.numberOfRelations,
+                          self.numberOfSlots + 1, self.numberOfRelations, self.numberOfSlots + 1, self.numberOfBuilds,
+                          self.numberOfBuildJobs + 1]
+        endOfSections = SNAPSHOT_HEADER.size + 4 * sum(sectionLengths)
+        if len(self.mapping) != endOfSections + sizeOfStrings:
+            raise ValueError("Snapshot is truncated or corrupt: " + self.snapshotFile.name)
+        numbers = memoryview(self.mapping)[SNAPSHOT_HEADER.size:endOfSections].cast('i')
+        sections = []
+        position = 0
+        for sectionLength in sectionLengths:
+            sections.append(numbers[position:position + sectionLength])
+            position += sectionLength
+        numbers.release()
+        (self.projectNameOffsets, self.projectIdsByName, self.dependencyOffsets, self.dependencies, self.dependentOffsets,
+         self.dependents, self.buildJobOffsets, self.buildJobs, self.buildJobNameOffsets) = sections
+        self.strings = memoryview(self.mapping)[endOfSections:]
+
+    def close(self):
+        for view in [self.projectNameOffsets, self.projectIdsByName, self.dependencyOffsets, self.dependencies,
+                     self.dependentOffsets, self.dependents, self.buildJobOffsets, self.buildJobs,
+                     self.buildJobNameOffsets, self.strings]:
+            if view != None:
+                view.release()
+        if self.mapping != None:
+            self.mapping.close()
+            self.mapping = None
+        if self.snapshotFile != None:
+            self.snapshotFile.close()
+            self.snapshotFile = None
+
+    def getNumberOfSlots(self):
+        return self.numberOfSlots
+
+    # Returns None for ids of deleted projects
+    def getProjectName(self, projectId):
+        if self.projectNameOffsets[projectId] == self.projectNameOffsets[projectId + 1]:
+            return None
+        return str(self.strings[self.projectNameOffsets[projectId]:self.projectNameOffsets[projectId + 1]], 'utf-8')
+
+    # Binary search in projectIdsByName. Returns None if there is no project with this name.
+    def findProjectId(self, projectName):
+        encodedName = projectName.encode('utf-8')
+        lowerBound = 0
+        upperBound = self.numberOfProjects
+        while lowerBound < upperBound:
+            middle = (lowerBound + upperBound) // 2
+            projectId = self.projectIdsByName[middle]
+            encodedNameOfProject = self.strings[self.projectNameOffsets[projectId]:self.projectNameOffsets[projectId + 1]].tobytes()
+            if encodedNameOfProject == encodedName:
+                return projectId
+            if encodedNameOfProject < encodedName:
+                lowerBound = middle + 1
+            else:
+                upperBound = middle
+        return None
+
+    def getDependencies(self, projectId):
+        return self.dependencies[self.dependencyOffsets[projectId]:self.dependencyOffsets[projectId + 1]]
+
+    def getDependents(self, projectId):
+        return self.dependents[self.dependentOffsets[projectId]:self.dependentOffsets[projectId + 1]]
+
+    def getBuildJobName(self, buildJobIndex):
+        return str(self.strings[self.buildJobNameOffsets[buildJobIndex]:self.buildJobNameOffsets[buildJobIndex + 1]], 'utf-8')
+
+    def getBuildJobNames(self, projectId):
+        return [self.getBuildJobName(self.buildJobs[position]) for position in range(self.buildJobOffsets[projectId], self.buildJobOffsets[projectId + 1])]
+
+# Writes {"formatVersion", "projects": [{"name", "buildJobs"}], "dependencies": [[project, dependency]]} to the given
+# text file, one entry at a time, so that the whole document is never held in memory
+def writeGraphAsJson(graph, outputFile):
+    outputFile.write('{"formatVersion": ' + str(JSON_EXPORT_FORMAT_VERSION) + ',\n "projects": [')
+    separator = "\n  "
+    for projectId in range(graph.getNumberOfSlots()):
+        projectName = graph.projectNames[projectId]
+        if projectName == None:
+            continue
+        outputFile.write(separator + json.dumps({"name": projectName, "buildJobs": graph.buildJobNamesByProjectId.get(projectId, [])}))
+        separator = ",\n  "
+    outputFile.write('],\n "dependencies": [')
+    separator = "\n  "
+    for projectId in range(graph.getNumberOfSlots()):
+        for dependentId in graph.getDependents(projectId):
+            outputFile.write(separator + json.dumps([graph.projectNames[dependentId], graph.projectNames[projectId]]))
+            separator = ",\n  "
+    outputFile.write(']}\n')
+
+def quoteDotIdentifier(name):
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+# Build jobs are often named like the project they build, so the node ids carry the kind of node and the name is
+# shown as label
+def getDotNodeOfProject(projectName):
+    return quoteDotIdentifier(PREFIX_OF_PROJECT_NODE + projectName)
+
+def getDotNodeOfBuildJob(buildJobName):
+    return quoteDotIdentifier(PREFIX_OF_BUILD_JOB_NODE + buildJobName)
+
+# Writes the graph in the DOT language of Graphviz. Projects point to the projects they depend on, build jobs (boxes)
+# point to the projects they build.
+def writeGraphAsDot(graph, outputFile):
+    outputFile.write("digraph dependencies {\n")
+    for projectId in range(graph.getNumberOfSlots()):
+        projectName = graph.projectNames[projectId]
+        if projectName == None:
+            continue
+        outputFile.write("  " + getDotNodeOfProject(projectName) + " [label=" + quoteDotIdentifier(projectName) + "];\n")
+        for buildJobName in graph.buildJobNamesByProjectId.get(projectId, []):
+            outputFile.write("  " + getDotNodeOfBuildJob(buildJobName) + " [label=" + quoteDotIdentifier(buildJobName) + ", shape=box];\n")
+            outputFile.write("  " + getDotNodeOfBuildJob(buildJobName) + " -> " + getDotNodeOfProject(projectName) + " [style=dashed];\n")
+    for projectId in range(graph.getNumberOfSlots()):
+        for dependentId in graph.getDependents(projectId):
+            outputFile.write("  " + getDotNodeOfProject(graph.projectNames[dependentId]) + " -> " + getDotNodeOfProject(graph.projectNames[projectId]) + ";\n")
+    outputFile.write("}\n")
@@ -18,38 +18,99 @@ import os
 import argparse
 import pathlib
 import sys
-import sqlite3
 
-SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
+from create_dependency_database import assertSchemaIsUpToDate
+import dependency_database
+from dependency_database import runWithRetry
+from dependency_closure import rebuildClosure
+import scan_metrics
+from scan_metrics import measurePhase
 
-DATABASE_FILE_NAME = "gitproject_dependency_database.db"
+SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
 
 sqlCmdForCleaningBuildsTable = "DELETE FROM Builds"
-sqlCmdForFillingBuildsTable = "insert or replace into Builds (buildJobId, sourceProjectId) select b.id, s.id from SourceCodeProject s, JenkinsBuildJob b where s.SourceCodeRepositoryName = b.sourceCodeRepositoryUrl;"
+# Projects and build jobs are matched by the canonical form of their repository URLs, which is indexed on both sides
+sqlCmdForFillingBuildsTable = "insert or replace into Builds (buildJobId, sourceProjectId) select r.buildJobId, s.id from SourceCodeProject s join JenkinsBuildJobRemote r on s.canonicalRepositoryUrl = r.canonicalRepositoryUrl;"
+
+# Only rows of projects and build jobs recorded in BuildsChangeLog (by triggers) can have changed since the last run
+sqlCmdForCleaningBuildsChangeLog = "DELETE FROM BuildsChangeLog"
+sqlCmdForDeletingBuildsOfChangedProjects = "delete from Builds where sourceProjectId in (select sourceProjectId from BuildsChangeLog);"
+sqlCmdForDeletingBuildsOfChangedBuildJobs = "delete from Builds where buildJobId in (select buildJobId from BuildsChangeLog);"
+sqlCmdForFillingBuildsOfChangedProjects = "insert or replace into Builds (buildJobId, sourceProjectId) select r.buildJobId, s.id from SourceCodeProject s join JenkinsBuildJobRemote r on s.canonicalRepositoryUrl = r.canonicalRepositoryUrl where s.id in (select sourceProjectId from BuildsChangeLog);"
+sqlCmdForFillingBuildsOfChangedBuildJobs = "insert or replace into Builds (buildJobId, sourceProjectId) select r.buildJobId, s.id from JenkinsBuildJobRemote r join SourceCodeProject s on s.canonicalRepositoryUrl = r.canonicalRepositoryUrl where r.buildJobId in (select buildJobId from BuildsChangeLog);"
 
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Materializes the results of frequent queries in the database.")
+    parser.add_argument("--full",
+        dest = "full",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Compute Builds from scratch. Without this parameter, only the rows of projects and build jobs changed since the last run are updated.")
+    parser.add_argument("--rebuild-closure",
+        dest = "rebuildClosure",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Compute the transitive closure of the dependencies (DependsOnClosure) from scratch. The scanners keep it up to date, so this is only needed to repair it.")
+    scan_metrics.addArguments(parser)
+    return parser
+
+# All statements run in a single transaction, so readers never see a partially filled table
 def materializeBuildsRelation(dbConnection):
     cursor = dbConnection.cursor()
     cursor.execute(sqlCmdForCleaningBuildsTable)
     cursor.execute(sqlCmdForFillingBuildsTable)
+    scan_metrics.metrics.addRowsWritten("Builds", cursor.rowcount)
+    cursor.execute(sqlCmdForCleaningBuildsChangeLog)
     dbConnection.commit()
+    scan_metrics.metrics.addCommit()
+
+def updateBuildsRelation(dbConnection):
+    cursor = dbConnection.cursor()
+    cursor.execute(sqlCmdForDeletingBuildsOfChangedProjects)
+    cursor.execute(sqlCmdForDeletingBuildsOfChangedBuildJobs)
+    numberOfRows = 0
+    for sqlCmd in (sqlCmdForFillingBuildsOfChangedProjects, sqlCmdForFillingBuildsOfChangedBuildJobs):
+        cursor.execute(sqlCmd)
+        numberOfRows += cursor.rowcount
+    scan_metrics.metrics.addRowsWritten("Builds", numberOfRows)
+    cursor.execute(sqlCmdForCleaningBuildsChangeLog)
+    dbConnection.commit()
+    scan_metrics.metrics.addCommit()
 
 def connectToDatabase():
-    if not os.path.exists(DATABASE_FILE_NAME):
-        raise FileNotFoundError("Database file not found: " + DATABASE_FILE_NAME)
-    return sqlite3.connect(DATABASE_FILE_NAME)
+    dbConnection = dependency_database.connectToDatabase()
+    assertSchemaIsUpToDate(dbConnection)
+    return dbConnection
+
+def materializeClosure(dbConnection):
+    rebuildClosure(dbConnection)
+    dbConnection.commit()
+    scan_metrics.metrics.addCommit()
 
-def materializeQueries():
+def materializeQueries(full, shouldRebuildClosure):
     dbConnection = connectToDatabase()
-    materializeBuildsRelation(dbConnection)
+    with measurePhase("materialize builds"):
+        if full:
+            runWithRetry(dbConnection, lambda: materializeBuildsRelation(dbConnection))
+        else:
+            runWithRetry(dbConnection, lambda: updateBuildsRelation(dbConnection))
+    if shouldRebuildClosure:
+        with measurePhase("rebuild closure"):
+            runWithRetry(dbConnection, lambda: materializeClosure(dbConnection))
     dbConnection.close()
 
 def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
     try:
-        materializeQueries()
-    except FileNotFoundError as e:
+        scan_metrics.runWithMetrics(args, lambda: materializeQueries(args.full, args.rebuildClosure))
+    except (FileNotFoundError, ValueError) as e:
         print("Error:", e, file = sys.stderr)
         sys.exit(1)
 
 
 ## Main ##
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Combines the databases written by the scanners for several shards (see sharding.py) into a new database.
+# Projects and build jobs are identified by their names, like the scanners do, and get new ids in the order of the
+# shards given. The shards are read once, row by row, and everything is kept in dictionaries, so the time is linear in
+# the total number of rows. DependsOnClosure and Builds are computed from scratch for the merged database.
+#
+# Where shards disagree, the first shard given wins, except that known values replace unknown ones:
+# - the URL and HEAD commit of a project,
+# - the pinned commit of a dependency (dependencies themselves are the union of all shards),
+# - the remotes of a build job and the fingerprint of a repository path (taken from one shard as a whole),
+# - the history of the dependencies of a project (taken from one shard as a whole).
+
+import os
+import argparse
+import sys
+
+from create_dependency_database import createDatabase, assertSchemaIsUpToDate
+from dependency_closure import rebuildClosure
+from dependency_database import connectToDatabase, openDatabase, removeDatabase, runWithRetry, DATABASE_FILE_NAME
+from dependency_database_writer import prepareSqlStatementFromFile
+from materialize_important_queries import materializeBuildsRelation
+from repository_url import canonicalizeRepositoryUrl
+import scan_metrics
+from scan_metrics import measurePhase
+
+# The merged database is new, so the projects and build jobs are inserted with the merged ids
+PATH_TO_DML_COMMAND_FOR_INSERTING_SOURCE_PROJECT_WITH_ID = "dml/cmdForInsertingProjectWithId.sql"
+PATH_TO_DML_COMMAND_FOR_UPDATING_HEAD_COMMIT = "dml/cmdForUpdatingHeadCommit.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION = "dml/cmdForInsertingDependsOnRelation.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_HISTORY = "dml/cmdForInsertingDependsOnHistory.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_WITH_ID = "dml/cmdForInsertingBuildJobWithId.sql"
+PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_REMOTE = "dml/cmdForInsertingBuildJobRemote.sql"
+PATH_TO_DML_COMMAND_FOR_STORING_REPOSITORY_FINGERPRINT = "dml/cmdForStoringRepositoryFingerprint.sql"
+
+# Rows are read in the order of their ids, so that the merged ids do not depend on how SQLite returns them
+sqlQueryForProjectsOfShard = "SELECT id, sourceCodeProjectName, SourceCodeRepositoryName, headCommit FROM SourceCodeProject ORDER BY id"
+sqlQueryForDependenciesOfShard = "SELECT firstProject, secondProject, pinnedCommit FROM DependsOn ORDER BY firstProject, secondProject"
+sqlQueryForDependencyHistoryOfShard = "SELECT firstProject, secondProject, validFromCommit, validFromDate, validToCommit, validToDate FROM DependsOnHistory ORDER BY rowid"
+sqlQueryForBuildJobsOfShard = "SELECT id, buildJobName, sourceCodeRepositoryUrl FROM JenkinsBuildJob ORDER BY id"
+sqlQueryForBuildJobRemotesOfShard = "SELECT buildJobId, sourceCodeRepositoryUrl FROM JenkinsBuildJobRemote ORDER BY rowid"
+sqlQueryForRepositoryFingerprintsOfShard = "SELECT repositoryPath, projectId, headCommit, gitModulesBlobId FROM RepositoryFingerprint ORDER BY repositoryPath"
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Combines the databases written by scan_deps_in_git_repos.py and scan_buildjobs.py with \"--shard\" into one database.")
+    parser.add_argument("shards",
+        nargs = "+",
+        help = "Databases of the shards. Where they disagree, the first one given wins.")
+    parser.add_argument("-o", "--output",
+        dest = "output",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to create. An existing database is deleted first. Default: " + DATABASE_FILE_NAME + ".")
+    scan_metrics.addArguments(parser)
+    return parser
+
+# The merged contents of all shards, in the form of the rows to insert, with the merged ids
+class MergedShards:
+    projectIdsByName = None
+    projects = None
+    headCommitsByProjectId = None
+    pinnedCommitsByDependency = None
+    dependencyHistoryByProjectId = None
+    buildJobIdsByName = None
+    buildJobs = None
+    buildJobRemotesByBuildJobId = None
+    repositoryFingerprintsByPath = None
+
+    def __init__(self):
+        self.projectIdsByName = {}
+        self.projects = []
+        self.headCommitsByProjectId = {}
+        self.pinnedCommitsByDependency = {}
+        self.dependencyHistoryByProjectId = {}
+        self.buildJobIdsByName = {}
+        self.buildJobs = []
+        self.buildJobRemotesByBuildJobId = {}
+        self.repositoryFingerprintsByPath = {}
+
+    # Returns shard id -> merged id of the projects of the shard
+    def addProjects(self, cursor):
+        mergedProjectIds = {}
+        for projectId, projectName, remoteUrl, headCommit in cursor.execute(sqlQueryForProjectsOfShard):
+            mergedProjectId = self.projectIdsByName.get(projectName)
+            if mergedProjectId == None:
+                mergedProjectId = len(self.projects) + 1
+                self.projectIdsByName[projectName] = mergedProjectId
+                self.projects.append([mergedProjectId, projectName, remoteUrl])
+            elif not self.projects[mergedProjectId - 1][2] and remoteUrl:
+                self.projects[mergedProjectId - 1][2] = remoteUrl
+            if headCommit != None and self.headCommitsByProjectId.get(mergedProjectId) == None:
+                self.headCommitsByProjectId[mergedProjectId] = headCommit
+            mergedProjectIds[projectId] = mergedProjectId
+        return mergedProjectIds
+
+    def addDependencies(self, cursor, mergedProjectIds):
+        for firstProject, secondProject, pinnedCommit in cursor.execute(sqlQueryForDependenciesOfShard):
+            dependency = (mergedProjectIds[firstProject], mergedProjectIds[secondProject])
+            if self.pinnedCommitsByDependency.get(dependency) == None:
+                self.pinnedCommitsByDependency[dependency] = pinnedCommit
+
+    def addDependencyHistory(self, cursor, mergedProjectIds):
+        dependencyHistoryByProjectId = {}
+        for dataRow in cursor.execute(sqlQueryForDependencyHistoryOfShard):
+            mergedProjectId = mergedProjectIds[dataRow[0]]
+            if mergedProjectId not in self.dependencyHistoryByProjectId:
+                dependencyHistoryByProjectId.setdefault(mergedProjectId, []).append((mergedProjectId, mergedProjectIds[dataRow[1]]) + tuple(dataRow[2:]))
+        self.dependencyHistoryByProjectId.update(dependencyHistoryByProjectId)
+
+    def addBuildJobs(self, cursor):
+        mergedBuildJobIds = {}
+        for buildJobId, buildJobName, remoteUrl in cursor.execute(sqlQueryForBuildJobsOfShard):
+            mergedBuildJobId = self.buildJobIdsByName.get(buildJobName)
+            if mergedBuildJobId == None:
+                mergedBuildJobId = len(self.buildJobs) + 1
+                self.buildJobIdsByName[buildJobName] = mergedBuildJobId
+                self.buildJobs.append((mergedBuildJobId, buildJobName, remoteUrl))
+                mergedBuildJobIds[buildJobId] = mergedBuildJobId
+        # Only the remotes of build jobs which were new in this shard are taken
+        buildJobRemotesByBuildJobId = {}
+        for buildJobId, remoteUrl in cursor.execute(sqlQueryForBuildJobRemotesOfShard):
+            if buildJobId in mergedBuildJobIds:
+                buildJobRemotesByBuildJobId.setdefault(mergedBuildJobIds[buildJobId], []).append(remoteUrl)
+        self.buildJobRemotesByBuildJobId.update(buildJobRemotesByBuildJobId)
+
+    def addRepositoryFingerprints(self, cursor, mergedProjectIds):
+        for repositoryPath, projectId, headCommit, gitModulesBlobId in cursor.execute(sqlQueryForRepositoryFingerprintsOfShard):
+            if repositoryPath not in self.repositoryFingerprintsByPath and projectId in mergedProjectIds:
+                self.repositoryFingerprintsByPath[repositoryPath] = (repositoryPath, mergedProjectIds[projectId], headCommit, gitModulesBlobId)
+
+    def addShard(self, dbConnection):
+        cursor = dbConnection.cursor()
+        mergedProjectIds = self.addProjects(cursor)
+        self.addDependencies(cursor, mergedProjectIds)
+        self.addDependencyHistory(cursor, mergedProjectIds)
+        self.addBuildJobs(cursor)
+        self.addRepositoryFingerprints(cursor, mergedProjectIds)
+
+    # Inserts everything in a single transaction. Does not commit.
+    def writeTo(self, dbConnection):
+        cursor = dbConnection.cursor()
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_SOURCE_PROJECT_WITH_ID),
+                           ((projectId, projectName, remoteUrl, canonicalizeRepositoryUrl(remoteUrl)) for projectId, projectName, remoteUrl in self.projects))
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_UPDATING_HEAD_COMMIT),
+                           ((headCommit, projectId) for projectId, headCommit in self.headCommitsByProjectId.items()))
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION),
+                           (dependency + (pinnedCommit,) for dependency, pinnedCommit in self.pinnedCommitsByDependency.items()))
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_HISTORY),
+                           (dataRow for dependencyHistory in self.dependencyHistoryByProjectId.values() for dataRow in dependencyHistory))
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_WITH_ID), self.buildJobs)
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_BUILD_JOB_REMOTE),
+                           ((buildJobId, remoteUrl, canonicalizeRepositoryUrl(remoteUrl)) for buildJobId, remoteUrls in self.buildJobRemotesByBuildJobId.items() for remoteUrl in remoteUrls))
+        cursor.executemany(prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_STORING_REPOSITORY_FINGERPRINT), self.repositoryFingerprintsByPath.values())
+        scan_metrics.metrics.addRowsWritten("SourceCodeProject", len(self.projects))
+        scan_metrics.metrics.addRowsWritten("DependsOn", len(self.pinnedCommitsByDependency))
+        scan_metrics.metrics.addRowsWritten("JenkinsBuildJob", len(self.buildJobs))
+
+def writeMergedDatabase(mergedShards, pathToDatabase):
+    dbConnection = openDatabase(pathToDatabase)
+    try:
+        with measurePhase("database writes"):
+            mergedShards.writeTo(dbConnection)
+        with measurePhase("rebuild closure"):
+            rebuildClosure(dbConnection)
+        dbConnection.commit()
+        scan_metrics.metrics.addCommit()
+        with measurePhase("materialize builds"):
+            runWithRetry(dbConnection, lambda: materializeBuildsRelation(dbConnection))
+    finally:
+        dbConnection.close()
+
+def mergeShards(pathsToShards, pathToOutput):
+    absolutePathToOutput = os.path.realpath(pathToOutput)
+    for pathToShard in pathsToShards:
+        if os.path.realpath(pathToShard) == absolutePathToOutput:
+            raise ValueError("The output must not be one of the shards: " + pathToShard)
+    mergedShards = MergedShards()
+    for pathToShard in pathsToShards:
+        print("Reading shard", pathToShard)
+        dbConnection = connectToDatabase(pathToShard)
+        try:
+            assertSchemaIsUpToDate(dbConnection)
+            with measurePhase("read shards"):
+                mergedShards.addShard(dbConnection)
+        finally:
+            dbConnection.close()
+    removeDatabase(pathToOutput)
+    createDatabase(pathToOutput)
+    writeMergedDatabase(mergedShards, pathToOutput)
+    print("Merged", len(pathsToShards), "shards:", len(mergedShards.projects), "projects,", len(mergedShards.pinnedCommitsByDependency),
+          "dependencies,", len(mergedShards.buildJobs), "build jobs")
+
+def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    try:
+        scan_metrics.runWithMetrics(args, lambda: mergeShards(args.shards, args.output))
+    except (FileNotFoundError, ValueError) as e:
+        print("Error:", e, file = sys.stderr)
+        sys.exit(1)
+
+
+## Main ##
+if __name__ == "__main__":
+    main()
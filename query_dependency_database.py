@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import argparse
+import json
+import sys
+
+from create_dependency_database import assertSchemaIsUpToDate
+import dependency_database
+from dependency_database_writer import prepareSqlStatementFromFile
+
+PATH_TO_DML_QUERY_FOR_PROJECTS_AFFECTED_BY_PROJECT = "dml/queryForProjectsAffectedByProject.sql"
+PATH_TO_DML_QUERY_FOR_BUILD_JOBS_AFFECTED_BY_PROJECT = "dml/queryForBuildJobsAffectedByProject.sql"
+PATH_TO_DML_QUERY_FOR_HEAD_COMMIT_OF_PROJECT = "dml/queryForHeadCommitOfProject.sql"
+PATH_TO_DML_QUERY_FOR_OUTDATED_PINS_OF_PROJECT = "dml/queryForOutdatedPinsOfProject.sql"
+PATH_TO_DML_QUERY_FOR_PINNED_COMMIT_DRIFT = "dml/queryForPinnedCommitDrift.sql"
+PATH_TO_DML_QUERY_FOR_DEPENDENCY_HISTORY_OF_PROJECT = "dml/queryForDependencyHistoryOfProject.sql"
+PATH_TO_DML_QUERY_FOR_CONSUMER_HISTORY_OF_PROJECT = "dml/queryForConsumerHistoryOfProject.sql"
+
+EXPORT_FORMAT_SNAPSHOT = "snapshot"
+EXPORT_FORMAT_JSON = "json"
+EXPORT_FORMAT_DOT = "dot"
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Answers questions about the dependencies stored in the database.")
+    parser.add_argument("--socket",
+        dest = "socket",
+        action = "store",
+        help = "Ask the daemon listening on the given socket (see dependency_daemon.py) instead of reading the database. Only \"impact\" and \"waves\" are answered by the daemon.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    impactParser = subparsers.add_parser("impact",
+        help = "List the projects and build jobs affected, directly or transitively, by a change to a project.")
+    impactParser.add_argument("-p", "--project",
+        dest = "project",
+        action = "store",
+        required = True,
+        help = "Name of the changed project, as stored by scan_deps_in_git_repos.py.")
+    wavesParser = subparsers.add_parser("waves",
+        help = "Print, as JSON, the order in which the projects affected by a change have to be built. All build jobs of a wave can be triggered in parallel once the previous wave is done.")
+    wavesParser.add_argument("-p", "--project",
+        dest = "projects",
+        action = "append",
+        help = "Name of a changed project. Can be given more than once. Without this parameter, all projects are considered changed.")
+    driftParser = subparsers.add_parser("drift",
+        help = "List the projects which pin an outdated commit of a project as submodule. Without \"--project\", list all projects which are pinned at more than one commit or at a commit other than their HEAD.")
+    driftParser.add_argument("-p", "--project",
+        dest = "project",
+        action = "store",
+        help = "Name of the project whose consumers are listed.")
+    driftParser.add_argument("-c", "--commit",
+        dest = "commit",
+        action = "store",
+        help = "Commit the pinned commits of the consumers are compared to. Default: the HEAD commit stored when the repository of the project was last scanned as a top-level repository.")
+    historyParser = subparsers.add_parser("history",
+        help = "List when the dependencies and the consumers of a project were added and removed, as stored by scan_deps_in_git_repos.py --history.")
+    historyParser.add_argument("-p", "--project",
+        dest = "project",
+        action = "store",
+        required = True,
+        help = "Name of the project.")
+    exportParser = subparsers.add_parser("export",
+        help = "Export the projects, their dependencies and the build jobs building them.")
+    exportParser.add_argument("-f", "--format",
+        dest = "format",
+        action = "store",
+        choices = [EXPORT_FORMAT_SNAPSHOT, EXPORT_FORMAT_JSON, EXPORT_FORMAT_DOT],
+        default = EXPORT_FORMAT_SNAPSHOT,
+        help = "\"snapshot\" is a binary file which other tools can memory-map and query without parsing (see graph_export.py), \"json\" and \"dot\" (Graphviz) are text. Default: snapshot.")
+    exportParser.add_argument("-o", "--output",
+        dest = "output",
+        action = "store",
+        help = "File to write. Required for snapshots, text is written to standard output without this parameter.")
+    return parser
+
+def connectToDatabase():
+    dbConnection = dependency_database.connectToDatabase()
+    assertSchemaIsUpToDate(dbConnection)
+    return dbConnection
+
+# Prints the projects depending on the given project and the build jobs building the project or one of them. The
+# number after each entry is the length of the shortest chain of dependencies to the changed project.
+def printImpactOfProject(dbConnection, projectName):
+    cursor = dbConnection.cursor()
+    affectedProjects = cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_PROJECTS_AFFECTED_BY_PROJECT), [projectName]).fetchall()
+    affectedBuildJobs = cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_BUILD_JOBS_AFFECTED_BY_PROJECT), [projectName, projectName]).fetchall()
+    printImpact(affectedProjects, affectedBuildJobs)
+
+# affectedProjects are (project name, distance), affectedBuildJobs are (build job name, project name, distance)
+def printImpact(affectedProjects, affectedBuildJobs):
+    print("Affected projects:")
+    for dataRow in affectedProjects:
+        print(" ", dataRow[0], dataRow[1])
+    print("Affected build jobs:")
+    for dataRow in affectedBuildJobs:
+        print(" ", dataRow[0], "(" + dataRow[1] + ")", dataRow[2])
+
+# Prints the consumers of the project which pin another commit than the given one or, by default, the HEAD of the
+# project. Consumers whose pinned commit is unknown are not listed.
+def printOutdatedPinsOfProject(dbConnection, projectName, referenceCommit):
+    cursor = dbConnection.cursor()
+    dataRow = cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_HEAD_COMMIT_OF_PROJECT), [projectName]).fetchone()
+    if dataRow == None:
+        raise ValueError("Unknown project: " + projectName)
+    if referenceCommit == None:
+        referenceCommit = dataRow[0]
+    if referenceCommit == None:
+        raise ValueError("The HEAD commit of " + projectName + " is not known. Scan its repository as a top-level repository or use --commit.")
+    print("Projects pinning a commit of", projectName, "other than", referenceCommit + ":")
+    for dataRow in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_OUTDATED_PINS_OF_PROJECT), [projectName, referenceCommit]):
+        print(" ", dataRow[0], dataRow[1])
+
+def printPinnedCommitDrift(dbConnection):
+    cursor = dbConnection.cursor()
+    print("Projects pinned at more than one commit or at a commit other than their HEAD:")
+    for dataRow in cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_PINNED_COMMIT_DRIFT)):
+        projectName, headCommit, numberOfCommits, numberOfConsumers, numberOfOutdatedConsumers = dataRow
+        print(" ", projectName, "(HEAD " + (headCommit if headCommit != None else "unknown") + "):", numberOfCommits,
+              "commit(s) pinned by", numberOfConsumers, "project(s),", int(numberOfOutdatedConsumers), "of them outdated")
+
+# Each line is an interval in which the dependency existed: first commit and its date, then the commit removing it
+# and its date, or "until now". Consumers are only listed if their own history was scanned.
+def printDependencyHistoryOfProject(dbConnection, projectName):
+    cursor = dbConnection.cursor()
+    if cursor.execute(prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_HEAD_COMMIT_OF_PROJECT), [projectName]).fetchone() == None:
+        raise ValueError("Unknown project: " + projectName)
+    for title, pathToQuery in (("Dependencies of " + projectName + ":", PATH_TO_DML_QUERY_FOR_DEPENDENCY_HISTORY_OF_PROJECT),
+                               ("Projects depending on " + projectName + ":", PATH_TO_DML_QUERY_FOR_CONSUMER_HISTORY_OF_PROJECT)):
+        print(title)
+        for dataRow in cursor.execute(prepareSqlStatementFromFile(pathToQuery), [projectName]):
+            otherProjectName, validFromCommit, validFromDate, validToCommit, validToDate = dataRow
+            if validToCommit == None:
+                print(" ", otherProjectName, "from", validFromDate, "(" + validFromCommit + ") until now")
+            else:
+                print(" ", otherProjectName, "from", validFromDate, "(" + validFromCommit + ") to", validToDate, "(" + validToCommit + ")")
+
+# The modules needed by only some of the commands are imported by them, so that the other commands start faster
+def printBuildWaves(dbConnection, projectNames):
+    from dependency_graph import loadDependencyGraph, describeBuildWaves
+    print(json.dumps(describeBuildWaves(loadDependencyGraph(dbConnection), projectNames), indent = 2))
+
+# The daemon answers from its copy of the graph, which is updated after each of its scans
+def answerQueryWithDaemon(args):
+    from dependency_daemon import queryDaemon, QUERY_IMPACT, QUERY_WAVES
+    if args.command == "impact":
+        result = queryDaemon(args.socket, {"query": QUERY_IMPACT, "project": args.project})
+        printImpact(result["projects"], result["buildJobs"])
+    elif args.command == "waves":
+        result = queryDaemon(args.socket, {"query": QUERY_WAVES, "projects": args.projects})
+        print(json.dumps(result, indent = 2))
+    else:
+        raise ValueError("\"" + args.command + "\" cannot be answered by the daemon, omit --socket")
+
+# The graph is read in a single transaction, so that it is consistent even if a scanner writes at the same time
+def exportGraph(dbConnection, exportFormat, pathToOutputFile):
+    from dependency_graph import loadDependencyGraph
+    from graph_export import writeGraphSnapshot, writeGraphAsJson, writeGraphAsDot
+    if exportFormat == EXPORT_FORMAT_SNAPSHOT and pathToOutputFile == None:
+        raise ValueError("A snapshot can only be written to a file, use --output")
+    dbConnection.execute("BEGIN")
+    try:
+        graph = loadDependencyGraph(dbConnection)
+    finally:
+        dbConnection.rollback()
+    if exportFormat == EXPORT_FORMAT_SNAPSHOT:
+        writeGraphSnapshot(graph, pathToOutputFile)
+        return
+    writeGraph = writeGraphAsJson if exportFormat == EXPORT_FORMAT_JSON else writeGraphAsDot
+    if pathToOutputFile == None:
+        writeGraph(graph, sys.stdout)
+        return
+    with open(pathToOutputFile, 'w', encoding = 'utf-8') as outputFile:
+        writeGraph(graph, outputFile)
+
+def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    try:
+        if args.socket != None:
+            answerQueryWithDaemon(args)
+            return
+        dbConnection = connectToDatabase()
+        if args.command == "impact":
+            printImpactOfProject(dbConnection, args.project)
+        elif args.command == "waves":
+            printBuildWaves(dbConnection, args.projects)
+        elif args.command == "drift":
+            if args.project != None:
+                printOutdatedPinsOfProject(dbConnection, args.project, args.commit)
+            elif args.commit != None:
+                raise ValueError("--commit can only be used with --project")
+            else:
+                printPinnedCommitDrift(dbConnection)
+        elif args.command == "history":
+            printDependencyHistoryOfProject(dbConnection, args.project)
+        elif args.command == "export":
+            exportGraph(dbConnection, args.format, args.output)
+        dbConnection.close()
+    except (FileNotFoundError, ConnectionError, ValueError) as e:
+        print("Error:", e, file = sys.stderr)
+        sys.exit(1)
+
+## Main ##
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Brings the database up to date in a single process, doing what create_dependency_database.py --migrate,
+# scan_deps_in_git_repos.py -a, scan_buildjobs.py -d and materialize_important_queries.py would do one after another.
+# Both scans share one connection and one writer, so the ids of all projects and build jobs are loaded only once and
+# the statements are prepared only once. refreshDatabase can also be called by other Python programs.
+
+import os
+import argparse
+import sys
+
+from create_dependency_database import createDatabase, migrateDatabase
+from dependency_database import openDatabase, runWithRetry, DATABASE_FILE_NAME
+from dependency_database_writer import DependencyDatabaseWriter, DEFAULT_BATCH_SIZE
+from materialize_important_queries import materializeBuildsRelation, updateBuildsRelation
+from scan_buildjobs import scanDirectoryForXmlFiles, processXmlJobDescription, processXmlJobDescriptionsInParallel
+from scan_deps_in_git_repos import analyzeRepositoryRootDir, DEFAULT_MAX_SUBMODULE_DEPTH
+import directory_walker
+import scan_metrics
+from scan_metrics import measurePhase
+
+def createArgumentParser():
+    parser = argparse.ArgumentParser(description="Creates or upgrades the database, scans the Git repositories and the Jenkins job descriptions and materializes the results of frequent queries, all in one process.")
+    parser.add_argument("-d", "--directory",
+        dest = "directory",
+        action = "store",
+        help = "Directory containing the Git repositories, as for scan_deps_in_git_repos.py -a -d.")
+    parser.add_argument("--jenkins-jobs",
+        dest = "jenkinsJobs",
+        action = "store",
+        help = "Directory containing the Jenkins job descriptions, as for scan_buildjobs.py -d.")
+    parser.add_argument("-b", "--bare",
+        dest = "bare",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "The directory contains bare repositories (e.g. mirrors), see scan_deps_in_git_repos.py --bare.")
+    parser.add_argument("-i", "--incremental",
+        dest = "incremental",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Skip repositories whose HEAD commit and .gitmodules file did not change since the last scan, see scan_deps_in_git_repos.py --incremental.")
+    parser.add_argument("--full",
+        dest = "full",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Compute Builds from scratch instead of updating only the rows of changed projects and build jobs.")
+    parser.add_argument("-j", "--jobs",
+        dest = "jobs",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Number of repositories scanned concurrently and of processes examining job descriptions in parallel. Default: 1.")
+    parser.add_argument("--max-depth",
+        dest = "maxDepth",
+        action = "store",
+        type = int,
+        default = DEFAULT_MAX_SUBMODULE_DEPTH,
+        help = "Maximum nesting depth of submodules to analyze. Default: " + str(DEFAULT_MAX_SUBMODULE_DEPTH) + ".")
+    parser.add_argument("--batch-size",
+        dest = "batchSize",
+        action = "store",
+        type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = "Number of rows written to the database per transaction. Default: " + str(DEFAULT_BATCH_SIZE) + ".")
+    parser.add_argument("--database",
+        dest = "database",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to refresh. It is created if it does not exist. Default: " + DATABASE_FILE_NAME + ".")
+    directory_walker.addArguments(parser)
+    scan_metrics.addArguments(parser)
+    return parser
+
+# Either directory may be None to skip its scan
+def refreshDatabase(pathToDatabase, pathToRepositories, pathToJobDescriptions, numberOfJobs = 1, maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH,
+                    incremental = False, bare = False, full = False, batchSize = DEFAULT_BATCH_SIZE, ignorePatterns = ()):
+    if not os.path.exists(pathToDatabase):
+        createDatabase(pathToDatabase)
+    dbConnection = openDatabase(pathToDatabase)
+    try:
+        migrateDatabase(dbConnection)
+        dbWriter = DependencyDatabaseWriter(dbConnection, batchSize)
+        try:
+            if pathToRepositories != None:
+                analyzeRepositoryRootDir(os.path.abspath(pathToRepositories), dbWriter, numberOfJobs, maxDepth, incremental, bare,
+                                         ignorePatterns = ignorePatterns)
+            if pathToJobDescriptions != None:
+                xmlFiles = scanDirectoryForXmlFiles(pathToJobDescriptions, ignorePatterns)
+                if numberOfJobs > 1:
+                    processXmlJobDescriptionsInParallel(dbWriter, xmlFiles, numberOfJobs)
+                else:
+                    for xmlFile in xmlFiles:
+                        processXmlJobDescription(dbWriter, xmlFile)
+        finally:
+            # Also write what has been collected so far if a scan is aborted
+            dbWriter.close()
+        with measurePhase("materialize builds"):
+            if full:
+                runWithRetry(dbConnection, lambda: materializeBuildsRelation(dbConnection))
+            else:
+                runWithRetry(dbConnection, lambda: updateBuildsRelation(dbConnection))
+    finally:
+        dbConnection.close()
+
+def main():
+    argumentParser = createArgumentParser()
+    args = argumentParser.parse_args()
+    try:
+        scan_metrics.runWithMetrics(args, lambda: refreshDatabase(args.database, args.directory, args.jenkinsJobs, args.jobs, args.maxDepth,
+                                                                  args.incremental, args.bare, args.full, args.batchSize, args.ignorePatterns))
+    except (NotADirectoryError, IsADirectoryError, FileNotFoundError, ValueError) as e:
+        print("Error:", e, file = sys.stderr)
+        sys.exit(1)
+
+
+## Main ##
+if __name__ == "__main__":
+    main()
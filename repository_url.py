@@ -0,0 +1,80 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# The same repository is often referred to by different URLs, e.g. git@host:org/repo.git in .gitmodules and
+# https://host/org/repo in the Jenkins job. canonicalizeRepositoryUrl maps all of them to the same key, so that
+# projects and build jobs can be matched by simple equality.
+
+import posixpath
+import re
+
+URL_WITH_SCHEME_PATTERN = re.compile("^([A-Za-z][A-Za-z0-9+.-]*)://(.*)$")
+# scp-like syntax [user@]host:path, which git only assumes if there is no slash before the first colon
+SCP_LIKE_URL_PATTERN = re.compile("^(?:[^@/]+@)?([^:/]+):(.*)$")
+
+SUFFIX_OF_REPOSITORY = ".git"
+
+# Returns "host/path" for remote URLs and the normalized path for local ones. Scheme, user, port, a trailing ".git"
+# and the case are ignored. Returns None for None or an empty URL.
+def canonicalizeRepositoryUrl(url):
+    if url == None or url.strip() == "":
+        return None
+    url = url.strip()
+    host = ""
+    path = url
+    match = URL_WITH_SCHEME_PATTERN.match(url)
+    if match != None:
+        if match.group(1).lower() != "file":
+            authority, _, path = match.group(2).partition("/")
+            host = authority.rpartition("@")[2]
+            if host.startswith("["):
+                host = host[:host.find("]") + 1]
+            else:
+                host = host.partition(":")[0]
+        else:
+            path = match.group(2)
+    else:
+        match = SCP_LIKE_URL_PATTERN.match(url)
+        # A single letter before the colon is a Windows drive, not a host
+        if match != None and len(match.group(1)) > 1:
+            host = match.group(1)
+            path = match.group(2)
+    path = posixpath.normpath("/" + path).strip("/")
+    if path.lower().endswith(SUFFIX_OF_REPOSITORY):
+        path = path[:-len(SUFFIX_OF_REPOSITORY)].rstrip("/")
+    return (host + "/" + path).lower()
+
+def isRelativeRepositoryUrl(url):
+    return url.startswith("./") or url.startswith("../")
+
+# Resolves a submodule URL relative to the remote URL of the superproject, like "git submodule" does. Other URLs, and
+# relative ones which cannot be resolved, are returned unchanged.
+def resolveSubmoduleUrl(remoteUrlOfSuperproject, submoduleUrl):
+    if not isRelativeRepositoryUrl(submoduleUrl) or remoteUrlOfSuperproject == None or remoteUrlOfSuperproject == "":
+        return submoduleUrl
+    baseUrl = remoteUrlOfSuperproject.rstrip("/")
+    separator = "/"
+    relativePath = submoduleUrl
+    while isRelativeRepositoryUrl(relativePath):
+        if relativePath.startswith("../"):
+            separatorPosition = baseUrl.rfind("/")
+            # In scp-like URLs, the first path component follows the colon
+            if URL_WITH_SCHEME_PATTERN.match(baseUrl) == None:
+                separatorPosition = max(separatorPosition, baseUrl.rfind(":"))
+            if separatorPosition <= 0 or baseUrl.endswith("//", 0, separatorPosition + 1):
+                return submoduleUrl
+            separator = baseUrl[separatorPosition]
+            baseUrl = baseUrl[:separatorPosition]
+        relativePath = relativePath.partition("/")[2]
+    return baseUrl + separator + relativePath
@@ -16,151 +16,209 @@
 
 import os
 import argparse
+import collections
+import itertools
 import pathlib
 import sys
 import subprocess
 from subprocess import PIPE
-import sqlite3
 from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from dependency_database import connectToDatabase, DATABASE_FILE_NAME
+from dependency_database_writer import DependencyDatabaseWriter, DEFAULT_BATCH_SIZE
+from sharding import parseShard, selectShard
+import directory_walker
+import scan_metrics
+from scan_metrics import measurePhase, printDetail
 
 SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
 
-DATABASE_FILE_NAME = "gitproject_dependency_database.db"
-PATH_TO_DML_QUERY_FOR_BUILD_JOB_BY_NAME = "dml/queryForBuildJobByName.sql"
-PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_BUILD_JOB = "dml/cmdForInsertingNewBuildJob.sql"
-#PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION = "dml/cmdForInsertingDependsOnRelation.sql"
+# The job description is parsed incrementally, looking for the equivalents of the XPath expressions
+# ".//displayName" (project name) and ".//source/remote" (Git URLs)
+TAG_OF_PROJECT_NAME = "displayName"
+TAG_OF_GIT_URL = "remote"
+TAG_OF_GIT_URL_PARENT = "source"
 
-queryForBuildJobByName = ""
-sqlCmdForInsertingNewBuildJob = ""
-
-XPATH_FOR_GIT_URL = ".//source/remote"
-XPATH_FOR_PROJECT_NAME = ".//displayName"
+# Number of files handed to a worker process at once when examining files in parallel
+NUMBER_OF_FILES_PER_TASK = 16
+# Number of tasks pending per worker process. The next files are only taken from the walk once the results of the
+# oldest task have been written, so that the files found ahead of the database writes stay bounded.
+PENDING_TASKS_PER_JOB = 2
 
 def createArgumentParser():
     parser = argparse.ArgumentParser(description="Scans Jenkins job descriptions given in the form of XML files and extracts the job name and URL of the Git repository. The results are written into an Sqlite database.")
     parser.add_argument("-d", "--directory", 
         dest = "directory",
         action = "store",
-        help = "Scan the given directory for Jenkins job description files. Each file is then treated as if given as the argument for \"-f\".")
+        help = "Scan the given directory and its subdirectories (e.g. nested Jenkins folders) for Jenkins job description files, skipping the builds folder next to the config.xml of each job. Each file is then treated as if given as the argument for \"-f\".")
     parser.add_argument("-f", "--file",
         dest="file",
         action="store",
         help = "The file to examine")
+    parser.add_argument("-j", "--jobs",
+        dest = "jobs",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Number of processes examining the files found with \"--directory\" in parallel. All database writes are still done by a single process. Default: 1.")
+    parser.add_argument("--batch-size",
+        dest = "batchSize",
+        action = "store",
+        type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = "Number of rows written to the database per transaction. Default: " + str(DEFAULT_BATCH_SIZE) + ".")
+    parser.add_argument("--shard",
+        dest = "shard",
+        action = "store",
+        type = parseShard,
+        help = "Only scan those of the files found with \"--directory\" which belong to the given shard, e.g. 0/4 for the first of four. The files are assigned to the shards by a hash of their path relative to the scanned directory. Combine the databases of all shards with merge_dependency_shards.py.")
+    parser.add_argument("--database",
+        dest = "database",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to write to, e.g. the partial database of a shard. Default: " + DATABASE_FILE_NAME + ".")
+    directory_walker.addArguments(parser)
+    scan_metrics.addArguments(parser)
     return parser
 
-def prepareSqlStatementFromFile(pathToFile):
-    statementFromFile = ""
-    with open(pathToFile, 'r') as inputFile:
-        statementFromFile = inputFile.read()
-    statementFromFile = statementFromFile.replace("\n", " ")
-    return statementFromFile
-
-def prepareSqlStatements():
-    global queryForBuildJobByName
-    queryForBuildJobByName = prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_BUILD_JOB_BY_NAME)
-    global sqlCmdForInsertingNewBuildJob 
-    sqlCmdForInsertingNewBuildJob = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_BUILD_JOB)
-
-def insertBuildJobIntoDatabase(dbConnection, projectName, remoteUrlOfRepository):
-    cursor = dbConnection.cursor()
-    cursor.execute(queryForBuildJobByName, [projectName])
-    idsForProject = set()
-    urlsForProject = set()
-    for dataRow in cursor:
-        idsForProject.add(dataRow[0])
-        urlsForProject.add(dataRow[2])
-    if len(urlsForProject) > 1:
-        print("Warning: multiple repository URLs found for project:", projectName)
-    if len(idsForProject) == 0:
-        cmdToExecute = sqlCmdForInsertingNewBuildJob.format(quote(projectName), quote(remoteUrlOfRepository))
-        cursor.execute(cmdToExecute)
-        dbConnection.commit()
-    elif len(idsForProject) == 1:
-        # Possible improvement: check whether remoteUrlOfRepository is equal to the one found in the database
-        print("OK:", projectName, "is already contained in the database. Nothing to do here.")
-    elif len(idsForProject) > 1:
-        raise ValueError("Internal error: more than one database entry for " + projectName)
-    else:
-        raise Exception("Internal error: should not reach this. Problem caused by " + projectName)
-        
-def quote(stringToQuote):
-    return "'" + stringToQuote + "'"
-
-def connectToDatabase():
-    if not os.path.exists(DATABASE_FILE_NAME):
-        raise FileNotFoundError("Database file not found: " + DATABASE_FILE_NAME)
-    return sqlite3.connect(DATABASE_FILE_NAME)
-
-# Examines the given XML file and searches for the project name and project source URL.
-# Returns: project name, project source URL if both fields exist. (None, None) else.
+# Examines the given XML file and searches for the project name and the project source URLs.
+# Returns: project name, list of project source URLs if both exist. (None, None) else.
+# The file is parsed incrementally. Elements are discarded as soon as they have been examined, and parsing stops as
+# soon as the project name and the element containing all sources have been read, so large job descriptions (e.g.
+# with embedded scripts) neither have to be read completely nor kept in memory.
 def examineXmlFile(pathToXmlFile):
     absolutePathToObject = os.path.abspath(pathToXmlFile)
     if not os.path.exists(absolutePathToObject):
         raise FileNotFoundError("Not found in file system: " + absolutePathToObject)
     if os.path.isdir(absolutePathToObject):
         raise IsADirectoryError("The argument is a directory: " + absolutePathToObject)
-    print("Examining XML file:", absolutePathToObject)
-    xmlTree = ElementTree.parse(absolutePathToObject)
-    root = xmlTree.getroot()
-    projectNames = root.findall(XPATH_FOR_PROJECT_NAME)
-    gitSourceUrls = root.findall(XPATH_FOR_GIT_URL)
-    if projectNames != None and len(projectNames) == 1 and gitSourceUrls != None and len(gitSourceUrls) == 1:
-        projectName = projectNames[0]
-        gitSourceUrl = gitSourceUrls[0]
-        return projectName.text, gitSourceUrl.text
+    printDetail("Examining XML file:", absolutePathToObject)
+    projectNames = []
+    gitSourceUrls = []
+    openElements = []
+    # Index in openElements of the element containing the sources, e.g. <data> in
+    # <sources><data><jenkins.branch.BranchSource><source><remote>. Once it is closed, all sources have been seen.
+    indexOfSourcesContainer = None
+    try:
+        for event, element in ElementTree.iterparse(absolutePathToObject, events = ("start", "end")):
+            if event == "start":
+                openElements.append(element)
+                continue
+            openElements.pop()
+            if element.tag == TAG_OF_PROJECT_NAME and len(openElements) > 0:
+                projectNames.append(element.text)
+            elif element.tag == TAG_OF_GIT_URL and len(openElements) > 0 and openElements[-1].tag == TAG_OF_GIT_URL_PARENT:
+                gitSourceUrls.append(element.text)
+                if indexOfSourcesContainer == None:
+                    indexOfSourcesContainer = max(0, len(openElements) - 3)
+            if len(openElements) > 0:
+                openElements[-1].remove(element)
+            if indexOfSourcesContainer != None and len(openElements) <= indexOfSourcesContainer and len(projectNames) > 0:
+                break
+    except ElementTree.ParseError as e:
+        print("Warning: cannot parse XML file", absolutePathToObject, ":", e, file = sys.stderr)
+        return None, None
+    gitSourceUrls = [gitSourceUrl for gitSourceUrl in gitSourceUrls if gitSourceUrl != None]
+    if len(projectNames) == 1 and projectNames[0] != None and len(gitSourceUrls) > 0:
+        return projectNames[0], gitSourceUrls
     return None, None
 
-def scanDirectoryForXmlFiles(pathToDirectory):
+# Returns a generator of the XML files below the given directory, see directory_walker.walkJobDescriptions. The
+# directory itself is checked right away.
+def scanDirectoryForXmlFiles(pathToDirectory, ignorePatterns = ()):
     absolutePathToObject = os.path.abspath(pathToDirectory)
     if not os.path.exists(absolutePathToObject):
         raise FileNotFoundError("Not found in file system: " + absolutePathToObject)
     if not os.path.isdir(absolutePathToObject):
         raise NotADirectoryError("The argument is not a directory: " + absolutePathToObject)
-    xmlFiles = []
-    for filename in os.listdir(absolutePathToObject):
-        pathToFile = os.path.join(absolutePathToObject, filename)
-        absolutePathToFile = os.path.abspath(pathToFile)
-        if os.path.isfile(absolutePathToFile) and absolutePathToFile.lower().endswith(".xml"):
-            xmlFiles.append(absolutePathToFile)
-    return xmlFiles
-
-def processXmlJobDescription(dbConnection, pathToXmlFile):
-    projectName, gitSourceUrl = examineXmlFile(pathToXmlFile)
-    if projectName == None or gitSourceUrl == None:
+    return directory_walker.walkJobDescriptions(absolutePathToObject, ignorePatterns)
+
+def processXmlJobDescription(dbWriter, pathToXmlFile):
+    with measurePhase("xml parsing"):
+        projectName, gitSourceUrls = examineXmlFile(pathToXmlFile)
+    storeXmlJobDescription(dbWriter, pathToXmlFile, projectName, gitSourceUrls)
+
+def storeXmlJobDescription(dbWriter, pathToXmlFile, projectName, gitSourceUrls):
+    scan_metrics.reportProgress("job descriptions")
+    if projectName == None or gitSourceUrls == None:
         print("File", pathToXmlFile, "is not a valid description of a Jenkins job, skipping it.")
         return
-    try:
-        insertBuildJobIntoDatabase(dbConnection, projectName, gitSourceUrl)
-    except ValueError as e:
-        print("Error: cannot process", projectName, ". This project will be skipped. Detailed reason:", e, file = sys.stderr)
+    isUnchanged = not dbWriter.addBuildJob(projectName, gitSourceUrls)
+    scan_metrics.metrics.addCacheLookup("unchanged build jobs", isUnchanged)
+    if isUnchanged:
+        printDetail("OK:", projectName, "is already contained in the database. Nothing to do here.")
+
+# Returns each path together with the results of examineXmlFile, so that the results of the worker processes can be
+# matched to the files even if these are read from a walk which can only be consumed once
+def examineXmlFilesAt(pathsToXmlFiles):
+    results = []
+    for pathToXmlFile in pathsToXmlFiles:
+        projectName, gitSourceUrls = examineXmlFile(pathToXmlFile)
+        results.append((pathToXmlFile, projectName, gitSourceUrls))
+    return results
+
+# Examines the files in worker processes, while the results are written to the database by the calling process in the
+# order of the files. The files are taken from the walk as the workers need them, NUMBER_OF_FILES_PER_TASK at a time,
+# so that the results are written while the walk goes on. The metrics of the workers are not collected; "xml parsing"
+# is the time spent waiting for them.
+def processXmlJobDescriptionsInParallel(dbWriter, xmlFiles, numberOfJobs):
+    xmlFiles = iter(xmlFiles)
+    maxNumberOfPendingTasks = numberOfJobs * PENDING_TASKS_PER_JOB
+    # Futures of the tasks in the order of their files
+    pendingTasks = collections.deque()
+    with ProcessPoolExecutor(max_workers = numberOfJobs, initializer = scan_metrics.setQuiet, initargs = (scan_metrics.isQuiet,)) as executor:
+        while True:
+            while len(pendingTasks) < maxNumberOfPendingTasks:
+                xmlFilesOfTask = list(itertools.islice(xmlFiles, NUMBER_OF_FILES_PER_TASK))
+                if len(xmlFilesOfTask) == 0:
+                    break
+                pendingTasks.append(executor.submit(examineXmlFilesAt, xmlFilesOfTask))
+            if len(pendingTasks) == 0:
+                break
+            with measurePhase("xml parsing"):
+                results = pendingTasks.popleft().result()
+            for xmlFile, projectName, gitSourceUrls in results:
+                storeXmlJobDescription(dbWriter, xmlFile, projectName, gitSourceUrls)
 
 def processCmdLineArguments(args):
     assertArgumentConsistency(args)
-    dbConnection = connectToDatabase()
-    if args.file != None:
-        processXmlJobDescription(dbConnection, args.file)
-    if args.directory != None:
-        xmlFiles = scanDirectoryForXmlFiles(args.directory)
-        for xmlFile in xmlFiles:
-            processXmlJobDescription(dbConnection, xmlFile)
-    dbConnection.close()
+    dbConnection = connectToDatabase(args.database)
+    dbWriter = DependencyDatabaseWriter(dbConnection, args.batchSize)
+    try:
+        if args.file != None:
+            processXmlJobDescription(dbWriter, args.file)
+        if args.directory != None:
+            xmlFiles = selectShard(scanDirectoryForXmlFiles(args.directory, args.ignorePatterns), os.path.abspath(args.directory), args.shard)
+            if args.jobs > 1:
+                processXmlJobDescriptionsInParallel(dbWriter, xmlFiles, args.jobs)
+            else:
+                for xmlFile in xmlFiles:
+                    processXmlJobDescription(dbWriter, xmlFile)
+    finally:
+        # Also write what has been collected so far if the scan is aborted
+        dbWriter.close()
+        dbConnection.close()
     
 def assertArgumentConsistency(args):
     checkFile = args.file != None
     checkDirectory = args.directory != None
     if not (checkFile ^ checkDirectory):
         raise ValueError("Incorrect arguments. Either --file or --directory must be set.")
+    if args.shard != None and not checkDirectory:
+        raise ValueError("--shard can only be used with --directory")
+    if len(args.ignorePatterns) > 0 and not checkDirectory:
+        raise ValueError("--ignore can only be used with --directory")
 
 def main():
     argumentParser = createArgumentParser()
     args = argumentParser.parse_args()
-    prepareSqlStatements()
     try:
-        processCmdLineArguments(args)
+        scan_metrics.runWithMetrics(args, lambda: processCmdLineArguments(args))
     except (NotADirectoryError, IsADirectoryError, FileNotFoundError, ValueError) as e:
         print("Error:", e, file = sys.stderr)
         sys.exit(1)
 
 
 ## Main ##
-main()
+if __name__ == "__main__":
+    main()
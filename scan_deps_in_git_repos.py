@@ -19,30 +19,48 @@ import argparse
 import pathlib
 import sys
 import subprocess
-from subprocess import PIPE
-import sqlite3
+from subprocess import PIPE, DEVNULL
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dependency_database import connectToDatabase, DATABASE_FILE_NAME
+from dependency_database_writer import DependencyDatabaseWriter, DEFAULT_BATCH_SIZE
+from git_object_store import GitObjectStoreReader, isBareRepository
+from repository_url import resolveSubmoduleUrl
+from sharding import parseShard, selectShard
+import directory_walker
+import git_metadata
+from git_metadata import UnsupportedRepositoryLayoutError
+import scan_metrics
+from scan_metrics import measurePhase, printDetail
 
 SUBPROCESS_OUTPUT_ENCODING = 'utf-8'
 FILE_NAME_OF_GITMODULES_FILE = ".gitmodules"
+SUFFIX_OF_BARE_REPOSITORY = ".git"
 
 LINE_PREFIX_SUBMODULE_SECTION_START = "[submodule"
 LINE_PREFIX_PATH = "path"
 LINE_PREFIX_URL = "url"
 
-DATABASE_FILE_NAME = "gitproject_dependency_database.db"
-PATH_TO_DML_QUERY_FOR_SOURCE_PROJECT_BY_NAME = "dml/queryForSourceCodeProjectByName.sql"
-PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_SOURCE_PROJECT = "dml/cmdForInsertingNewProject.sql"
-PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION = "dml/cmdForInsertingDependsOnRelation.sql"
+# Number of repository scans that may be queued per worker thread when scanning concurrently. Keeps the
+# number of pending scans bounded even for root directories containing thousands of repositories.
+PENDING_SCANS_PER_JOB = 4
 
-queryForSourceCodeProjectByName = ""
-sqlCmdForInsertingNewProject = ""
-sqlCmdForInsertingDependsOnRelation = ""
+# Submodules nested deeper than this below the repository given on the command line are not analyzed
+DEFAULT_MAX_SUBMODULE_DEPTH = 64
+
+# Names under which the lookups are reported in the metrics (see scan_metrics.py)
+CACHE_NAME_OF_METADATA_FAST_PATH = "git metadata without subprocess"
+CACHE_NAME_OF_VISITED_REPOSITORIES = "visited repositories"
+CACHE_NAME_OF_REPOSITORY_FINGERPRINTS = "repository fingerprints"
 
 
 class GitSubModule:
     name = ""
     path = ""
     url = ""
+    # Commit of the submodule recorded in the superproject at the commit examined, None if it is not recorded
+    pinnedCommit = None
     
     def __init__(self, name = "", path = "", url = ""):
         self.name = name
@@ -57,6 +75,81 @@ class GitSubModule:
         projectName = parts[2]
         projectName = projectName.replace(".git", "").strip()
         return projectName
+
+# Result of examining a single directory. Produced by scanGitRepository without touching the database, so that
+# scans can run on worker threads while a single thread writes the results.
+class GitRepositoryScanResult:
+    absolutePath = ""
+    pathIsSubmoduleAndAllowedToBeMissing = False
+    exists = True
+    # False for the empty directory of a submodule which has not been initialized
+    isCheckedOut = True
+    isGitRepository = False
+    projectName = None
+    remoteUrl = None
+    headCommit = None
+    gitModulesBlobId = None
+    submodules = None
+
+    def __init__(self, absolutePath, pathIsSubmoduleAndAllowedToBeMissing = False):
+        self.absolutePath = absolutePath
+        self.pathIsSubmoduleAndAllowedToBeMissing = pathIsSubmoduleAndAllowedToBeMissing
+        self.submodules = []
+
+    # Identifies the repository independently of where it is checked out. Falls back to the path for repositories
+    # without a remote.
+    def getRepositoryKey(self):
+        if self.remoteUrl != None:
+            return self.remoteUrl
+        return self.absolutePath
+
+    # Two checkouts with the same identity have the same submodules, so only one of them needs to be analyzed
+    def getIdentity(self):
+        return (self.getRepositoryKey(), self.headCommit)
+
+    # If the fingerprint of a checkout did not change since the last scan, neither did its submodules
+    def getFingerprint(self):
+        return (self.headCommit, self.gitModulesBlobId)
+
+# A directory waiting to be analyzed, together with the chain of repositories it is nested in
+class RepositoryWorkItem:
+    absolutePath = ""
+    pathIsSubmoduleAndAllowedToBeMissing = False
+    depth = 0
+    ancestorRepositoryKeys = ()
+    # Commit to examine in bare repositories, HEAD if None
+    revision = None
+    parentWorkItem = None
+    numberOfUnfinishedSubmodules = 0
+    scanResultToFingerprint = None
+
+    def __init__(self, absolutePath, pathIsSubmoduleAndAllowedToBeMissing = False, depth = 0, ancestorRepositoryKeys = (), parentWorkItem = None, revision = None):
+        self.absolutePath = absolutePath
+        self.pathIsSubmoduleAndAllowedToBeMissing = pathIsSubmoduleAndAllowedToBeMissing
+        self.depth = depth
+        self.ancestorRepositoryKeys = ancestorRepositoryKeys
+        self.parentWorkItem = parentWorkItem
+        self.revision = revision
+
+# State shared by all work items of one call of analyzeGitRepositories
+class RepositoryTraversal:
+    dbWriter = None
+    maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH
+    visitedRepositories = None
+    # Fingerprints stored by the previous scan, only used in incremental mode
+    repositoryFingerprints = None
+    # Project name -> path of the bare repository, only used when scanning bare repositories
+    bareRepositoriesByProjectName = None
+
+    def __init__(self, dbWriter, maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH, incremental = False):
+        self.dbWriter = dbWriter
+        self.maxDepth = maxDepth
+        self.visitedRepositories = set()
+        if incremental:
+            self.repositoryFingerprints = dbWriter.loadRepositoryFingerprints()
+
+    def isScanningBareRepositories(self):
+        return self.bareRepositoriesByProjectName != None
         
 
 def createArgumentParser():
@@ -71,38 +164,92 @@ def createArgumentParser():
         action="store_const",
         const = True,
         default = False,
-        help = "Interpret the value of \"-d\" not as a directory containing a Git repository itself but as a directory that *contains* directories, each of which might be a Git repository. These directories are then tested whether they are actually Git repositories, and if so, they are handled as if each of them were called as the value of the parameter \"-d\".")
+        help = "Interpret the value of \"-d\" not as a directory containing a Git repository itself but as a directory that *contains* Git repositories, at any depth (e.g. org/team/repo.git). The repositories are recognized by their .git entry or, for bare repositories, their HEAD file, and handled as if each of them were called as the value of the parameter \"-d\". Directories are not searched below a repository.")
+    parser.add_argument("-j", "--jobs",
+        dest = "jobs",
+        action = "store",
+        type = int,
+        default = 1,
+        help = "Number of repositories (including submodules) to scan concurrently. All database writes are still done by a single thread. Default: 1.")
+    parser.add_argument("--max-depth",
+        dest = "maxDepth",
+        action = "store",
+        type = int,
+        default = DEFAULT_MAX_SUBMODULE_DEPTH,
+        help = "Maximum nesting depth of submodules to analyze. Default: " + str(DEFAULT_MAX_SUBMODULE_DEPTH) + ".")
+    parser.add_argument("--batch-size",
+        dest = "batchSize",
+        action = "store",
+        type = int,
+        default = DEFAULT_BATCH_SIZE,
+        help = "Number of rows written to the database per transaction. Default: " + str(DEFAULT_BATCH_SIZE) + ".")
+    parser.add_argument("-i", "--incremental",
+        dest = "incremental",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Skip repositories whose HEAD commit and .gitmodules file did not change since the last scan, including their submodules.")
+    parser.add_argument("-b", "--bare",
+        dest = "bare",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Scan bare repositories (e.g. mirrors) instead of checkouts. The .gitmodules file and the submodule commits are read from the object database, and submodules are resolved against the other bare repositories in the same directory.")
+    parser.add_argument("--history",
+        dest = "history",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Store when the dependencies of each repository were added and removed (DependsOnHistory), following the first parents of HEAD. Only the commits changing .gitmodules are read. Works for checkouts and bare repositories. Submodules are not descended into, scan their own repositories (e.g. all mirrors with \"-b -a\") to get their history.")
+    parser.add_argument("--shard",
+        dest = "shard",
+        action = "store",
+        type = parseShard,
+        help = "Only scan those of the directories found with \"-a\" which belong to the given shard, e.g. 0/4 for the first of four. The directories are assigned to the shards by a hash of their path relative to the scanned directory. Combine the databases of all shards with merge_dependency_shards.py.")
+    parser.add_argument("--database",
+        dest = "database",
+        action = "store",
+        default = DATABASE_FILE_NAME,
+        help = "Database to write to, e.g. the partial database of a shard. Default: " + DATABASE_FILE_NAME + ".")
+    directory_walker.addArguments(parser)
+    scan_metrics.addArguments(parser)
     return parser
 
-def prepareSqlStatementFromFile(pathToFile):
-    statementFromFile = ""
-    with open(pathToFile, 'r') as inputFile:
-        statementFromFile = inputFile.read()
-    statementFromFile = statementFromFile.replace("\n", " ")
-    return statementFromFile
-
-def prepareSqlStatements():
-    global queryForSourceCodeProjectByName
-    queryForSourceCodeProjectByName = prepareSqlStatementFromFile(PATH_TO_DML_QUERY_FOR_SOURCE_PROJECT_BY_NAME)
-    global sqlCmdForInsertingNewProject 
-    sqlCmdForInsertingNewProject = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_NEW_SOURCE_PROJECT)
-    global sqlCmdForInsertingDependsOnRelation
-    sqlCmdForInsertingDependsOnRelation = prepareSqlStatementFromFile(PATH_TO_DML_COMMAND_FOR_INSERTING_DEPENDS_ON_RELATION)
-
-def analyzeRepositoryRootDir(pathToFolder, dbConnection):
+# With a shard, only the repositories of the shard are analyzed. Their submodules are analyzed in any case, so a
+# repository used as submodule in several shards is stored by each of them.
+# The repositories are analyzed while the directory is still being walked, except for bare repositories: their
+# submodules are looked up among all bare repositories found, so the walk has to be complete first.
+def analyzeRepositoryRootDir(pathToFolder, dbWriter, numberOfJobs = 1, maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH, incremental = False, bare = False, history = False, shard = None, ignorePatterns = ()):
     print("Scanning", pathToFolder, "for Git repositories")
     if not os.path.exists(pathToFolder):
         raise FileNotFoundError("Error: folder " + pathToFolder + " does not exist.")
     if not os.path.isdir(pathToFolder):
         raise NotADirectoryError("The argument is not a directory")
-    for directoryEntry in os.listdir(pathToFolder):
-        absPathToDir = os.path.abspath(os.path.join(pathToFolder, directoryEntry))
-        if os.path.isdir(absPathToDir):
-            analyzeGitRepository(absPathToDir, dbConnection)
+    absPathToFolder = os.path.abspath(pathToFolder)
+    absPathsToDirs = directory_walker.walkRepositories(absPathToFolder, ignorePatterns)
+    bareRepositoriesByProjectName = None
+    if bare and not history:
+        absPathsToDirs = list(absPathsToDirs)
+        bareRepositoriesByProjectName = indexBareRepositoriesByProjectName(absPathsToDirs)
+    absPathsToDirs = selectShard(absPathsToDirs, absPathToFolder, shard)
+    if history:
+        analyzeRepositoryHistories(absPathsToDirs, dbWriter, numberOfJobs)
+    else:
+        analyzeGitRepositories(absPathsToDirs, dbWriter, numberOfJobs, maxDepth, incremental, bare, bareRepositoriesByProjectName)
 
+# The functions below read the repository metadata directly from the file system if possible, and only run git for
+# repository layouts git_metadata does not support.
 def isGitRepository(absolutePathToObject):
-    os.chdir(absolutePathToObject)
-    process = subprocess.run(["git", "rev-parse", "--show-toplevel"], stdout=PIPE, stderr=PIPE)
+    try:
+        isInRepository = git_metadata.findRepository(absolutePathToObject) != None
+        scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_METADATA_FAST_PATH, True)
+        return isInRepository
+    except UnsupportedRepositoryLayoutError:
+        scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_METADATA_FAST_PATH, False)
+    return isGitRepositoryUsingGit(absolutePathToObject)
+
+def isGitRepositoryUsingGit(absolutePathToObject):
+    process = scan_metrics.runSubprocess(["git", "rev-parse", "--show-toplevel"], cwd=absolutePathToObject, stdout=PIPE, stderr=PIPE)
     return process.returncode == 0
 
 def isEmptyFolder(pathToFolder):
@@ -117,33 +264,89 @@ def determineProjectName(absPathToGitRepository):
     if isEmptyFolder(absPathToGitRepository):
         print("\tWarning:", absPathToGitRepository, "is empty. If it is supposed to be a submodule, be sure to initialize it, or it will be reported as its containing project instead of being reported individually.")
         #return None
-    os.chdir(absPathToGitRepository)
-    process = subprocess.run(["git", "rev-parse", "--show-toplevel"], stdout=PIPE, stderr=PIPE)
+    try:
+        repositoryLocation = git_metadata.findRepository(absPathToGitRepository)
+        if repositoryLocation == None:
+            return None
+        return getProjectNameFromTopLevelDirectory(repositoryLocation.topLevelDirectory)
+    except UnsupportedRepositoryLayoutError:
+        pass
+    return determineProjectNameUsingGit(absPathToGitRepository)
+
+def determineProjectNameUsingGit(absPathToGitRepository):
+    process = scan_metrics.runSubprocess(["git", "rev-parse", "--show-toplevel"], cwd=absPathToGitRepository, stdout=PIPE, stderr=PIPE)
     lines = process.stdout.splitlines()
     if len(lines) == 1:
-        pathToProjectRoot = lines[0].decode(SUBPROCESS_OUTPUT_ENCODING)
-        splittablePath = pathlib.Path(pathToProjectRoot)
-        pathParts = splittablePath.parts
-        if len(pathParts) > 0:
-            projectName = pathParts[len(pathParts) - 1]
-            return projectName
+        return getProjectNameFromTopLevelDirectory(lines[0].decode(SUBPROCESS_OUTPUT_ENCODING))
+    return None
+
+def getProjectNameFromTopLevelDirectory(pathToProjectRoot):
+    splittablePath = pathlib.Path(pathToProjectRoot)
+    pathParts = splittablePath.parts
+    if len(pathParts) > 0:
+        projectName = pathParts[len(pathParts) - 1]
+        return projectName
     return None
 
+# Returns the Git directory of the repository, which is the repository itself for bare repositories. Returns None if
+# the path does not belong to a repository.
+def findGitDirectory(absPathToGitRepository):
+    if git_metadata.isGitDirectory(absPathToGitRepository):
+        return absPathToGitRepository
+    repositoryLocation = git_metadata.findRepository(absPathToGitRepository)
+    if repositoryLocation == None:
+        return None
+    return repositoryLocation.gitDirectory
+
 def determineRepositoryUrl(absPathToGitRepository):
-    os.chdir(absPathToGitRepository)
-    process = subprocess.run(["git", "config", "--get", "remote.origin.url"], stdout=PIPE, stderr=PIPE)
+    try:
+        gitDirectory = findGitDirectory(absPathToGitRepository)
+        if gitDirectory == None:
+            return None
+        return git_metadata.readRemoteOriginUrl(gitDirectory)
+    except UnsupportedRepositoryLayoutError:
+        pass
+    return determineRepositoryUrlUsingGit(absPathToGitRepository)
+
+def determineRepositoryUrlUsingGit(absPathToGitRepository):
+    process = scan_metrics.runSubprocess(["git", "config", "--get", "remote.origin.url"], cwd=absPathToGitRepository, stdout=PIPE, stderr=PIPE)
     lines = process.stdout.splitlines()
     if len(lines) == 1:
         resultUrl = lines[0].decode(SUBPROCESS_OUTPUT_ENCODING)
         return resultUrl
     return None
 
+def determineHeadCommit(absPathToGitRepository):
+    try:
+        gitDirectory = findGitDirectory(absPathToGitRepository)
+        if gitDirectory == None:
+            return None
+        return git_metadata.readHeadCommit(gitDirectory)
+    except UnsupportedRepositoryLayoutError:
+        pass
+    return determineHeadCommitUsingGit(absPathToGitRepository)
+
+def determineHeadCommitUsingGit(absPathToGitRepository):
+    process = scan_metrics.runSubprocess(["git", "rev-parse", "--verify", "-q", "HEAD"], cwd=absPathToGitRepository, stdout=PIPE, stderr=PIPE)
+    lines = process.stdout.splitlines()
+    if process.returncode == 0 and len(lines) == 1:
+        return lines[0].decode(SUBPROCESS_OUTPUT_ENCODING)
+    return None
+
 def searchGitModulesFile(absolutePathToObject):
     pathToGitModulesFile = os.path.join(absolutePathToObject, FILE_NAME_OF_GITMODULES_FILE)
     if os.path.exists(pathToGitModulesFile):
         return pathToGitModulesFile
     return None
 
+# Computes the id git would assign to the file as a blob, without starting a git process
+def computeGitBlobId(pathToFile):
+    with open(pathToFile, 'rb') as inputFile:
+        content = inputFile.read()
+    blobHash = hashlib.sha1(("blob " + str(len(content)) + "\0").encode())
+    blobHash.update(content)
+    return blobHash.hexdigest()
+
 def getAssignmentRhs(line):
     parts = line.partition("=")
     rhs = parts[2].strip()
@@ -152,11 +355,17 @@ def getAssignmentRhs(line):
 # Parses the given Git modules files and returns a list of GitSubModule objects. Each Git module in the file is
 # represented by one GitSubModule object in the list.
 def parseGitModulesFile(pathToGitModulesFile):
-    submodulesFound = []
     gitModulesFile = open(pathToGitModulesFile)
-    
+    submodulesFound = parseGitModulesLines(gitModulesFile, pathToGitModulesFile)
+    gitModulesFile.close()
+    return submodulesFound
+
+# Parses the lines of a Git modules file, which do not need to come from the file system. The name of the file is
+# only used for warnings.
+def parseGitModulesLines(lines, pathToGitModulesFile):
+    submodulesFound = []
     currentSubModule = GitSubModule()
-    for line in gitModulesFile:
+    for line in lines:
         line = line.strip()
         if line.startswith(LINE_PREFIX_SUBMODULE_SECTION_START):
             # Start of a new submodule means that the previous one should be complete, unless it is the first one in the file
@@ -184,99 +393,400 @@ def parseGitModulesFile(pathToGitModulesFile):
         submodulesFound.append(currentSubModule)
     else:
         print("Warning: last submodule description is incomplete in file:", pathToGitModulesFile, file = sys.stderr)
-    gitModulesFile.close()
     return submodulesFound
 
-def insertProjectIntoDatabase(dbConnection, projectNameOfRepository, remoteUrlOfRepository):
-    cursor = dbConnection.cursor()
-    cursor.execute(queryForSourceCodeProjectByName, [projectNameOfRepository])
-    idsForProject = set()
-    urlsForProject = set()
-    for dataRow in cursor:
-        idsForProject.add(dataRow[0])
-        urlsForProject.add(dataRow[2])
-    if len(urlsForProject) > 1:
-        print("Warning: multiple repository URLs found for project:", projectNameOfRepository)
-    if len(idsForProject) == 0:
-        cmdToExecute = sqlCmdForInsertingNewProject.format(quote(projectNameOfRepository), quote(remoteUrlOfRepository))
-        cursor.execute(cmdToExecute)
-        dbConnection.commit()
-    elif len(idsForProject) == 1:
-        # Possible improvement: check whether remoteUrlOfRepository is equal to the one found in the database
-        pass
-    elif len(idsForProject) > 1:
-        raise Exception("Internal error: more than one database entry for " + projectNameOfRepository)
-    else:
-        raise Exception("Internal error: should not reach this. Problem caused by " + projectNameOfRepository)
-    
-def createDependencyEntryInDatabase(dbConnection, projectNameOfRepository, projectNameOfSubModule):
-    print("\tStoring dependency:", projectNameOfRepository, " -> ", projectNameOfSubModule)
-    cursor = dbConnection.cursor()
-    cmdToExecute = sqlCmdForInsertingDependsOnRelation.format(quote(projectNameOfRepository), quote(projectNameOfSubModule))
-    cursor.execute(cmdToExecute)
-    dbConnection.commit()
-    
-def quote(stringToQuote):
-    return "'" + stringToQuote + "'"
-
-def analyzeGitRepository(absolutePathToObject, dbConnection, pathIsSubmoduleAndAllowedToBeMissing = False):
-    print("Analyzing directory:", absolutePathToObject)
+# Examines a directory without writing to the database. Safe to call from worker threads.
+def scanGitRepository(absolutePathToObject, pathIsSubmoduleAndAllowedToBeMissing = False):
+    scanResult = GitRepositoryScanResult(absolutePathToObject, pathIsSubmoduleAndAllowedToBeMissing)
     if not os.path.exists(absolutePathToObject) and pathIsSubmoduleAndAllowedToBeMissing:
+        scanResult.exists = False
+        return scanResult
+    with measurePhase("discovery"):
+        # Git would resolve a submodule without .git entry to the superproject, which is not what is asked for
+        if pathIsSubmoduleAndAllowedToBeMissing and not os.path.exists(os.path.join(absolutePathToObject, git_metadata.FILE_NAME_OF_GIT_DIRECTORY)):
+            scanResult.isCheckedOut = False
+            return scanResult
+        if not isGitRepository(absolutePathToObject):
+            return scanResult
+    scanResult.isGitRepository = True
+    with measurePhase("git metadata"):
+        scanResult.projectName = determineProjectName(absolutePathToObject)
+        scanResult.remoteUrl = determineRepositoryUrl(absolutePathToObject)
+        scanResult.headCommit = determineHeadCommit(absolutePathToObject)
+    with measurePhase("gitmodules parsing"):
+        gitModulesFile = searchGitModulesFile(absolutePathToObject)
+        if gitModulesFile != None:
+            scanResult.gitModulesBlobId = computeGitBlobId(gitModulesFile)
+            scanResult.submodules = parseGitModulesFile(gitModulesFile)
+    if len(scanResult.submodules) > 0 and scanResult.headCommit != None:
+        with measurePhase("gitlinks"):
+            assignPinnedCommits(scanResult.submodules, determineGitlinks(absolutePathToObject, scanResult.headCommit, scanResult.submodules))
+    return scanResult
+
+# Returns path -> commit recorded for the given submodules, read for all of them at once: from the index if possible,
+# else from the trees of the given commit with a single git process
+def determineGitlinks(absPathToGitRepository, commit, submodules):
+    pathsOfSubmodules = [subModule.path for subModule in submodules]
+    try:
+        repositoryLocation = git_metadata.findRepository(absPathToGitRepository)
+        if repositoryLocation != None:
+            gitlinks = git_metadata.readGitlinksFromIndex(repositoryLocation.gitDirectory, pathsOfSubmodules)
+            scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_METADATA_FAST_PATH, True)
+            return gitlinks
+    except UnsupportedRepositoryLayoutError:
+        scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_METADATA_FAST_PATH, False)
+    with GitObjectStoreReader(absPathToGitRepository) as objectStoreReader:
+        return objectStoreReader.readGitlinks(commit, pathsOfSubmodules)
+
+def assignPinnedCommits(submodules, gitlinks):
+    for subModule in submodules:
+        subModule.pinnedCommit = gitlinks.get(subModule.path.strip("/"))
+
+# Examines a bare repository at the given revision (HEAD if None) without writing to the database. Everything but the
+# remote URL is read through one "git cat-file --batch" process. Safe to call from worker threads.
+def scanBareRepository(absolutePathToObject, revision = None, pathIsSubmoduleAndAllowedToBeMissing = False):
+    scanResult = GitRepositoryScanResult(absolutePathToObject, pathIsSubmoduleAndAllowedToBeMissing)
+    if not isBareRepository(absolutePathToObject):
+        return scanResult
+    scanResult.isGitRepository = True
+    with measurePhase("git metadata"):
+        scanResult.projectName = determineProjectNameOfBareRepository(absolutePathToObject)
+        scanResult.remoteUrl = determineRepositoryUrl(absolutePathToObject)
+    with measurePhase("object database reads"), GitObjectStoreReader(absolutePathToObject) as objectStoreReader:
+        scanResult.headCommit = objectStoreReader.resolveCommit(revision if revision != None else "HEAD")
+        if scanResult.headCommit == None:
+            if revision != None:
+                print("Warning: commit", revision, "not found in", absolutePathToObject, file = sys.stderr)
+            return scanResult
+        blobId, content = objectStoreReader.readFile(scanResult.headCommit, FILE_NAME_OF_GITMODULES_FILE)
+        if blobId == None:
+            return scanResult
+        scanResult.gitModulesBlobId = blobId
+        pathToGitModulesFile = absolutePathToObject + ":" + scanResult.headCommit + ":" + FILE_NAME_OF_GITMODULES_FILE
+        scanResult.submodules = parseGitModulesLines(content.decode(SUBPROCESS_OUTPUT_ENCODING, "replace").splitlines(), pathToGitModulesFile)
+        assignPinnedCommits(scanResult.submodules, objectStoreReader.readGitlinks(scanResult.headCommit, [subModule.path for subModule in scanResult.submodules]))
+    return scanResult
+
+def determineProjectNameOfBareRepository(absPathToGitRepository):
+    projectName = os.path.basename(absPathToGitRepository.rstrip(os.sep))
+    if projectName.endswith(SUFFIX_OF_BARE_REPOSITORY):
+        projectName = projectName[:-len(SUFFIX_OF_BARE_REPOSITORY)]
+    return projectName
+
+# Returns project name -> path for all bare repositories directly inside the given directories
+def indexBareRepositories(absPathsToFolders):
+    absPathsToDirs = []
+    with measurePhase("discovery"):
+        for absPathToFolder in absPathsToFolders:
+            for directoryEntry in os.listdir(absPathToFolder):
+                absPathsToDirs.append(os.path.join(absPathToFolder, directoryEntry))
+    return indexBareRepositoriesByProjectName(absPathsToDirs)
+
+# Returns project name -> path for those of the given directories which are bare repositories. The first repository
+# of each name wins.
+def indexBareRepositoriesByProjectName(absPathsToDirs):
+    bareRepositoriesByProjectName = {}
+    with measurePhase("discovery"):
+        for absPathToDir in absPathsToDirs:
+            if isBareRepository(absPathToDir):
+                bareRepositoriesByProjectName.setdefault(determineProjectNameOfBareRepository(absPathToDir), absPathToDir)
+    return bareRepositoriesByProjectName
+
+# Writes the result of scanGitRepository or scanBareRepository into the database. Returns the submodules which have
+# to be analyzed next.
+def storeScanResult(dbWriter, scanResult):
+    absolutePathToObject = scanResult.absolutePath
+    scan_metrics.reportProgress("directories")
+    printDetail("Analyzing directory:", absolutePathToObject)
+    if not scanResult.exists:
         print("Warning:", absolutePathToObject, " does not exist. It is supposed to be a submodule, probably it is not",
               "initialized. Will ignore this submodule and proceed.")
+        return []
+    if not scanResult.isCheckedOut:
+        printDetail("\tSkipping directory: submodule is not checked out")
+        return []
+    if not scanResult.isGitRepository:
+        return []
+    printDetail("\tDirectory is a Git repository.")
+    projectNameOfRepository = scanResult.projectName
+    dbWriter.addProject(projectNameOfRepository, scanResult.remoteUrl)
+    printDetail("\tScanning for submodules...")
+    if len(scanResult.submodules) == 0:
+        dbWriter.replaceDependencies(projectNameOfRepository, [])
+        printDetail("\tDone:", absolutePathToObject, "does not have any submodules")
+        return []
+    printDetail("\tFound", len(scanResult.submodules), "submodule(s)")
+    projectNamesOfSubModules = []
+    pinnedCommits = []
+    for currentSubModule in scanResult.submodules:
+        projectNameOfSubModule = currentSubModule.getProjectNameFromUrl()
+        dbWriter.addProject(projectNameOfSubModule, resolveSubmoduleUrl(scanResult.remoteUrl, currentSubModule.url))
+        printDetail("\tStoring dependency:", projectNameOfRepository, " -> ", projectNameOfSubModule)
+        projectNamesOfSubModules.append(projectNameOfSubModule)
+        pinnedCommits.append(currentSubModule.pinnedCommit)
+    dbWriter.replaceDependencies(projectNameOfRepository, projectNamesOfSubModules, pinnedCommits)
+    return scanResult.submodules
+
+# Stores a scan result unless an identical checkout was already analyzed in this run, and returns the work items for
+# its submodules. Subtrees of repositories seen before, of repositories unchanged since the last scan (in incremental
+# mode), submodule cycles and submodules nested deeper than the maximum depth are not descended into.
+def processScanResult(traversal, workItem, scanResult):
+    if scanResult.isGitRepository:
+        repositoryKey = scanResult.getRepositoryKey()
+        if repositoryKey in workItem.ancestorRepositoryKeys:
+            print("Warning: submodule cycle detected:", scanResult.absolutePath, "contains itself as a submodule.",
+                  "Will not descend into it.", file = sys.stderr)
+            return []
+        # The HEAD of a top-level repository, i.e. one not scanned as a submodule, is what the pinned commits of its consumers are compared to
+        if workItem.depth == 0 and workItem.revision == None and scanResult.headCommit != None:
+            traversal.dbWriter.addProject(scanResult.projectName, scanResult.remoteUrl)
+            traversal.dbWriter.setHeadCommit(scanResult.projectName, scanResult.headCommit)
+        isVisited = scanResult.getIdentity() in traversal.visitedRepositories
+        scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_VISITED_REPOSITORIES, isVisited)
+        if isVisited:
+            printDetail("Skipping directory:", scanResult.absolutePath, "(same repository and commit already analyzed)")
+            return []
+        traversal.visitedRepositories.add(scanResult.getIdentity())
+        if traversal.repositoryFingerprints != None:
+            isUnchanged = traversal.repositoryFingerprints.get(scanResult.absolutePath) == scanResult.getFingerprint()
+            scan_metrics.metrics.addCacheLookup(CACHE_NAME_OF_REPOSITORY_FINGERPRINTS, isUnchanged)
+        else:
+            isUnchanged = False
+        if isUnchanged:
+            printDetail("Skipping directory:", scanResult.absolutePath, "(unchanged since the last scan)")
+            return []
+        # Fingerprints describe the HEAD of a repository, not the commits bare repositories are examined at as submodules
+        if workItem.revision == None:
+            workItem.scanResultToFingerprint = scanResult
+    subModules = storeScanResult(traversal.dbWriter, scanResult)
+    if len(subModules) > 0 and workItem.depth >= traversal.maxDepth:
+        print("Warning: maximum submodule depth of", traversal.maxDepth, "reached in", scanResult.absolutePath,
+              ". Will not descend into its submodules.", file = sys.stderr)
+        return []
+    ancestorRepositoryKeys = workItem.ancestorRepositoryKeys + (scanResult.getRepositoryKey(),)
+    subModuleWorkItems = []
+    for subModule in subModules:
+        if not traversal.isScanningBareRepositories():
+            absPathToSubModule = os.path.join(scanResult.absolutePath, subModule.path)
+            subModuleWorkItems.append(RepositoryWorkItem(absPathToSubModule, True, workItem.depth + 1, ancestorRepositoryKeys, workItem))
+            continue
+        absPathToSubModule = traversal.bareRepositoriesByProjectName.get(subModule.getProjectNameFromUrl())
+        if absPathToSubModule == None or subModule.pinnedCommit == None:
+            print("Warning: no bare repository found for submodule", subModule.name, "of", scanResult.absolutePath,
+                  "or its commit is unknown. Will ignore this submodule and proceed.", file = sys.stderr)
+            continue
+        subModuleWorkItems.append(RepositoryWorkItem(absPathToSubModule, True, workItem.depth + 1, ancestorRepositoryKeys, workItem, subModule.pinnedCommit))
+    return subModuleWorkItems
+
+# Called once a work item and all of its submodules are done. Only then the fingerprint of the repository is stored,
+# so that an aborted scan does not leave behind fingerprints of repositories whose submodules were not analyzed.
+def finishWorkItem(traversal, workItem):
+    while workItem != None and workItem.numberOfUnfinishedSubmodules == 0:
+        scanResult = workItem.scanResultToFingerprint
+        if scanResult != None:
+            traversal.dbWriter.storeRepositoryFingerprint(scanResult.absolutePath, scanResult.projectName,
+                                                          scanResult.headCommit, scanResult.gitModulesBlobId)
+        workItem = workItem.parentWorkItem
+        if workItem != None:
+            workItem.numberOfUnfinishedSubmodules -= 1
+
+def processWorkItem(traversal, workItem, scanResult):
+    subModuleWorkItems = processScanResult(traversal, workItem, scanResult)
+    workItem.numberOfUnfinishedSubmodules = len(subModuleWorkItems)
+    finishWorkItem(traversal, workItem)
+    return subModuleWorkItems
+
+def scanWorkItem(traversal, workItem):
+    if traversal.isScanningBareRepositories():
+        return scanBareRepository(workItem.absolutePath, workItem.revision, workItem.pathIsSubmoduleAndAllowedToBeMissing)
+    return scanGitRepository(workItem.absolutePath, workItem.pathIsSubmoduleAndAllowedToBeMissing)
+
+def analyzeGitRepository(absolutePathToObject, dbWriter, maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH, incremental = False, bare = False):
+    analyzeGitRepositories([absolutePathToObject], dbWriter, 1, maxDepth, incremental, bare)
+
+# Analyzes the given repositories and all of their submodules, using an explicit worklist instead of recursion. Each
+# combination of repository and commit is analyzed only once per call. With more than one job, the scans (i.e. the
+# git subprocesses and file parsing) run on a bounded pool of worker threads, while the results are written to the
+# database by the calling thread only. When scanning bare repositories, submodules are resolved against the given
+# index of bare repositories, or else against the bare repositories next to the given ones.
+def analyzeGitRepositories(absolutePathsToObjects, dbWriter, numberOfJobs = 1, maxDepth = DEFAULT_MAX_SUBMODULE_DEPTH, incremental = False, bare = False, bareRepositoriesByProjectName = None):
+    traversal = RepositoryTraversal(dbWriter, maxDepth, incremental)
+    if bare and bareRepositoriesByProjectName != None:
+        traversal.bareRepositoriesByProjectName = bareRepositoriesByProjectName
+    elif bare:
+        absolutePathsToObjects = list(absolutePathsToObjects)
+        absPathsToFolders = set()
+        for absolutePathToObject in absolutePathsToObjects:
+            absPathsToFolders.add(os.path.dirname(absolutePathToObject.rstrip(os.sep)))
+        traversal.bareRepositoriesByProjectName = indexBareRepositories(absPathsToFolders)
+    # Used as a stack, so that repositories are analyzed depth-first like the submodules are nested
+    subModuleWorkItems = []
+    pathsToScan = iter(absolutePathsToObjects)
+    if numberOfJobs <= 1:
+        while True:
+            if len(subModuleWorkItems) > 0:
+                workItem = subModuleWorkItems.pop()
+            else:
+                absolutePathToObject = next(pathsToScan, None)
+                if absolutePathToObject == None:
+                    break
+                workItem = RepositoryWorkItem(absolutePathToObject)
+            scanResult = scanWorkItem(traversal, workItem)
+            subModuleWorkItems.extend(reversed(processWorkItem(traversal, workItem, scanResult)))
         return
-    if not isGitRepository(absolutePathToObject):
+    maxNumberOfPendingScans = numberOfJobs * PENDING_SCANS_PER_JOB
+    pendingScans = {}
+    with ThreadPoolExecutor(max_workers = numberOfJobs) as executor:
+        while True:
+            while len(pendingScans) < maxNumberOfPendingScans:
+                # Submodules are preferred so that the number of queued paths does not grow unnecessarily
+                if len(subModuleWorkItems) > 0:
+                    workItem = subModuleWorkItems.pop()
+                else:
+                    absolutePathToObject = next(pathsToScan, None)
+                    if absolutePathToObject == None:
+                        break
+                    workItem = RepositoryWorkItem(absolutePathToObject)
+                pendingScans[executor.submit(scanWorkItem, traversal, workItem)] = workItem
+            if len(pendingScans) == 0:
+                break
+            finishedScans, _ = wait(pendingScans.keys(), return_when = FIRST_COMPLETED)
+            for finishedScan in finishedScans:
+                workItem = pendingScans.pop(finishedScan)
+                subModuleWorkItems.extend(reversed(processWorkItem(traversal, workItem, finishedScan.result())))
+
+# Result of reading the history of a repository, produced by scanRepositoryHistory without touching the database
+class RepositoryHistoryScanResult:
+    absolutePath = ""
+    isGitRepository = False
+    projectName = None
+    remoteUrl = None
+    # URL of each dependency as last seen in the history
+    urlsByProjectName = None
+    # (project name of the dependency, first commit, its date, commit removing the dependency or None, its date or None)
+    intervals = None
+
+    def __init__(self, absolutePath):
+        self.absolutePath = absolutePath
+        self.urlsByProjectName = {}
+        self.intervals = []
+
+# Yields (commit, committer date as Unix time) of the commits on the first-parent chain of HEAD which change
+# .gitmodules, oldest first. The output of git is read line by line, so only the commits git itself has to buffer for
+# "--reverse" are kept in memory, and only those changing .gitmodules.
+def streamCommitsChangingGitModules(absolutePathToRepository):
+    startTime = time.perf_counter()
+    process = subprocess.Popen(["git", "log", "--first-parent", "--reverse", "--format=%H %ct", "--", FILE_NAME_OF_GITMODULES_FILE],
+                               cwd=absolutePathToRepository, stdout=PIPE, stderr=DEVNULL)
+    try:
+        for line in process.stdout:
+            commit, _, commitDate = line.decode(SUBPROCESS_OUTPUT_ENCODING).strip().partition(" ")
+            yield commit, int(commitDate)
+    finally:
+        process.stdout.close()
+        process.wait()
+        scan_metrics.metrics.addSubprocess("git log", time.perf_counter() - startTime)
+
+# A repository depends on a project from the first commit in which a submodule of the project is described in
+# .gitmodules and recorded in the tree, until the first commit in which it is not. Adding or removing a submodule
+# always changes .gitmodules, so the commits only updating submodules do not have to be read.
+def scanRepositoryHistory(absolutePathToObject):
+    historyScanResult = RepositoryHistoryScanResult(absolutePathToObject)
+    with measurePhase("git metadata"):
+        if isBareRepository(absolutePathToObject):
+            historyScanResult.projectName = determineProjectNameOfBareRepository(absolutePathToObject)
+        elif isGitRepository(absolutePathToObject):
+            historyScanResult.projectName = determineProjectName(absolutePathToObject)
+        else:
+            return historyScanResult
+        historyScanResult.isGitRepository = True
+        historyScanResult.remoteUrl = determineRepositoryUrl(absolutePathToObject)
+    openIntervals = {}
+    with measurePhase("history"), GitObjectStoreReader(absolutePathToObject) as objectStoreReader:
+        for commit, commitDate in streamCommitsChangingGitModules(absolutePathToObject):
+            submodules = []
+            blobId, content = objectStoreReader.readFile(commit, FILE_NAME_OF_GITMODULES_FILE)
+            if blobId != None:
+                pathToGitModulesFile = absolutePathToObject + ":" + commit + ":" + FILE_NAME_OF_GITMODULES_FILE
+                submodules = parseGitModulesLines(content.decode(SUBPROCESS_OUTPUT_ENCODING, "replace").splitlines(), pathToGitModulesFile)
+            gitlinks = objectStoreReader.readGitlinks(commit, [subModule.path for subModule in submodules])
+            projectNamesOfDependencies = set()
+            for subModule in submodules:
+                if subModule.path.strip("/") in gitlinks:
+                    projectNameOfSubModule = subModule.getProjectNameFromUrl()
+                    projectNamesOfDependencies.add(projectNameOfSubModule)
+                    historyScanResult.urlsByProjectName[projectNameOfSubModule] = subModule.url
+            for projectNameOfDependency in list(openIntervals):
+                if projectNameOfDependency not in projectNamesOfDependencies:
+                    validFromCommit, validFromDate = openIntervals.pop(projectNameOfDependency)
+                    historyScanResult.intervals.append((projectNameOfDependency, validFromCommit, validFromDate, commit, commitDate))
+            for projectNameOfDependency in projectNamesOfDependencies:
+                if projectNameOfDependency not in openIntervals:
+                    openIntervals[projectNameOfDependency] = (commit, commitDate)
+    for projectNameOfDependency, (validFromCommit, validFromDate) in openIntervals.items():
+        historyScanResult.intervals.append((projectNameOfDependency, validFromCommit, validFromDate, None, None))
+    return historyScanResult
+
+def storeHistoryScanResult(dbWriter, historyScanResult):
+    scan_metrics.reportProgress("directories")
+    printDetail("Analyzing history of directory:", historyScanResult.absolutePath)
+    if not historyScanResult.isGitRepository:
         return
-    print("\tDirectory is a Git repository.")
-    projectNameOfRepository = determineProjectName(absolutePathToObject)
-    remoteUrlOfRepository = determineRepositoryUrl(absolutePathToObject)
-    insertProjectIntoDatabase(dbConnection, projectNameOfRepository, remoteUrlOfRepository)
-    print("\tScanning for submodules...")
-    gitModulesFile = searchGitModulesFile(absolutePathToObject)
-    if gitModulesFile != None:
-        submodules = parseGitModulesFile(gitModulesFile)
-        print("\tFound", len(submodules), "submodule(s)")
-        for currentSubModule in submodules:
-            absPathToSubModule = os.path.join(absolutePathToObject, currentSubModule.path)
-            projectNameOfSubModule = currentSubModule.getProjectNameFromUrl()
-            insertProjectIntoDatabase(dbConnection, projectNameOfSubModule, currentSubModule.url)
-            createDependencyEntryInDatabase(dbConnection, projectNameOfRepository, projectNameOfSubModule)
-            analyzeGitRepository(absPathToSubModule, dbConnection, True)
-    else:
-        print("\tDone:", absolutePathToObject, "does not have any submodules")
+    dbWriter.addProject(historyScanResult.projectName, historyScanResult.remoteUrl)
+    for projectNameOfDependency, url in historyScanResult.urlsByProjectName.items():
+        dbWriter.addProject(projectNameOfDependency, resolveSubmoduleUrl(historyScanResult.remoteUrl, url))
+    printDetail("\tFound", len(historyScanResult.intervals), "dependency interval(s)")
+    dbWriter.replaceDependencyHistory(historyScanResult.projectName, historyScanResult.intervals)
 
-def connectToDatabase():
-    if not os.path.exists(DATABASE_FILE_NAME):
-        raise FileNotFoundError("Database file not found: " + DATABASE_FILE_NAME)
-    return sqlite3.connect(DATABASE_FILE_NAME)
+# The histories are read on worker threads and written by the calling thread. Each project is written once, by the
+# first of its repositories.
+def analyzeRepositoryHistories(absolutePathsToObjects, dbWriter, numberOfJobs = 1):
+    if numberOfJobs <= 1:
+        for absolutePathToObject in absolutePathsToObjects:
+            storeHistoryScanResult(dbWriter, scanRepositoryHistory(absolutePathToObject))
+        return
+    with ThreadPoolExecutor(max_workers = numberOfJobs) as executor:
+        for historyScanResult in executor.map(scanRepositoryHistory, absolutePathsToObjects):
+            storeHistoryScanResult(dbWriter, historyScanResult)
 
 def processCmdLineArguments(args):
-    dbConnection = connectToDatabase()
+    if args.history and args.incremental:
+        raise ValueError("--incremental cannot be combined with --history")
+    if args.shard != None and not args.allDirectoriesInPath:
+        raise ValueError("--shard can only be used with --all-dirs-in")
+    if len(args.ignorePatterns) > 0 and not args.allDirectoriesInPath:
+        raise ValueError("--ignore can only be used with --all-dirs-in")
+    dbConnection = connectToDatabase(args.database)
+    dbWriter = DependencyDatabaseWriter(dbConnection, args.batchSize)
     absolutePathToObject = os.path.abspath(args.directory)
-    if os.path.exists(absolutePathToObject):
-        if os.path.isdir(absolutePathToObject):
-            if args.allDirectoriesInPath:
-                analyzeRepositoryRootDir(absolutePathToObject, dbConnection)
+    try:
+        if os.path.exists(absolutePathToObject):
+            if os.path.isdir(absolutePathToObject):
+                if args.allDirectoriesInPath:
+                    analyzeRepositoryRootDir(absolutePathToObject, dbWriter, args.jobs, args.maxDepth, args.incremental, args.bare, args.history, args.shard, args.ignorePatterns)
+                elif args.history:
+                    analyzeRepositoryHistories([absolutePathToObject], dbWriter, args.jobs)
+                else:
+                    analyzeGitRepositories([absolutePathToObject], dbWriter, args.jobs, args.maxDepth, args.incremental, args.bare)
             else:
-                analyzeGitRepository(absolutePathToObject, dbConnection)
+                raise NotADirectoryError("The argument is not a directory")
         else:
-            dbConnection.close()
-            raise NotADirectoryError("The argument is not a directory")
-    else:
+            raise FileNotFoundError("Not found in file system: " + absolutePathToObject)
+    finally:
+        # Also write what has been collected so far if the scan is aborted
+        dbWriter.close()
         dbConnection.close()
-        raise FileNotFoundError("Not found in file system: " + absolutePathToObject)
-    dbConnection.close()
 
 def main():
     argumentParser = createArgumentParser()
     args = argumentParser.parse_args()
-    prepareSqlStatements()
     try:
-        processCmdLineArguments(args)
-    except (NotADirectoryError, FileNotFoundError) as e:
+        scan_metrics.runWithMetrics(args, lambda: processCmdLineArguments(args))
+    except (NotADirectoryError, FileNotFoundError, ValueError) as e:
         print("Error:", e, file = sys.stderr)
         sys.exit(1)
 
 
 ## Main ##
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Collects metrics of a run of one of the scripts (time per phase, subprocesses, rows written, commits, cache lookups)
+# and writes them as JSON. Also controls the console output: in quiet mode, the messages printed per repository or
+# file are replaced by a progress line which is updated at most every PROGRESS_INTERVAL_IN_SECONDS.
+# The functions may be called from several threads. There is a single collector per process, as the metrics are
+# recorded in many places which do not share any other state.
+
+import contextlib
+import json
+import subprocess
+import sys
+import threading
+import time
+
+METRICS_FORMAT_VERSION = 1
+
+PROGRESS_INTERVAL_IN_SECONDS = 0.5
+
+# Number of functions listed in the profile, sorted by cumulative time
+NUMBER_OF_PROFILED_FUNCTIONS = 40
+
+class ScanMetrics:
+    lock = None
+    startTime = 0.0
+    secondsByPhase = None
+    callsByPhase = None
+    subprocessesByCommand = None
+    rowsWrittenByTable = None
+    numberOfCommits = 0
+    cacheLookupsByCache = None
+    counters = None
+    profiler = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.startTime = time.perf_counter()
+        self.secondsByPhase = {}
+        self.callsByPhase = {}
+        self.subprocessesByCommand = {}
+        self.rowsWrittenByTable = {}
+        self.numberOfCommits = 0
+        self.cacheLookupsByCache = {}
+        self.counters = {}
+
+    def addPhaseTime(self, phaseName, seconds):
+        with self.lock:
+            self.secondsByPhase[phaseName] = self.secondsByPhase.get(phaseName, 0.0) + seconds
+            self.callsByPhase[phaseName] = self.callsByPhase.get(phaseName, 0) + 1
+
+    def addSubprocess(self, commandName, seconds):
+        with self.lock:
+            latencies = self.subprocessesByCommand.setdefault(commandName, [])
+            latencies.append(seconds)
+
+    def addRowsWritten(self, tableName, numberOfRows):
+        if numberOfRows == 0:
+            return
+        with self.lock:
+            self.rowsWrittenByTable[tableName] = self.rowsWrittenByTable.get(tableName, 0) + numberOfRows
+
+    def addCommit(self):
+        with self.lock:
+            self.numberOfCommits += 1
+
+    def addCacheLookup(self, cacheName, isHit):
+        with self.lock:
+            hitsAndMisses = self.cacheLookupsByCache.setdefault(cacheName, [0, 0])
+            hitsAndMisses[0 if isHit else 1] += 1
+
+    def increment(self, counterName, amount = 1):
+        with self.lock:
+            self.counters[counterName] = self.counters.get(counterName, 0) + amount
+
+    # Time of a phase is summed over all threads, so with parallel scans it may exceed the wall time of the run
+    def toDictionary(self):
+        with self.lock:
+            phases = {}
+            for phaseName in self.secondsByPhase:
+                phases[phaseName] = {"seconds": self.secondsByPhase[phaseName], "calls": self.callsByPhase[phaseName]}
+            subprocesses = {}
+            for commandName, latencies in self.subprocessesByCommand.items():
+                sortedLatencies = sorted(latencies)
+                subprocesses[commandName] = {"count": len(latencies),
+                                             "totalSeconds": sum(latencies),
+                                             "medianSeconds": sortedLatencies[len(sortedLatencies) // 2],
+                                             "maxSeconds": sortedLatencies[-1]}
+            caches = {}
+            for cacheName, (hits, misses) in self.cacheLookupsByCache.items():
+                caches[cacheName] = {"hits": hits, "misses": misses, "hitRate": hits / (hits + misses)}
+            return {"formatVersion": METRICS_FORMAT_VERSION,
+                    "wallSeconds": time.perf_counter() - self.startTime,
+                    "phases": phases,
+                    "subprocesses": subprocesses,
+                    "rowsWritten": dict(self.rowsWrittenByTable),
+                    "commits": self.numberOfCommits,
+                    "caches": caches,
+                    "counters": dict(self.counters)}
+
+metrics = ScanMetrics()
+isQuiet = False
+progressLock = threading.Lock()
+timeOfLastProgressLine = 0.0
+progressLineIsShown = False
+
+@contextlib.contextmanager
+def measurePhase(phaseName):
+    startTime = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.addPhaseTime(phaseName, time.perf_counter() - startTime)
+
+# Like subprocess.run, but counts the process and its latency under its first two arguments (e.g. "git rev-parse")
+def runSubprocess(arguments, **kwargs):
+    startTime = time.perf_counter()
+    process = subprocess.run(arguments, **kwargs)
+    metrics.addSubprocess(" ".join(arguments[:2]), time.perf_counter() - startTime)
+    return process
+
+def setQuiet(quiet):
+    global isQuiet
+    isQuiet = quiet
+
+# Prints a message about a single repository or file, unless in quiet mode. Warnings and errors are printed with
+# print() as before, as they must not be suppressed.
+def printDetail(*args):
+    if not isQuiet:
+        print(*args)
+
+# Counts the item and, in quiet mode, updates the progress line if it has not been updated recently
+def reportProgress(counterName):
+    global timeOfLastProgressLine
+    metrics.increment(counterName)
+    if not isQuiet:
+        return
+    currentTime = time.perf_counter()
+    with progressLock:
+        if currentTime - timeOfLastProgressLine < PROGRESS_INTERVAL_IN_SECONDS:
+            return
+        timeOfLastProgressLine = currentTime
+    printProgressLine("\r")
+
+def printProgressLine(end):
+    global progressLineIsShown
+    with metrics.lock:
+        counters = dict(metrics.counters)
+    progressLine = ", ".join(str(counters[name]) + " " + name for name in sorted(counters))
+    progressLine += " (" + str(int(time.perf_counter() - metrics.startTime)) + "s)"
+    progressLineIsShown = True
+    # The cursor is moved back to the start of the line, so that the next update or a warning overwrites it
+    print(progressLine, end = end, file = sys.stderr, flush = True)
+
+# Shows the final numbers in quiet mode
+def finishProgress():
+    global progressLineIsShown
+    if isQuiet and (progressLineIsShown or len(metrics.counters) > 0):
+        printProgressLine("\n")
+    progressLineIsShown = False
+
+# The profiler modules are only imported when needed, as they take longer to import than the rest of a quick query
+def startProfiling():
+    import cProfile
+    metrics.profiler = cProfile.Profile()
+    metrics.profiler.enable()
+
+# Returns the functions which took the most time, as printed by pstats
+def stopProfiling():
+    import io
+    import pstats
+    metrics.profiler.disable()
+    output = io.StringIO()
+    stats = pstats.Stats(metrics.profiler, stream = output)
+    stats.sort_stats("cumulative").print_stats(NUMBER_OF_PROFILED_FUNCTIONS)
+    metrics.profiler = None
+    return output.getvalue()
+
+# Adds the common command line parameters for metrics and console output to the given parser
+def addArguments(parser):
+    parser.add_argument("--metrics",
+        dest = "metrics",
+        action = "store",
+        help = "Write metrics of the run (time per phase, subprocesses, rows written, commits, cache hit rates) as JSON to the given file.")
+    parser.add_argument("--profile",
+        dest = "profile",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Run with the Python profiler. The functions which took the most time in the main thread are added to the metrics file, or printed to standard error without \"--metrics\".")
+    parser.add_argument("-q", "--quiet",
+        dest = "quiet",
+        action = "store_const",
+        const = True,
+        default = False,
+        help = "Do not print a message per repository or file, only a progress line which is updated at most every " + str(PROGRESS_INTERVAL_IN_SECONDS) + " seconds. Warnings are still printed.")
+
+# Runs the given function with the metrics and console output requested on the command line. The metrics are also
+# written if the function fails.
+def runWithMetrics(args, function):
+    setQuiet(args.quiet)
+    if args.profile:
+        startProfiling()
+    try:
+        function()
+    finally:
+        finishProgress()
+        profile = stopProfiling() if args.profile else None
+        if args.metrics != None:
+            summary = metrics.toDictionary()
+            if profile != None:
+                summary["profile"] = profile.splitlines()
+            with open(args.metrics, 'w') as metricsFile:
+                json.dump(summary, metricsFile, indent = 2)
+        elif profile != None:
+            print(profile, file = sys.stderr)
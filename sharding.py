@@ -0,0 +1,47 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Splits the repositories and job descriptions found by the scanners into shards, so that several hosts can scan them
+# into databases of their own, which merge_dependency_shards.py then combines. A shard is given as "i/N", meaning the
+# i-th of N shards (counting from 0). Entries are assigned by a CRC-32 of their path relative to the scanned
+# directory, which is the same on every host and in every run, independent of the order in which they are found.
+
+import os
+import zlib
+
+SHARD_SEPARATOR = "/"
+
+# Returns (index, number of shards) for the given "i/N". Used as type of the command line parameter.
+def parseShard(shardSpecification):
+    index, separator, numberOfShards = shardSpecification.partition(SHARD_SEPARATOR)
+    if separator == "" or not index.isdigit() or not numberOfShards.isdigit():
+        raise ValueError("Shard must be given as i/N, e.g. 0/4: " + shardSpecification)
+    index = int(index)
+    numberOfShards = int(numberOfShards)
+    if numberOfShards < 1 or index >= numberOfShards:
+        raise ValueError("Shard index must be between 0 and N - 1: " + shardSpecification)
+    return index, numberOfShards
+
+def isInShard(absolutePathToObject, absolutePathToScannedDirectory, shard):
+    index, numberOfShards = shard
+    relativePath = os.path.relpath(absolutePathToObject, absolutePathToScannedDirectory).replace(os.sep, "/")
+    return zlib.crc32(relativePath.encode('utf-8')) % numberOfShards == index
+
+# Returns the entries of the given iterable which belong to the shard, all of them if shard is None. The entries are
+# filtered as they are consumed, so a walk of the scanned directory can be passed in without reading it completely.
+def selectShard(absolutePathsToObjects, absolutePathToScannedDirectory, shard):
+    if shard == None:
+        return absolutePathsToObjects
+    return (absolutePathToObject for absolutePathToObject in absolutePathsToObjects
+            if isInShard(absolutePathToObject, absolutePathToScannedDirectory, shard))
@@ -0,0 +1,50 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Builds small Git repositories for the tests with the git command line. The identity and the default branch are
+# passed to each git process, so the tests neither depend on nor change the configuration of the user.
+
+import os
+import subprocess
+from subprocess import PIPE
+
+GIT_ENVIRONMENT = {
+    "GIT_AUTHOR_NAME": "Test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "Test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+# Local paths are used as submodule URLs, which recent versions of git only allow when asked to
+GIT_OPTIONS = ["-c", "init.defaultBranch=main", "-c", "protocol.file.allow=always"]
+
+def runGit(pathToDirectory, *arguments):
+    process = subprocess.run(["git"] + GIT_OPTIONS + list(arguments), cwd = pathToDirectory, stdout = PIPE, stderr = PIPE,
+                             env = dict(os.environ, **GIT_ENVIRONMENT), check = True)
+    return process.stdout.decode('utf-8').strip()
+
+# Creates a repository at the given path with one commit adding the given files (name -> content)
+def createRepository(pathToRepository, files = None):
+    os.makedirs(pathToRepository)
+    runGit(pathToRepository, "init", "-q")
+    for fileName, content in (files or {"README": "readme\n"}).items():
+        with open(os.path.join(pathToRepository, fileName), "w") as file:
+            file.write(content)
+    runGit(pathToRepository, "add", "-A")
+    runGit(pathToRepository, "commit", "-q", "-m", "Initial commit")
+    return pathToRepository
+
+def addSubmodule(pathToSuperproject, urlOfSubmodule, pathOfSubmodule):
+    runGit(pathToSuperproject, "submodule", "add", "-q", urlOfSubmodule, pathOfSubmodule)
+    runGit(pathToSuperproject, "commit", "-q", "-m", "Add submodule " + pathOfSubmodule)
@@ -0,0 +1,68 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import sqlite3
+from create_dependency_database import createDatabase, upgradeDatabase, createTableFromDdlFile, LATEST_SCHEMA_VERSION
+from create_dependency_database import PATH_TO_DDL_FOR_TABLE_SOURCE_CODE_PROJECT, PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOBS
+from create_dependency_database import PATH_TO_DDL_FOR_TABLE_DEPENDS_ON, PATH_TO_DDL_FOR_TABLE_BUILDS
+
+def getSchemaVersionOfFile(pathToDatabase):
+    connection = sqlite3.connect(pathToDatabase)
+    schemaVersion = connection.execute("PRAGMA user_version").fetchone()[0]
+    connection.close()
+    return schemaVersion
+
+def test_createDatabaseReportsNoMigrations(tmp_path, capsys):
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+    assert capsys.readouterr().out == ""
+    assert getSchemaVersionOfFile(pathToDatabase) == LATEST_SCHEMA_VERSION
+
+# Creates a database as it was before schema versions were introduced, i.e. with the baseline tables and version 0,
+# containing the given projects and relations
+def createBaselineDatabase(pathToDatabase, projectNames = (), relations = ()):
+    connection = sqlite3.connect(pathToDatabase)
+    cursor = connection.cursor()
+    for pathToDdlFile in [PATH_TO_DDL_FOR_TABLE_SOURCE_CODE_PROJECT, PATH_TO_DDL_FOR_TABLE_JENKINS_BUILD_JOBS,
+                          PATH_TO_DDL_FOR_TABLE_DEPENDS_ON, PATH_TO_DDL_FOR_TABLE_BUILDS]:
+        createTableFromDdlFile(pathToDdlFile, cursor)
+    cursor.executemany("INSERT INTO SourceCodeProject (id, sourceCodeProjectName) VALUES (?, ?)", enumerate(projectNames))
+    cursor.executemany("INSERT INTO DependsOn (firstProject, secondProject) VALUES (?, ?)", relations)
+    connection.commit()
+    connection.close()
+
+def test_upgradeDatabaseReportsEachMigration(tmp_path, capsys):
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createBaselineDatabase(pathToDatabase)
+    upgradeDatabase(pathToDatabase)
+    assert capsys.readouterr().out.splitlines() == ["Migrating database to schema version " + str(schemaVersion)
+                                                    for schemaVersion in range(2, LATEST_SCHEMA_VERSION + 1)]
+    assert getSchemaVersionOfFile(pathToDatabase) == LATEST_SCHEMA_VERSION
+    upgradeDatabase(pathToDatabase)
+    assert capsys.readouterr().out == ""
+
+# Each project depends on the next two in a ring, so that the number of chains between two projects grows
+# exponentially with their length
+def test_upgradeDatabaseFillsClosureOfCyclicGraph(tmp_path):
+    numberOfProjects = 400
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createBaselineDatabase(pathToDatabase, ["project" + str(i) for i in range(numberOfProjects)],
+                           [(i, (i + step) % numberOfProjects) for i in range(numberOfProjects) for step in [1, 2]])
+    upgradeDatabase(pathToDatabase)
+    connection = sqlite3.connect(pathToDatabase)
+    closure = connection.execute("SELECT ancestorProject, descendantProject, distance FROM DependsOnClosure").fetchall()
+    connection.close()
+    assert len(closure) == numberOfProjects * (numberOfProjects - 1)
+    for ancestorProject, descendantProject, distance in closure:
+        assert distance == ((descendantProject - ancestorProject) % numberOfProjects + 1) // 2
@@ -0,0 +1,42 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import threading
+import pytest
+from array import array
+from dependency_daemon import createQueryServer, queryDaemon
+from dependency_graph import DependencyGraph
+
+# Project 1 ("app") depends on project 0 ("lib")
+@pytest.fixture
+def pathToSocket(tmp_path):
+    pathToSocket = str(tmp_path / "daemon.sock")
+    queryServer = createQueryServer(pathToSocket)
+    queryServer.graph = DependencyGraph(["lib", "app"], {"lib": 0, "app": 1}, array('i', [0, 1, 1]), array('i', [1]), {})
+    serverThread = threading.Thread(target = queryServer.serve_forever, daemon = True)
+    serverThread.start()
+    yield pathToSocket
+    queryServer.shutdown()
+    queryServer.server_close()
+
+def test_wavesQueryWithListOfProjects(pathToSocket):
+    result = queryDaemon(pathToSocket, {"query": "waves", "projects": ["lib"]})
+    assert result["changedProjects"] == ["lib"]
+
+@pytest.mark.parametrize("projects", ["lib", 1, {"lib": 1}, ["lib", 1]])
+def test_wavesQueryRejectsProjectsOtherThanListOfNames(pathToSocket, projects):
+    with pytest.raises(ValueError, match = "must be a list of project names"):
+        queryDaemon(pathToSocket, {"query": "waves", "projects": projects})
+    # The connection handler survives malformed requests
+    assert queryDaemon(pathToSocket, {"query": "status"})["projects"] == 2
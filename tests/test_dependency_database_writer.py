@@ -0,0 +1,95 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import pytest
+from create_dependency_database import createDatabase
+from dependency_database import openDatabase
+from dependency_database_writer import DependencyDatabaseWriter
+
+PROJECT_NAMES = ["app", "lib", "other", "third"]
+
+@pytest.fixture
+def dbConnection(tmp_path):
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+    dbConnection = openDatabase(pathToDatabase)
+    yield dbConnection
+    dbConnection.close()
+
+def createWriter(dbConnection, batchSize):
+    dbWriter = DependencyDatabaseWriter(dbConnection, batchSize)
+    for projectName in PROJECT_NAMES:
+        dbWriter.addProject(projectName, None)
+    return dbWriter
+
+def queryDependencies(dbConnection):
+    return sorted(dbConnection.execute("SELECT first.sourceCodeProjectName, second.sourceCodeProjectName, pinnedCommit FROM DependsOn "
+                                       "JOIN SourceCodeProject first ON first.id = DependsOn.firstProject "
+                                       "JOIN SourceCodeProject second ON second.id = DependsOn.secondProject").fetchall())
+
+def queryClosure(dbConnection):
+    return sorted(dbConnection.execute("SELECT first.sourceCodeProjectName, second.sourceCodeProjectName FROM DependsOnClosure "
+                                       "JOIN SourceCodeProject first ON first.id = DependsOnClosure.ancestorProject "
+                                       "JOIN SourceCodeProject second ON second.id = DependsOnClosure.descendantProject "
+                                       "WHERE DependsOnClosure.ancestorProject != DependsOnClosure.descendantProject").fetchall())
+
+# The results must not depend on whether the calls end up in the same batch or not
+@pytest.mark.parametrize("batchSize", [1, 1000])
+def test_replaceDependenciesReplacesOnFirstCallAndAddsOnLaterCalls(dbConnection, batchSize):
+    dbWriter = createWriter(dbConnection, batchSize)
+    dbWriter.replaceDependencies("app", ["lib", "other"], ["1", "2"])
+    dbWriter.replaceDependencies("lib", ["third"])
+    dbWriter.close()
+
+    dbWriter.startScan()
+    dbWriter.replaceDependencies("app", ["lib"], ["3"])
+    dbWriter.replaceDependencies("app", ["other", "third"], ["4", "5"])
+    dbWriter.replaceDependencies("lib", [])
+    dbWriter.close()
+
+    assert queryDependencies(dbConnection) == [("app", "lib", "3"), ("app", "other", "4"), ("app", "third", "5")]
+    assert queryClosure(dbConnection) == [("app", "lib"), ("app", "other"), ("app", "third")]
+
+def test_replaceDependenciesWithoutChangesWritesNothing(dbConnection):
+    dbWriter = createWriter(dbConnection, 1000)
+    dbWriter.replaceDependencies("app", ["lib"], ["1"])
+    dbWriter.close()
+    numberOfChangesBefore = dbConnection.total_changes
+
+    dbWriter.startScan()
+    dbWriter.replaceDependencies("app", ["lib"], ["1"])
+    dbWriter.close()
+
+    assert dbConnection.total_changes == numberOfChangesBefore
+
+# The second writer loaded the ids before the first one added its projects
+def test_writersAddingProjectsAtTheSameTime(dbConnection):
+    firstWriter = createWriter(dbConnection, 1000)
+    secondWriter = DependencyDatabaseWriter(dbConnection, 1000)
+    firstWriter.addProject("first", None)
+    firstWriter.addProject("shared", None)
+    firstWriter.replaceDependencies("first", ["shared"])
+    firstWriter.addBuildJob("job", ["https://example.com/first.git"])
+    secondWriter.addProject("second", None)
+    secondWriter.addProject("shared", None)
+    secondWriter.addProject("app", None)
+    secondWriter.replaceDependencies("second", ["shared", "app"])
+    secondWriter.addBuildJob("job", ["https://example.com/second.git"])
+    firstWriter.close()
+    secondWriter.close()
+
+    assert queryDependencies(dbConnection) == [("first", "shared", None), ("second", "app", None), ("second", "shared", None)]
+    projectNames = [dataRow[0] for dataRow in dbConnection.execute("SELECT sourceCodeProjectName FROM SourceCodeProject")]
+    assert sorted(projectNames) == sorted(PROJECT_NAMES + ["first", "second", "shared"])
+    assert dbConnection.execute("SELECT sourceCodeRepositoryUrl FROM JenkinsBuildJobRemote").fetchall() == [("https://example.com/second.git",)]
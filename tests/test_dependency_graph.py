@@ -0,0 +1,72 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import random
+from create_dependency_database import createDatabase
+from dependency_database import openDatabase
+from dependency_graph import loadDependencyGraph, computeBuildWaves
+
+NUMBER_OF_PROJECTS = 60
+NUMBER_OF_RELATIONS = 150
+
+# Returns (dependent, dependency) pairs of a random acyclic graph, in random order
+def createRandomDependencies(randomGenerator):
+    relations = set()
+    while len(relations) < NUMBER_OF_RELATIONS:
+        first, second = randomGenerator.sample(range(1, NUMBER_OF_PROJECTS + 1), 2)
+        # Projects only depend on projects with smaller ids, which makes the graph acyclic
+        relations.add((max(first, second), min(first, second)))
+    relations = list(relations)
+    randomGenerator.shuffle(relations)
+    return relations
+
+# The wave of a project is the length of the longest chain of affected dependencies below it, computed by a naive
+# topological sort: a project is placed once all of its affected dependencies are placed
+def computeBuildWavesNaively(relations, startProjectIds):
+    affectedProjectIds = set(startProjectIds)
+    isGrowing = True
+    while isGrowing:
+        isGrowing = False
+        for dependentId, dependencyId in relations:
+            if dependencyId in affectedProjectIds and dependentId not in affectedProjectIds:
+                affectedProjectIds.add(dependentId)
+                isGrowing = True
+    waveIndices = {}
+    while len(waveIndices) < len(affectedProjectIds):
+        for projectId in affectedProjectIds - set(waveIndices):
+            dependencyIds = [dependencyId for dependentId, dependencyId in relations if dependentId == projectId and dependencyId in affectedProjectIds]
+            if all(dependencyId in waveIndices for dependencyId in dependencyIds):
+                waveIndices[projectId] = max([waveIndices[dependencyId] + 1 for dependencyId in dependencyIds], default = 0)
+    waves = [set() for waveIndex in range(max(waveIndices.values()) + 1)]
+    for projectId, waveIndex in waveIndices.items():
+        waves[waveIndex].add(projectId)
+    return waves
+
+def test_computeBuildWavesMatchesNaiveTopologicalSort(tmp_path):
+    randomGenerator = random.Random(42)
+    relations = createRandomDependencies(randomGenerator)
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+    dbConnection = openDatabase(pathToDatabase)
+    # Inserted with descending ids, so that the order of the rows does not happen to be the order of the projects
+    dbConnection.executemany("INSERT INTO SourceCodeProject (id, sourceCodeProjectName) VALUES (?, ?)",
+                             [(projectId, "project" + str(projectId)) for projectId in range(NUMBER_OF_PROJECTS, 0, -1)])
+    dbConnection.executemany("INSERT INTO DependsOn (firstProject, secondProject) VALUES (?, ?)", relations)
+    dbConnection.commit()
+    graph = loadDependencyGraph(dbConnection)
+    dbConnection.close()
+    for startProjectIds in [[1], [2, 7], randomGenerator.sample(range(1, NUMBER_OF_PROJECTS + 1), 5)]:
+        waves, cyclicComponents = computeBuildWaves(graph, startProjectIds)
+        assert [set(wave) for wave in waves] == computeBuildWavesNaively(relations, startProjectIds)
+        assert cyclicComponents == []
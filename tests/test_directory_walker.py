@@ -0,0 +1,49 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+from directory_walker import walkRepositories, walkJobDescriptions
+from git_fixtures import runGit, createRepository
+
+def createFile(pathToFile, content = ""):
+    os.makedirs(os.path.dirname(pathToFile), exist_ok = True)
+    with open(pathToFile, "w") as file:
+        file.write(content)
+
+def test_walkRepositoriesFindsGroupedCheckoutsAndMirrors(tmp_path):
+    pathToOrigin = createRepository(str(tmp_path / "origin"))
+    scannedDirectory = tmp_path / "scanned"
+    runGit(str(tmp_path), "clone", "-q", pathToOrigin, "scanned/org/team/app")
+    runGit(str(tmp_path), "clone", "-q", "--mirror", pathToOrigin, "scanned/builds/tools.git")
+    runGit(str(tmp_path), "clone", "-q", "--mirror", pathToOrigin, "scanned/org/builds/lib.git")
+    runGit(str(tmp_path), "clone", "-q", "--mirror", pathToOrigin, "scanned/archive/old.git")
+    createFile(str(scannedDirectory / "org" / "team" / "app" / "nested" / "inner" / ".git" / "HEAD"))
+    os.makedirs(str(scannedDirectory / "empty"))
+
+    repositories = list(walkRepositories(str(scannedDirectory), ["archive"]))
+
+    assert repositories == [str(scannedDirectory / "builds" / "tools.git"), str(scannedDirectory / "org" / "builds" / "lib.git"),
+                            str(scannedDirectory / "org" / "team" / "app")]
+
+def test_walkJobDescriptionsSkipsBuildHistoryOfJobsOnly(tmp_path):
+    createFile(str(tmp_path / "plain.xml"))
+    createFile(str(tmp_path / "folder" / "config.xml"))
+    createFile(str(tmp_path / "folder" / "jobs" / "job" / "config.xml"))
+    createFile(str(tmp_path / "folder" / "jobs" / "job" / "builds" / "1" / "build.xml"))
+    createFile(str(tmp_path / "builds" / "exported.xml"))
+    createFile(str(tmp_path / "folder" / "jobs" / "job" / "notes.txt"))
+
+    jobDescriptions = [os.path.relpath(path, str(tmp_path)) for path in walkJobDescriptions(str(tmp_path))]
+
+    assert jobDescriptions == ["plain.xml", "builds/exported.xml", "folder/config.xml", "folder/jobs/job/config.xml"]
@@ -0,0 +1,157 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+# Compares what git_metadata reads from the file system with what the git command line reports for the same repository
+
+import os
+import subprocess
+import pytest
+import git_metadata
+from git_metadata import UnsupportedRepositoryLayoutError
+from scan_deps_in_git_repos import determineHeadCommit, determineProjectName
+from git_fixtures import runGit, createRepository, addSubmodule
+
+FILE_MODE_GITLINK = "160000"
+
+# A checkout of "app" with the submodules "libs/lib" and "libs/other", both initialized
+@pytest.fixture
+def checkoutWithSubmodules(tmp_path):
+    pathToLibrary = createRepository(str(tmp_path / "origin" / "lib"))
+    pathToOtherLibrary = createRepository(str(tmp_path / "origin" / "other"))
+    pathToApplication = createRepository(str(tmp_path / "origin" / "app"))
+    addSubmodule(pathToApplication, pathToLibrary, "libs/lib")
+    addSubmodule(pathToApplication, pathToOtherLibrary, "libs/other")
+    runGit(str(tmp_path), "clone", "-q", "--recurse-submodules", pathToApplication, "app")
+    return str(tmp_path / "app")
+
+def readGitlinksUsingGit(pathToRepository):
+    gitlinks = {}
+    for line in runGit(pathToRepository, "ls-files", "-s").splitlines():
+        modeObjectAndStage, _, path = line.partition("\t")
+        mode, objectId, stage = modeObjectAndStage.split()
+        if mode == FILE_MODE_GITLINK and stage == "0":
+            gitlinks[path] = objectId
+    return gitlinks
+
+def assertRepositoryIsFoundLikeGit(absolutePathToObject):
+    repositoryLocation = git_metadata.findRepository(absolutePathToObject)
+    assert repositoryLocation.topLevelDirectory == runGit(absolutePathToObject, "rev-parse", "--show-toplevel")
+    assert os.path.realpath(repositoryLocation.gitDirectory) == runGit(absolutePathToObject, "rev-parse", "--absolute-git-dir")
+    return repositoryLocation
+
+def test_findRepositoryInCheckout(checkoutWithSubmodules):
+    os.makedirs(os.path.join(checkoutWithSubmodules, "src", "main"))
+    assertRepositoryIsFoundLikeGit(checkoutWithSubmodules)
+    assertRepositoryIsFoundLikeGit(os.path.join(checkoutWithSubmodules, "src", "main"))
+
+def test_findRepositoryOfSubmoduleWithGitfile(checkoutWithSubmodules):
+    pathToSubmodule = os.path.join(checkoutWithSubmodules, "libs", "lib")
+    assert os.path.isfile(os.path.join(pathToSubmodule, ".git"))
+    repositoryLocation = assertRepositoryIsFoundLikeGit(pathToSubmodule)
+    assert git_metadata.readHeadCommit(repositoryLocation.gitDirectory) == runGit(pathToSubmodule, "rev-parse", "HEAD")
+
+def test_findRepositoryOutsideOfWorkingTree(tmp_path):
+    assert git_metadata.findRepository(str(tmp_path)) == None
+
+def test_readHeadCommitOnBranch(checkoutWithSubmodules):
+    repositoryLocation = git_metadata.findRepository(checkoutWithSubmodules)
+    assert git_metadata.readHeadCommit(repositoryLocation.gitDirectory) == runGit(checkoutWithSubmodules, "rev-parse", "HEAD")
+
+def test_readHeadCommitWithPackedRefsOnly(checkoutWithSubmodules):
+    runGit(checkoutWithSubmodules, "pack-refs", "--all", "--prune")
+    repositoryLocation = git_metadata.findRepository(checkoutWithSubmodules)
+    assert not os.path.exists(os.path.join(repositoryLocation.gitDirectory, "refs", "heads", "main"))
+    assert git_metadata.readHeadCommit(repositoryLocation.gitDirectory) == runGit(checkoutWithSubmodules, "rev-parse", "HEAD")
+
+def test_readHeadCommitWithDetachedHead(checkoutWithSubmodules):
+    runGit(checkoutWithSubmodules, "commit", "-q", "--allow-empty", "-m", "Second commit")
+    runGit(checkoutWithSubmodules, "checkout", "-q", "--detach", "HEAD~1")
+    repositoryLocation = git_metadata.findRepository(checkoutWithSubmodules)
+    assert git_metadata.readHeadCommit(repositoryLocation.gitDirectory) == runGit(checkoutWithSubmodules, "rev-parse", "HEAD")
+
+def test_readHeadCommitInEmptyRepository(tmp_path):
+    runGit(str(tmp_path), "init", "-q", "empty")
+    assert git_metadata.readHeadCommit(str(tmp_path / "empty" / ".git")) == None
+
+# Linked worktrees are left to git, so the scanner must arrive at the same results through its fallback
+def test_linkedWorktreeIsLeftToGit(checkoutWithSubmodules, tmp_path):
+    runGit(checkoutWithSubmodules, "worktree", "add", "-q", "-b", "feature", str(tmp_path / "worktree"))
+    pathToWorktree = str(tmp_path / "worktree")
+    with pytest.raises(UnsupportedRepositoryLayoutError):
+        git_metadata.findRepository(pathToWorktree)
+    assert determineHeadCommit(pathToWorktree) == runGit(pathToWorktree, "rev-parse", "HEAD")
+    assert determineProjectName(pathToWorktree) == os.path.basename(runGit(pathToWorktree, "rev-parse", "--show-toplevel"))
+
+def readConfigValueUsingGit(gitDirectory, name):
+    process = subprocess.run(["git", "config", "--file", os.path.join(gitDirectory, "config"), "--get", name],
+                             stdout = subprocess.PIPE)
+    if process.returncode != 0:
+        return None
+    return process.stdout.decode('utf-8').rstrip("\n")
+
+def test_readConfigValueWrittenByGit(checkoutWithSubmodules):
+    gitDirectory = git_metadata.findRepository(checkoutWithSubmodules).gitDirectory
+    runGit(checkoutWithSubmodules, "config", "remote.upstream.url", "https://example.com/with \"quotes\" # and hash.git")
+    runGit(checkoutWithSubmodules, "config", "branch.feature/x.remote", "upstream")
+    for section, subsection, key in [("remote", "origin", "url"), ("remote", "upstream", "url"),
+                                     ("branch", "feature/x", "remote"), ("remote", "missing", "url")]:
+        name = section + "." + subsection + "." + key
+        assert git_metadata.readConfigValue(gitDirectory, section, subsection, key) == readConfigValueUsingGit(gitDirectory, name)
+
+def test_readConfigValueWrittenByHand(tmp_path):
+    runGit(str(tmp_path), "init", "-q", "repository")
+    gitDirectory = str(tmp_path / "repository" / ".git")
+    with open(os.path.join(gitDirectory, "config"), "a") as configFile:
+        configFile.write("; comment\n"
+                         "[remote \"origin\"]\n"
+                         "\turl = first\n"
+                         "\tURL = \"second ; not a comment\" # comment\n"
+                         "[remote \"continued\"] url = one\\\n"
+                         "  two\n"
+                         "[Remote.Deprecated]\n"
+                         "\turl = tab\\tseparated\n")
+    for section, subsection, key in [("remote", "origin", "url"), ("remote", "continued", "url"), ("remote", "deprecated", "url")]:
+        name = section + "." + subsection + "." + key
+        assert git_metadata.readConfigValue(gitDirectory, section, subsection, key) == readConfigValueUsingGit(gitDirectory, name)
+
+def test_readGitlinksFromIndex(checkoutWithSubmodules):
+    gitDirectory = git_metadata.findRepository(checkoutWithSubmodules).gitDirectory
+    gitlinks = git_metadata.readGitlinksFromIndex(gitDirectory, ["libs/lib", "libs/other/", "README", "missing"])
+    assert gitlinks == readGitlinksUsingGit(checkoutWithSubmodules)
+    assert sorted(gitlinks) == ["libs/lib", "libs/other"]
+
+# Intent-to-add entries make git write version 3 of the index, with extended flags
+def test_readGitlinksFromIndexWithExtendedFlags(checkoutWithSubmodules):
+    with open(os.path.join(checkoutWithSubmodules, "new file"), "w") as newFile:
+        newFile.write("new\n")
+    runGit(checkoutWithSubmodules, "add", "-N", "new file")
+    gitDirectory = git_metadata.findRepository(checkoutWithSubmodules).gitDirectory
+    with open(os.path.join(gitDirectory, "index"), "rb") as indexFile:
+        assert indexFile.read(8) == b"DIRC\0\0\0\3"
+    assert git_metadata.readGitlinksFromIndex(gitDirectory, ["libs/lib", "libs/other"]) == readGitlinksUsingGit(checkoutWithSubmodules)
+
+def test_readGitlinksFromIndexWithStagedCommit(checkoutWithSubmodules):
+    pathToSubmodule = os.path.join(checkoutWithSubmodules, "libs", "lib")
+    runGit(pathToSubmodule, "commit", "-q", "--allow-empty", "-m", "Newer commit")
+    runGit(checkoutWithSubmodules, "add", "libs/lib")
+    gitDirectory = git_metadata.findRepository(checkoutWithSubmodules).gitDirectory
+    gitlinks = git_metadata.readGitlinksFromIndex(gitDirectory, ["libs/lib", "libs/other"])
+    assert gitlinks == readGitlinksUsingGit(checkoutWithSubmodules)
+    assert gitlinks["libs/lib"] == runGit(pathToSubmodule, "rev-parse", "HEAD")
+
+def test_indexVersion4IsLeftToGit(checkoutWithSubmodules):
+    runGit(checkoutWithSubmodules, "update-index", "--index-version", "4")
+    gitDirectory = git_metadata.findRepository(checkoutWithSubmodules).gitDirectory
+    with pytest.raises(UnsupportedRepositoryLayoutError):
+        git_metadata.readGitlinksFromIndex(gitDirectory, ["libs/lib"])
@@ -0,0 +1,31 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+from git_object_store import GitObjectStoreReader
+from git_fixtures import runGit, createRepository
+
+def test_readFileWithSpacesInPathStaysInSyncWithGit(tmp_path):
+    pathToRepository = createRepository(str(tmp_path / "repository"), {"README": "readme\n"})
+    os.makedirs(os.path.join(pathToRepository, "path with space"))
+    with open(os.path.join(pathToRepository, "path with space", ".gitmodules"), "w") as gitModulesFile:
+        gitModulesFile.write("[submodule \"lib\"]\n")
+    runGit(pathToRepository, "add", "-A")
+    runGit(pathToRepository, "commit", "-q", "-m", "Add file with spaces in its path")
+    with GitObjectStoreReader(pathToRepository) as objectStoreReader:
+        assert objectStoreReader.readFile("HEAD", "missing path with space/.gitmodules") == (None, None)
+        assert objectStoreReader.readFile("HEAD", "path with space/.gitmodules") == (
+            runGit(pathToRepository, "rev-parse", "HEAD:path with space/.gitmodules"), b"[submodule \"lib\"]\n")
+        assert objectStoreReader.readFile("HEAD", "line\nbreak") == (None, None)
+        assert objectStoreReader.readFile("HEAD", "README") == (runGit(pathToRepository, "rev-parse", "HEAD:README"), b"readme\n")
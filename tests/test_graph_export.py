@@ -0,0 +1,31 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import io
+from array import array
+from dependency_graph import DependencyGraph
+from graph_export import writeGraphAsDot
+
+# Project 1 ("app") depends on project 0 ("foo"), which is built by a job named "foo" as well
+def createGraphWithJobNamedLikeProject():
+    return DependencyGraph(["foo", "app"], {"foo": 0, "app": 1}, array('i', [0, 1, 1]), array('i', [1]), {0: ["foo"]})
+
+def test_writeGraphAsDotKeepsJobsAndProjectsOfTheSameNameApart():
+    outputFile = io.StringIO()
+    writeGraphAsDot(createGraphWithJobNamedLikeProject(), outputFile)
+    lines = outputFile.getvalue().splitlines()
+    assert '  "project:foo" [label="foo"];' in lines
+    assert '  "job:foo" [label="foo", shape=box];' in lines
+    assert '  "job:foo" -> "project:foo" [style=dashed];' in lines
+    assert '  "project:app" -> "project:foo";' in lines
@@ -0,0 +1,51 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+from create_dependency_database import createDatabase
+from dependency_database import openDatabase
+from dependency_database_writer import DependencyDatabaseWriter
+from scan_buildjobs import processXmlJobDescriptionsInParallel
+
+NUMBER_OF_JOB_DESCRIPTIONS = 200
+
+def writeJobDescription(pathToFile, buildJobName):
+    with open(pathToFile, 'w') as jobFile:
+        jobFile.write("<project><displayName>" + buildJobName + "</displayName><scm><source><remote>https://example.com/"
+                      + buildJobName + ".git</remote></source></scm></project>")
+
+def countBuildJobs(dbConnection):
+    return dbConnection.execute("SELECT COUNT(*) FROM JenkinsBuildJob").fetchone()[0]
+
+def test_processXmlJobDescriptionsInParallelWritesWhileFilesAreFound(tmp_path):
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+    dbConnection = openDatabase(pathToDatabase)
+    dbWriter = DependencyDatabaseWriter(dbConnection, 1)
+    numbersOfBuildJobsStored = []
+
+    # Stands in for the walk, recording how many jobs were stored when each file is taken
+    def walkJobDescriptions():
+        for i in range(NUMBER_OF_JOB_DESCRIPTIONS):
+            pathToFile = str(tmp_path / ("job" + str(i) + ".xml"))
+            writeJobDescription(pathToFile, "job" + str(i))
+            numbersOfBuildJobsStored.append(countBuildJobs(dbConnection))
+            yield pathToFile
+
+    processXmlJobDescriptionsInParallel(dbWriter, walkJobDescriptions(), 2)
+    dbWriter.close()
+
+    assert numbersOfBuildJobsStored[-1] > 0
+    buildJobNames = [dataRow[0] for dataRow in dbConnection.execute("SELECT buildJobName FROM JenkinsBuildJob ORDER BY id")]
+    assert buildJobNames == ["job" + str(i) for i in range(NUMBER_OF_JOB_DESCRIPTIONS)]
+    dbConnection.close()
@@ -0,0 +1,69 @@
+#Copyright 2020 Dominique Gückel
+
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+
+    #http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import os
+from create_dependency_database import createDatabase
+from dependency_database import openDatabase
+from dependency_database_writer import DependencyDatabaseWriter
+from scan_deps_in_git_repos import analyzeGitRepository
+from git_fixtures import runGit, createRepository, addSubmodule
+
+def queryDependencies(dbConnection):
+    return dbConnection.execute("SELECT first.sourceCodeProjectName, second.sourceCodeProjectName FROM DependsOn "
+                                "JOIN SourceCodeProject first ON first.id = DependsOn.firstProject "
+                                "JOIN SourceCodeProject second ON second.id = DependsOn.secondProject").fetchall()
+
+def scan(pathToDatabase, absolutePathToRepository):
+    dbConnection = openDatabase(pathToDatabase)
+    dbWriter = DependencyDatabaseWriter(dbConnection)
+    try:
+        analyzeGitRepository(absolutePathToRepository, dbWriter)
+    finally:
+        dbWriter.close()
+    return dbConnection
+
+# An uninitialized submodule is an empty directory inside the superproject, which git resolves to the superproject
+def test_uninitializedSubmoduleIsNeitherScannedNorReportedAsCycle(tmp_path, capsys):
+    pathToLibrary = createRepository(str(tmp_path / "origin" / "lib"))
+    pathToApplication = createRepository(str(tmp_path / "origin" / "app2"))
+    addSubmodule(pathToApplication, pathToLibrary, "libs/lib")
+    runGit(str(tmp_path), "clone", "-q", pathToApplication, "app2")
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+    capsys.readouterr()
+
+    dbConnection = scan(pathToDatabase, str(tmp_path / "app2"))
+
+    output = capsys.readouterr()
+    assert os.path.isdir(str(tmp_path / "app2" / "libs" / "lib"))
+    assert "cycle" not in output.out + output.err
+    assert queryDependencies(dbConnection) == [("app2", "lib")]
+    dbConnection.close()
+
+def test_initializedSubmoduleIsScanned(tmp_path, capsys):
+    pathToLeaf = createRepository(str(tmp_path / "origin" / "leaf"))
+    pathToLibrary = createRepository(str(tmp_path / "origin" / "lib"))
+    addSubmodule(pathToLibrary, pathToLeaf, "leaf")
+    pathToApplication = createRepository(str(tmp_path / "origin" / "app2"))
+    addSubmodule(pathToApplication, pathToLibrary, "libs/lib")
+    runGit(str(tmp_path), "clone", "-q", "--recurse-submodules", pathToApplication, "app2")
+    pathToDatabase = str(tmp_path / "dependencies.db")
+    createDatabase(pathToDatabase)
+
+    dbConnection = scan(pathToDatabase, str(tmp_path / "app2"))
+
+    output = capsys.readouterr()
+    assert "cycle" not in output.out + output.err
+    assert sorted(queryDependencies(dbConnection)) == [("app2", "lib"), ("lib", "leaf")]
+    dbConnection.close()